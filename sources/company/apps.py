@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class CompanyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'company'
+
+    def ready(self):
+        # Invalidation du cache des données de référence, contrôle du backend partagé
+        import company.signals
+        import company.checks
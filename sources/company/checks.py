@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.checks import Error, Tags, Warning, register
+from django.db import connections, router
+
+DATABASE_BACKEND = 'django.core.cache.backends.db.DatabaseCache'
+LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def shared_cache_check(app_configs, **kwargs):
+    """Les tampons de version (reference_cache, libellés, catalogue, affinités) doivent être vus de tous les processus"""
+    backend = settings.CACHES.get('default', {}).get('BACKEND', LOCAL_BACKENDS[0])
+    if backend in LOCAL_BACKENDS:
+        return [Error(
+            f"Le cache par défaut ({backend}) est propre à chaque processus : une invalidation faite par un "
+            "worker, le worker outbox ou une commande n'atteint pas les autres processus.",
+            hint="Configurer CACHES avec Redis (REDIS_URL) ou la table de la base (DatabaseCache).",
+            id='company.E001',
+        )]
+    return []
+
+
+@register(Tags.caches, Tags.database)
+def cache_table_check(app_configs, databases=None, **kwargs):
+    """La table du DatabaseCache n'est pas créée par migrate (contrôle lancé par migrate et check --database)"""
+    warnings = []
+    for alias, config in settings.CACHES.items():
+        if config.get('BACKEND') != DATABASE_BACKEND:
+            continue
+        model = caches[alias].cache_model_class
+        for database in databases or ():
+            if not router.allow_migrate_model(database, model):
+                continue
+            if config['LOCATION'] not in connections[database].introspection.table_names():
+                warnings.append(Warning(
+                    f"La table de cache {config['LOCATION']!r} (CACHES[{alias!r}]) n'existe pas sur la base "
+                    f"{database!r} : toute lecture du cache échouera.",
+                    hint="Lancer manage.py createcachetable après migrate.",
+                    id='company.W001',
+                ))
+    return warnings
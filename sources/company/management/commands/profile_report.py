@@ -0,0 +1,87 @@
+import pstats
+from collections import Counter
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from config.profiling import endpoint_slug, profile_dir
+
+
+class Command(BaseCommand):
+    help = "Agrège les profils enregistrés (config.profiling) : fonctions les plus coûteuses par point d'entrée"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', type=Path, help="Répertoire des profils (défaut : PROFILING_DIR)")
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help="Limiter aux points d'entrée commençant par ce préfixe (répétable)")
+        parser.add_argument('--top', type=int, default=25)
+        parser.add_argument('--sort', choices=['self', 'total'], default='self',
+                            help="Temps propre de la fonction ou temps cumulé avec ses appelés")
+        parser.add_argument('--merge', type=Path, help="Écrire toutes les piles repliées dans un seul fichier .folded")
+
+    def handle(self, *args, **options):
+        root = options['dir'] or profile_dir()
+        if not root.is_dir():
+            raise CommandError(f"Aucun profil dans {root}.")
+        prefixes = [endpoint_slug(prefix) for prefix in options['endpoints'] or []]
+        directories = sorted(
+            path for path in root.iterdir()
+            if path.is_dir() and (not prefixes or path.name.startswith(tuple(prefixes)))
+        )
+
+        self.stdout.write("point d'entrée".ljust(50) + f" {'profils':>8} {'échant.':>9}")
+        folded, prof = [], []
+        for directory in directories:
+            stacks = sorted(directory.glob('*.folded'))
+            dumps = sorted(directory.glob('*.prof'))
+            folded += stacks
+            prof += dumps
+            samples = sum(count for path in stacks for _, count in read_folded(path))
+            self.stdout.write(f"{directory.name:<50} {len(stacks) + len(dumps):>8} {samples:>9}")
+        if not folded and not prof:
+            self.stdout.write("Aucun profil enregistré.")
+            return
+
+        if folded:
+            self.report_samples(folded, options['top'], options['sort'], options['merge'])
+        if prof:
+            self.report_cprofile(prof, options['top'], options['sort'])
+
+    def report_samples(self, paths, top, sort, merge):
+        self_counts, total_counts, merged = Counter(), Counter(), Counter()
+        for path in paths:
+            for stack, count in read_folded(path):
+                frames = stack.split(';')
+                self_counts[frames[-1]] += count
+                for frame in set(frames):  # récursion : une fois par pile
+                    total_counts[frame] += count
+                merged[stack] += count
+        samples = sum(merged.values())
+        ranking = self_counts if sort == 'self' else total_counts
+
+        self.stdout.write(f"\nÉchantillonnage : {samples} échantillons, {len(paths)} profils")
+        self.stdout.write(f"{'propre':>8} {'cumulé':>8}  fonction")
+        for function, _ in ranking.most_common(top):
+            self.stdout.write(
+                f"{100 * self_counts[function] / samples:>7.1f}% {100 * total_counts[function] / samples:>7.1f}%  {function}"
+            )
+        if merge:
+            merge.write_text(''.join(f"{stack} {count}\n" for stack, count in merged.most_common()))
+            self.stdout.write(self.style.SUCCESS(f"Piles fusionnées : {merge}"))
+
+    def report_cprofile(self, paths, top, sort):
+        stats = pstats.Stats(*map(str, paths))
+        self.stdout.write(f"\ncProfile : {stats.total_tt:.3f}s, {len(paths)} profils")
+        self.stdout.write(f"{'propre s':>10} {'cumulé s':>10} {'appels':>9}  fonction")
+        index = 2 if sort == 'self' else 3
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][index], reverse=True)[:top]
+        for (filename, line, function), (_, calls, own, cumulative, _) in rows:
+            self.stdout.write(f"{own:>10.3f} {cumulative:>10.3f} {calls:>9}  {function} ({filename}:{line})")
+
+
+def read_folded(path):
+    """[(pile, échantillons)] d'un fichier replié"""
+    rows = []
+    for line in path.read_text().splitlines():
+        stack, _, count = line.rpartition(' ')
+        if stack:
+            rows.append((stack, int(count)))
+    return rows
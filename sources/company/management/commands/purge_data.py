@@ -1,8 +1,9 @@
 from django.core.management.base import BaseCommand
 from company.models import CompanySettings, TaxRate
-from inventory.models import Product, Category, Brand
-from sales.models import Customer, Address, Order, OrderLine, Carrier, Promotion, CreditNote
-from procurement.models import Supplier, SupplierPrice
+from inventory.models import Product, Category, Brand, StockMovement, StockCheckpoint, StockShard, DemandForecast
+from sales.models import Customer, Address, Order, OrderLine, Carrier, Promotion, PromotionRedemption, CreditNote, ArchivedOrder, ArchivedOrderLine, ProductAffinity, ProductPairCount
+from procurement.models import Supplier, SupplierPrice, SupplierPriceHistory
+from outbox.models import OutboxEvent
 
 class Command(BaseCommand):
     help = "Purge toutes les données de l'ERP"
@@ -11,13 +12,24 @@ class Command(BaseCommand):
         self.stdout.write("Purge en cours...")
         
         # Ordre inverse des dépendances
+        OutboxEvent.objects.all().delete()
+        ProductAffinity.objects.all().delete()
+        ProductPairCount.objects.all().delete()
+        PromotionRedemption.objects.all().delete()
+        ArchivedOrderLine.objects.all().delete()
+        ArchivedOrder.objects.all().delete()
         OrderLine.objects.all().delete()
         Order.objects.all().delete()
         CreditNote.objects.all().delete()
         Promotion.objects.all().delete()
         Address.objects.all().delete()
         Customer.objects.all().delete()
+        SupplierPriceHistory.objects.all().delete()
         SupplierPrice.objects.all().delete()
+        StockCheckpoint.objects.all().delete()
+        StockMovement.objects.all().delete()
+        StockShard.objects.all().delete()
+        DemandForecast.objects.all().delete()
         Supplier.objects.all().delete()
         Product.objects.all().delete()
         Brand.objects.all().delete()
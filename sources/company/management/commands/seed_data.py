@@ -1,5 +1,6 @@
 import random
 from django.core.management.base import BaseCommand
+from config.profiling import profiled
 from django.utils import timezone
 from decimal import Decimal
 from company.models import CompanySettings, TaxRate
@@ -10,6 +11,7 @@ from procurement.models import Supplier, SupplierPrice
 class Command(BaseCommand):
     help = "Génère des données de test réalistes"
 
+    @profiled()
     def handle(self, *args, **options):
         self.stdout.write("Génération des données...")
 
@@ -0,0 +1,175 @@
+"""
+Arithmétique monétaire en centimes entiers.
+
+Les montants sont manipulés en unités mineures (centimes) et les taux de TVA
+en points de base (20.00 % -> 2000). Les règles d'arrondi reproduisent à
+l'identique les calculs ``Decimal`` historiques : ``quantize(Decimal('0.01'))``
+avec le contexte par défaut, c'est-à-dire l'arrondi bancaire (ROUND_HALF_EVEN).
+"""
+from decimal import Decimal, ROUND_HALF_EVEN
+
+CENT = Decimal('0.01')
+BP_SCALE = 10000  # 1 + taux : 10000 + points de base
+
+
+# -------------------------------------------------------------------
+# CONVERSIONS
+# -------------------------------------------------------------------
+
+def to_cents(amount):
+    """Montant à 2 décimales (Decimal, int, float) -> entier en centimes."""
+    if amount is None:
+        return 0
+    if not isinstance(amount, Decimal):
+        amount = Decimal(str(amount))
+    return int((amount * 100).to_integral_value(rounding=ROUND_HALF_EVEN))
+
+
+def from_cents(cents):
+    """Entier en centimes -> Decimal à 2 décimales (équivalent d'un quantize)."""
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def rate_to_bp(rate):
+    """Taux en pourcentage (Decimal('20.00')) -> points de base (2000)."""
+    return to_cents(rate)
+
+
+# -------------------------------------------------------------------
+# ARRONDIS
+# -------------------------------------------------------------------
+
+def round_half_even(numerator, denominator):
+    """Division entière arrondie au pair le plus proche (denominator > 0)."""
+    quotient, remainder = divmod(abs(numerator), denominator)
+    twice = 2 * remainder
+    if twice > denominator or (twice == denominator and quotient % 2 == 1):
+        quotient += 1
+    return quotient if numerator >= 0 else -quotient
+
+
+def round_half_up(numerator, denominator):
+    """Division entière arrondie à l'unité supérieure sur les demis (denominator > 0)."""
+    quotient, remainder = divmod(abs(numerator), denominator)
+    if 2 * remainder >= denominator:
+        quotient += 1
+    return quotient if numerator >= 0 else -quotient
+
+
+def allocate_cents(total, weights):
+    """
+    Répartit ``total`` centimes au prorata de ``weights`` (entiers positifs).
+    Les parts tombent juste : les centimes restants vont aux plus forts restes.
+    """
+    weight_sum = sum(weights)
+    if not weight_sum:
+        return [0] * len(weights)
+    shares = [divmod(total * weight, weight_sum) for weight in weights]
+    result = [quotient for quotient, _ in shares]
+    leftover = total - sum(result)
+    for i in sorted(range(len(weights)), key=lambda i: -shares[i][1])[:leftover]:
+        result[i] += 1
+    return result
+
+
+# -------------------------------------------------------------------
+# CALCULS HT / TTC
+# -------------------------------------------------------------------
+
+def _decimal_excl_tax_cents(incl_cents, vat_bp, quantity):
+    # Calcul historique : PU TTC / (1 + taux) arrondi à 28 chiffres, puis x quantité.
+    price_ht = from_cents(incl_cents) / (1 + Decimal(vat_bp) / BP_SCALE)
+    return to_cents((price_ht * quantity).quantize(CENT))
+
+
+def excl_tax_cents(incl_cents, vat_bp, quantity=1):
+    """
+    HT d'un montant TTC (éventuellement multiplié par une quantité).
+
+    Le quotient exact n'est ambigu que lorsqu'il tombe pile sur un demi-centime ;
+    le résultat Decimal dépend alors de l'arrondi intermédiaire à 28 chiffres,
+    on délègue donc ce cas (rare) au calcul Decimal d'origine.
+    """
+    denominator = BP_SCALE + vat_bp
+    numerator = incl_cents * quantity * BP_SCALE
+    if 2 * (numerator % denominator) == denominator:
+        return _decimal_excl_tax_cents(incl_cents, vat_bp, quantity)
+    return round_half_even(numerator, denominator)
+
+
+def incl_tax_cents(excl_cents, vat_bp):
+    """TTC arrondi au centime d'un montant HT."""
+    return round_half_even(excl_cents * (BP_SCALE + vat_bp), BP_SCALE)
+
+
+def margin_price_incl_tax_cents(cost_cents, coefficient_hundredths, vat_bp):
+    """Prix de vente TTC : achat HT x coefficient de marge x (1 + taux)."""
+    return round_half_even(cost_cents * coefficient_hundredths * (BP_SCALE + vat_bp), 100 * BP_SCALE)
+
+
+def order_totals_cents(lines, shipping_cents, shipping_vat_bp, discount_cents):
+    """
+    Totaux d'une commande à partir de lignes (unit_price_cents, qty, vat_bp).
+
+    Retourne (total_ht, total_vat, grand_total_ttc) en centimes. Le port TTC
+    n'est pas arrondi avant la somme : on travaille en 1/10000e de centime.
+    """
+    total_ht = 0
+    total_ttc_products = 0
+    for unit_cents, quantity, vat_bp in lines:
+        total_ht += excl_tax_cents(unit_cents, vat_bp, quantity)
+        total_ttc_products += unit_cents * quantity
+
+    shipping_ttc = shipping_cents * (BP_SCALE + shipping_vat_bp)
+    grand_total = (total_ttc_products - discount_cents) * BP_SCALE + shipping_ttc
+    total_vat = grand_total - (total_ht + shipping_cents) * BP_SCALE
+
+    return (
+        total_ht + shipping_cents,
+        round_half_even(total_vat, BP_SCALE),
+        round_half_even(grand_total, BP_SCALE),
+    )
+
+
+# -------------------------------------------------------------------
+# CALCULS PAR LOTS (NumPy)
+# -------------------------------------------------------------------
+
+def _np_round_half_even(np, numerator, denominator):
+    sign = np.sign(numerator)
+    quotient, remainder = np.divmod(np.abs(numerator), denominator)
+    twice = 2 * remainder
+    quotient += (twice > denominator) | ((twice == denominator) & (quotient % 2 == 1))
+    return sign * quotient
+
+
+def lines_totals(unit_price_cents, quantities, vat_bp):
+    """
+    Version vectorisée des totaux de lignes.
+
+    Prend trois tableaux alignés (PU TTC en centimes, quantités, taux en points
+    de base) et retourne trois tableaux int64 (HT, TTC, TVA) par ligne,
+    identiques aux propriétés ``OrderLine.total_line_*``.
+    """
+    import numpy as np  # Dépendance optionnelle : pip install numpy
+
+    unit_price_cents = np.asarray(unit_price_cents, dtype=np.int64)
+    quantities = np.asarray(quantities, dtype=np.int64)
+    vat_bp = np.asarray(vat_bp, dtype=np.int64)
+
+    ttc = unit_price_cents * quantities
+    numerator = ttc * BP_SCALE
+    denominator = BP_SCALE + vat_bp
+    ht = _np_round_half_even(np, numerator, denominator)
+
+    # Demi-centimes exacts : même repli Decimal que excl_tax_cents
+    for i in np.flatnonzero(2 * (numerator % denominator) == denominator):
+        ht[i] = _decimal_excl_tax_cents(int(unit_price_cents[i]), int(vat_bp[i]), int(quantities[i]))
+
+    return ht, ttc, ttc - ht
+
+
+def batch_totals(unit_price_cents, quantities, vat_bp):
+    """Sommes (HT, TTC, TVA) en centimes d'un lot de lignes."""
+    ht, ttc, vat = lines_totals(unit_price_cents, quantities, vat_bp)
+    return int(ht.sum()), int(ttc.sum()), int(vat.sum())
@@ -0,0 +1,55 @@
+"""
+Cache des données de référence (CompanySettings, TaxRate).
+
+Ces tables ne comptent que quelques lignes : elles sont entièrement chargées
+en mémoire dans chaque processus. Un tampon de version stocké dans le backend
+de cache indique quand recharger ; il est changé par les signaux save/delete
+de ces modèles (voir company.signals). Ce backend doit être partagé par tous
+les processus (cf. company.versioning).
+"""
+from .versioning import LocalSnapshot
+
+VERSION_KEY = 'company:reference-data:version'
+
+
+def _load():
+    from .models import CompanySettings, TaxRate
+
+    return {
+        'tax_rates': {tax.pk: tax for tax in TaxRate.objects.all()},
+        'company': CompanySettings.objects.select_related('default_tax').first(),
+    }
+
+
+_snapshot = LocalSnapshot(VERSION_KEY, _load)
+
+
+def get_tax_rate(pk):
+    """TaxRate par clé primaire (None si inconnu)"""
+    if pk is None:
+        return None
+    tax = _snapshot.get()['tax_rates'].get(pk)
+    if tax is None:
+        # Taux créé dans un autre processus depuis le dernier contrôle
+        tax = _snapshot.load()['tax_rates'].get(pk)
+    return tax
+
+
+def get_default_tax_rate():
+    """Taux marqué par défaut (à défaut celui des paramètres entreprise)"""
+    data = _snapshot.get()
+    for tax in data['tax_rates'].values():
+        if tax.is_default:
+            return tax
+    company = data['company']
+    return company.default_tax if company else None
+
+
+def get_company_settings():
+    """Paramètres de l'entreprise (singleton de fait, None si non renseigné)"""
+    return _snapshot.get()['company']
+
+
+def invalidate():
+    """Vide le cache local et change le tampon partagé une fois la transaction validée"""
+    _snapshot.invalidate()
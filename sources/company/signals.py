@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import CompanySettings, TaxRate
+from . import reference_cache
+
+@receiver([post_save, post_delete], sender=TaxRate)
+@receiver([post_save, post_delete], sender=CompanySettings)
+def invalidate_reference_cache(sender, **kwargs):
+    # Toute modification des données de référence change le tampon de version
+    reference_cache.invalidate()
\ No newline at end of file
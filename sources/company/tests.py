@@ -1,3 +1,254 @@
-from django.test import TestCase
+import random
+import tempfile
+import time
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from company import checks, money, reference_cache
+from company.models import CompanySettings, TaxRate
+from config import profiling
+
+# Un seul processus : un cache local suffit et les compteurs de requêtes ne voient que les tables métier
+# (repris par les tests des autres applications)
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+# Implémentations Decimal de référence (calculs historiques des modèles)
+
+def decimal_line_excl_tax(unit_price_incl_tax, vat_rate, quantity):
+    price_ht = unit_price_incl_tax / (1 + vat_rate / 100)
+    return (price_ht * quantity).quantize(Decimal('0.01'))
+
+def decimal_order_totals(lines, shipping_cost, shipping_rate, discount_amount):
+    total_ht = sum(decimal_line_excl_tax(u, r, q) for u, q, r in lines)
+    total_ttc_products = sum(u * q for u, q, r in lines)
+    shipping_ttc = shipping_cost * (1 + shipping_rate / 100)
+    grand_total_ttc = total_ttc_products + shipping_ttc - discount_amount
+    total_vat = grand_total_ttc - (total_ht + shipping_cost)
+    return (
+        (total_ht + shipping_cost).quantize(Decimal('0.01')),
+        total_vat.quantize(Decimal('0.01')),
+        grand_total_ttc.quantize(Decimal('0.01')),
+    )
+
+RATES = [Decimal('20.00'), Decimal('10.00'), Decimal('5.50'), Decimal('2.10'), Decimal('0.00')]
+
+
+def random_amount(rng, upper=500000):
+    return Decimal(rng.randint(0, upper)).scaleb(-2)
+
+
+class MoneyConversionTests(SimpleTestCase):
+    def test_round_trip(self):
+        for value in ('0.00', '0.01', '12.34', '99999999.99', '-3.50'):
+            self.assertEqual(money.from_cents(money.to_cents(Decimal(value))), Decimal(value))
+
+    def test_float_and_none(self):
+        self.assertEqual(money.to_cents(1.5), 150)
+        self.assertEqual(money.to_cents(None), 0)
+        self.assertEqual(money.rate_to_bp(Decimal('5.50')), 550)
+
+    def test_rounding_rules(self):
+        self.assertEqual(money.round_half_even(25, 10), 2)
+        self.assertEqual(money.round_half_even(35, 10), 4)
+        self.assertEqual(money.round_half_even(-25, 10), -2)
+        self.assertEqual(money.round_half_up(25, 10), 3)
+        self.assertEqual(money.round_half_up(-25, 10), -3)
+
+    def test_allocate_cents(self):
+        self.assertEqual(money.allocate_cents(1000, [12000, 2110]), [850, 150])
+        self.assertEqual(money.allocate_cents(100, [1, 1, 1]), [34, 33, 33])
+        self.assertEqual(money.allocate_cents(500, [0, 0]), [0, 0])
+
+
+class MoneyEquivalenceTests(SimpleTestCase):
+    """Le calcul en centimes doit reproduire exactement le calcul Decimal."""
+
+    def test_line_excl_tax_exhaustive_small_amounts(self):
+        for rate in RATES:
+            bp = money.rate_to_bp(rate)
+            for cents in range(0, 2000):
+                for quantity in (1, 2, 3, 7):
+                    expected = decimal_line_excl_tax(money.from_cents(cents), rate, quantity)
+                    self.assertEqual(
+                        money.from_cents(money.excl_tax_cents(cents, bp, quantity)), expected,
+                        (cents, rate, quantity),
+                    )
+
+    def test_line_excl_tax_random(self):
+        rng = random.Random(26)
+        for _ in range(20000):
+            unit, rate, quantity = random_amount(rng), rng.choice(RATES), rng.randint(1, 50)
+            expected = decimal_line_excl_tax(unit, rate, quantity)
+            got = money.excl_tax_cents(money.to_cents(unit), money.rate_to_bp(rate), quantity)
+            self.assertEqual(money.from_cents(got), expected, (unit, rate, quantity))
+
+    def test_incl_tax_and_margin(self):
+        rng = random.Random(27)
+        for _ in range(20000):
+            price, rate = random_amount(rng), rng.choice(RATES)
+            coefficient = Decimal(rng.randint(100, 400)).scaleb(-2)
+            multiplier = 1 + (rate / 100)
+            bp = money.rate_to_bp(rate)
+            self.assertEqual(
+                money.from_cents(money.incl_tax_cents(money.to_cents(price), bp)),
+                (price * multiplier).quantize(Decimal('0.01')),
+            )
+            self.assertEqual(
+                money.from_cents(money.margin_price_incl_tax_cents(
+                    money.to_cents(price), money.to_cents(coefficient), bp
+                )),
+                (price * coefficient * multiplier).quantize(Decimal('0.01')),
+            )
+
+    def test_order_totals_random(self):
+        rng = random.Random(28)
+        for _ in range(3000):
+            lines = [
+                (random_amount(rng, 100000), rng.randint(1, 10), rng.choice(RATES))
+                for _ in range(rng.randint(0, 8))
+            ]
+            shipping, shipping_rate = random_amount(rng, 5000), rng.choice(RATES)
+            discount = random_amount(rng, 20000)
+            expected = decimal_order_totals(lines, shipping, shipping_rate, discount)
+            got = money.order_totals_cents(
+                [(money.to_cents(u), q, money.rate_to_bp(r)) for u, q, r in lines],
+                money.to_cents(shipping), money.rate_to_bp(shipping_rate), money.to_cents(discount),
+            )
+            self.assertEqual(tuple(money.from_cents(c) for c in got), expected)
+
+    def test_batch_matches_scalar(self):
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            self.skipTest("numpy n'est pas installé")
+
+        rng = random.Random(29)
+        units = [rng.randint(0, 500000) for _ in range(50000)] + [1, 3, 5]
+        quantities = [rng.randint(1, 50) for _ in range(50000)] + [3, 1, 3]
+        rates = [money.rate_to_bp(rng.choice(RATES)) for _ in range(50000)] + [2000, 2000, 2000]
+
+        ht, ttc, vat = money.lines_totals(units, quantities, rates)
+        for i in range(len(units)):
+            expected = money.excl_tax_cents(units[i], rates[i], quantities[i])
+            self.assertEqual(int(ht[i]), expected)
+            self.assertEqual(int(ttc[i]), units[i] * quantities[i])
+            self.assertEqual(int(vat[i]), units[i] * quantities[i] - expected)
+
+        self.assertEqual(money.batch_totals(units, quantities, rates), (int(ht.sum()), int(ttc.sum()), int(vat.sum())))
+
+
+@override_settings(REFERENCE_CACHE_CHECK_INTERVAL=0, CACHES=LOCAL_CACHE)
+class ReferenceCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reference_cache._snapshot.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tva20 = TaxRate.objects.create(name="TVA 20%", rate=Decimal("20.00"), is_default=True)
+
+    def test_lookups_hit_memory_once_loaded(self):
+        reference_cache.get_tax_rate(self.tva20.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(reference_cache.get_tax_rate(self.tva20.pk).rate, Decimal("20.00"))
+            self.assertIsNone(reference_cache.get_company_settings())
+
+    def test_save_invalidates(self):
+        reference_cache.get_tax_rate(self.tva20.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tva20.rate = Decimal("21.00")
+            self.tva20.save()
+            CompanySettings.objects.create(name="OpenAxFlo", email="a@b.fr", address="1 rue", zip_code="75000", city="Paris")
+        self.assertEqual(reference_cache.get_tax_rate(self.tva20.pk).rate, Decimal("21.00"))
+        self.assertEqual(reference_cache.get_company_settings().name, "OpenAxFlo")
+
+    def test_process_local_cache_is_rejected(self):
+        self.assertEqual([error.id for error in checks.shared_cache_check(None)], ['company.E001'])
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+                                               'LOCATION': 'django_cache'}}):
+            self.assertEqual(checks.shared_cache_check(None), [])
+
+    def test_missing_cache_table_is_reported(self):
+        database_cache = {'BACKEND': checks.DATABASE_BACKEND, 'LOCATION': 'django_cache'}
+        with self.settings(CACHES={'default': database_cache}):
+            self.assertEqual(checks.cache_table_check(None, databases=['default']), [])
+        with self.settings(CACHES={'default': {**database_cache, 'LOCATION': 'missing_cache'}}):
+            self.assertEqual(checks.cache_table_check(None), [])  # sans --database : rien n'est lu
+            warnings = checks.cache_table_check(None, databases=['default'])
+            self.assertEqual([warning.id for warning in warnings], ['company.W001'])
+
+    def test_stamp_change_from_another_process_reloads(self):
+        reference_cache.get_tax_rate(self.tva20.pk)
+        TaxRate.objects.filter(pk=self.tva20.pk).update(rate=Decimal("5.50"))  # pas de signal
+        self.assertEqual(reference_cache.get_tax_rate(self.tva20.pk).rate, Decimal("20.00"))
+        cache.set(reference_cache.VERSION_KEY, 'autre-worker', None)
+        self.assertEqual(reference_cache.get_tax_rate(self.tva20.pk).rate, Decimal("5.50"))
+
+
+def busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.directory = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(override_settings(PROFILING_DIR=self.directory, PROFILING_INTERVAL=0.001))
+
+    def profiles(self, pattern='*'):
+        return sorted(self.directory.glob(f'*/{pattern}'))
+
+    def test_disabled_by_default(self):
+        profiling.profiled()(busy_loop)(0.02)
+        self.assertEqual(self.profiles(), [])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sampling_writes_collapsed_stacks(self):
+        profiling.profiled('command.busy')(busy_loop)(0.05)
+        [path] = self.profiles('*.folded')
+        self.assertEqual(path.parent.name, 'command.busy')
+        stacks = path.read_text().splitlines()
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in stacks))
+        self.assertTrue(any(line.split(' ')[0].endswith('company.tests.busy_loop') for line in stacks))
+
+    @override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_MODE='cprofile')
+    def test_cprofile_and_report(self):
+        profiling.profiled('command.busy')(busy_loop)(0.01)
+        self.assertEqual(len(self.profiles('*.prof')), 1)
+        out = StringIO()
+        call_command('profile_report', stdout=out)
+        self.assertIn('busy_loop', out.getvalue())
+
+    @override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_MODE='cprofile')
+    def test_middleware_profiles_requests_under_action_name(self):
+        from django.contrib.auth.models import User
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        self.client.post('/admin/sales/order/', {'action': 'mark_as_paid', '_selected_action': [0]})
+        self.client.get('/admin/sales/order/')
+        self.assertEqual(
+            {path.parent.name for path in self.profiles('*.prof')},
+            {'sales.OrderAdmin.mark_as_paid', 'admin_sales_order_changelist'},
+        )
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_report_aggregates_and_merges(self):
+        for _ in range(2):
+            profiling.profiled('command.busy')(busy_loop)(0.03)
+        merged = self.directory / 'all.folded'
+        out = StringIO()
+        call_command('profile_report', endpoints=['command'], merge=merged, top=5, stdout=out)
+        self.assertIn('command.busy', out.getvalue())
+        self.assertIn('company.tests.busy_loop', out.getvalue())
+        self.assertGreater(sum(int(line.rsplit(' ', 1)[1]) for line in merged.read_text().splitlines()), 0)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_KEEP=2)
+    def test_keeps_most_recent(self):
+        for _ in range(4):
+            profiling.profiled('command.busy', rate=1)(busy_loop)(0.01)
+        self.assertEqual(len(self.profiles()), 2)
@@ -0,0 +1,90 @@
+"""
+Tampons de version partagés et données de référence gardées en mémoire.
+
+Un tampon est une valeur quelconque posée dans le backend de cache, changée à
+chaque modification des données qu'il couvre : les clés de cache qui
+l'incluent deviennent obsolètes d'un coup, et chaque processus sait quand
+recharger ce qu'il garde en mémoire. Le backend doit être partagé par tous les
+processus (Redis ou table de la base, cf. CACHES) : avec un cache local, le
+tampon changé par un processus n'atteindrait pas les autres (contrôle
+company.E001, company.checks).
+
+Utilisé par company.reference_cache, inventory.labels, inventory.catalog et
+sales.affinity.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+def random_stamp():
+    return uuid.uuid4().hex
+
+
+class SharedVersion:
+    """Tampon de version stocké sous ``key`` dans le backend de cache partagé"""
+
+    def __init__(self, key, stamp=random_stamp):
+        self.key = key
+        self.stamp = stamp
+
+    def get(self):
+        value = cache.get(self.key)
+        if value is None:
+            # Clé évincée ou premier démarrage : on en pose une (sans écraser un voisin)
+            cache.add(self.key, self.stamp(), None)
+            value = cache.get(self.key)
+        return value
+
+    def set(self):
+        cache.set(self.key, self.stamp(), None)
+
+    def bump(self):
+        """Nouveau tampon une fois la transaction validée (les autres processus liraient sinon l'ancien état)"""
+        transaction.on_commit(self.set)
+
+
+class LocalSnapshot:
+    """
+    Données chargées en mémoire par ``loader()`` dans chaque processus et
+    rechargées quand le tampon partagé ``key`` change. Le tampon est relu au
+    plus une fois par REFERENCE_CACHE_CHECK_INTERVAL secondes (0 = à chaque
+    accès).
+    """
+
+    def __init__(self, key, loader):
+        self.version = SharedVersion(key)
+        self.loader = loader
+        self.data = None
+        self.loaded_version = None
+        self.checked_at = 0.0
+
+    def load(self, version=None):
+        version = self.version.get() if version is None else version
+        # Données avant le tampon : un lecteur concurrent ne voit jamais un tampon neuf sur des données anciennes
+        self.data = self.loader()
+        self.loaded_version = version
+        return self.data
+
+    def get(self, force=False):
+        """Données à jour (``force`` : contrôle du tampon sans attendre l'intervalle)"""
+        interval = getattr(settings, 'REFERENCE_CACHE_CHECK_INTERVAL', 1.0)
+        now = time.monotonic()
+        if force or self.loaded_version is None or now - self.checked_at >= interval:
+            version = self.version.get()
+            self.checked_at = now
+            if version != self.loaded_version:
+                self.load(version)
+        return self.data
+
+    def clear(self):
+        """Oublie les données locales (rechargées au prochain accès)"""
+        self.loaded_version = None
+
+    def invalidate(self):
+        """Vide le cache local et change le tampon partagé une fois la transaction validée"""
+        self.clear()
+        self.version.bump()
@@ -0,0 +1,68 @@
+"""
+Autocomplete admin à coût constant.
+
+Le widget AutocompleteSelect de Django fait une requête par widget pour
+retrouver le libellé de la valeur sélectionnée : une page de commande à N
+lignes coûte N requêtes. Ici, les inlines fournissent au widget le libellé de
+l'objet déjà chargé (select_related du queryset de l'inline) ; le widget ne
+retombe sur la requête que pour une valeur inconnue (formulaire invalide
+réaffiché, etc.).
+"""
+from django.contrib.admin.widgets import AutocompleteSelect
+
+
+class PreloadedAutocompleteSelect(AutocompleteSelect):
+    """AutocompleteSelect qui accepte des libellés préchargés {valeur: libellé}"""
+    preloaded = None
+
+    def optgroups(self, name, value, attr=None):
+        selected = {str(v) for v in value if str(v) not in self.choices.field.empty_values}
+        if not self.preloaded or not selected or not selected <= self.preloaded.keys():
+            return super().optgroups(name, value, attr)
+
+        default = (None, [], 0)
+        if not self.is_required:
+            default[1].append(self.create_option(name, '', '', False, 0))
+        for option_value in selected:
+            default[1].append(self.create_option(
+                name, option_value, self.preloaded[option_value], selected, len(default[1]),
+            ))
+        return [default]
+
+
+class PreloadedAutocompleteInlineMixin:
+    """
+    InlineModelAdmin : les champs de ``autocomplete_fields`` (clés étrangères)
+    reçoivent le libellé de l'objet lié déjà en cache sur l'instance. Le
+    queryset de l'inline doit faire le select_related correspondant.
+    """
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.get_autocomplete_fields(request) and 'widget' not in kwargs:
+            kwargs['widget'] = PreloadedAutocompleteSelect(db_field, self.admin_site, using=kwargs.get('using'))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(*self.get_autocomplete_fields(request))
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        names = self.get_autocomplete_fields(request)
+        base_form = formset.form
+
+        class PreloadedForm(base_form):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                for name in names:
+                    field = self.fields.get(name)
+                    descriptor = self.instance._meta.get_field(name)
+                    if field is None or not descriptor.is_cached(self.instance):
+                        continue
+                    related = descriptor.get_cached_value(self.instance)
+                    widget = getattr(field.widget, 'widget', field.widget)  # RelatedFieldWidgetWrapper
+                    if related is not None and isinstance(widget, PreloadedAutocompleteSelect):
+                        widget.preloaded = {str(related.pk): field.label_from_instance(related)}
+
+        PreloadedForm.__name__ = base_form.__name__
+        formset.form = PreloadedForm
+        return formset
@@ -0,0 +1,124 @@
+"""
+Routage des lectures vers la réplique (alias ``replica``).
+
+Seules les charges explicitement désignées (reporting, exports, compteurs du
+tableau de bord, recherche admin) lisent sur la réplique, via ``use_replica()``
+ou ``read_alias()``. Toute écriture épingle la requête en cours sur la base
+principale (lecture de ses propres écritures) ; le middleware prolonge cet
+épinglage quelques secondes par cookie pour couvrir le POST -> redirect -> GET.
+
+Test en local avec deux bases SQLite :
+
+    DB_REPLICA_ENGINE=django.db.backends.sqlite3 DB_REPLICA_NAME=/tmp/replica.sqlite3
+"""
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+PRIMARY = 'default'
+REPLICA = 'replica'
+PIN_COOKIE = 'db_pin'
+
+_replica_requested = ContextVar('replica_requested', default=False)
+_pinned = ContextVar('pinned_to_primary', default=False)
+
+
+def replica_enabled():
+    return REPLICA in settings.DATABASES
+
+
+def pin_primary():
+    """Force toutes les lectures suivantes (même contexte) sur la base principale"""
+    _pinned.set(True)
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+def read_alias():
+    """Alias à utiliser pour un queryset évalué plus tard (streaming, admin)"""
+    if replica_enabled() and not _pinned.get():
+        return REPLICA
+    return PRIMARY
+
+
+class use_replica(ContextDecorator):
+    """Désigne un bloc de lectures comme pouvant aller sur la réplique"""
+
+    def __enter__(self):
+        self._token = _replica_requested.set(True)
+        return self
+
+    def __exit__(self, *exc):
+        _replica_requested.reset(self._token)
+        return False
+
+    def _recreate_cm(self):
+        # Utilisé en décorateur, une même instance sert à tous les threads : un jeton par appel
+        return type(self)()
+
+
+def _is_cache_table(model):
+    # Table du DatabaseCache (CACHES) : tampons de version lus sans retard de réplication,
+    # et une écriture de cache n'épingle pas la requête sur la base principale
+    return model is not None and model._meta.app_label == 'django_cache'
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _is_cache_table(model):
+            return PRIMARY
+        if _replica_requested.get():
+            return read_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        if _is_cache_table(model):
+            return PRIMARY
+        pin_primary()
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Les deux alias pointent sur les mêmes données
+        return True
+
+
+@sync_and_async_middleware
+def replica_pinning_middleware(get_response):
+    """Remet l'état de routage à zéro pour chaque requête et gère le cookie d'épinglage"""
+    pin_seconds = getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 5)
+
+    def start(request):
+        return _pinned.set(bool(request.COOKIES.get(PIN_COOKIE))), _replica_requested.set(False)
+
+    def finish(response, tokens):
+        if _pinned.get() and replica_enabled():
+            response.set_cookie(PIN_COOKIE, '1', max_age=pin_seconds, httponly=True, samesite='Lax')
+        _pinned.reset(tokens[0])
+        _replica_requested.reset(tokens[1])
+        return response
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            tokens = start(request)
+            return finish(await get_response(request), tokens)
+    else:
+        def middleware(request):
+            tokens = start(request)
+            return finish(get_response(request), tokens)
+
+    return middleware
+
+
+class ReplicaSearchMixin:
+    """ModelAdmin : les recherches en liste (GET uniquement, jamais les actions) lisent sur la réplique"""
+
+    def get_search_results(self, request, queryset, search_term):
+        queryset, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term and request.method == 'GET':
+            queryset = queryset.using(read_alias())
+        return queryset, may_have_duplicates
@@ -0,0 +1,249 @@
+"""
+Profilage à la demande des vues, actions d'admin et commandes.
+
+Désactivé par défaut (``PROFILING_SAMPLE_RATE = 0``). Au-delà, une fraction
+des requêtes (middleware) et des exécutions décorées par ``profiled()``
+(actions d'admin, ``handle`` des commandes) est profilée :
+
+- ``sampling`` : un thread relève la pile du thread profilé toutes les
+  ``PROFILING_INTERVAL`` secondes ; fichier ``.folded`` (piles repliées, une
+  par ligne suivie de son nombre d'échantillons) lisible par flamegraph.pl,
+  speedscope ou inferno ;
+- ``cprofile`` : cProfile déterministe, fichier ``.prof`` (pstats, snakeviz).
+
+Les fichiers sont rangés par point d'entrée sous ``PROFILING_DIR``
+(``<point d'entrée>/<horodatage>-<pid>-<durée>ms.<ext>``) ; la commande
+``profile_report`` agrège les fonctions les plus coûteuses. Un seul profil
+à la fois par processus : une requête tirée pendant qu'un autre profil tourne
+n'est pas profilée, ce qui borne le surcoût. Sous ASGI, le mode ``sampling``
+relève le thread de la boucle d'événements : les vues synchrones, exécutées
+dans un thread du pool, n'y apparaissent qu'au travers de leurs actions ou
+commandes décorées.
+"""
+import cProfile
+import functools
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+from django.utils.decorators import sync_and_async_middleware
+
+MODES = {'sampling': '.folded', 'cprofile': '.prof'}
+DECLINED = object()  # requête tirée mais non profilée : les appels imbriqués ne retirent pas
+
+_current = ContextVar('current_profile', default=None)
+_busy = threading.Lock()
+
+
+def sample_rate():
+    return float(getattr(settings, 'PROFILING_SAMPLE_RATE', 0))
+
+
+def profile_dir():
+    return Path(getattr(settings, 'PROFILING_DIR', Path(settings.BASE_DIR) / 'profiles'))
+
+
+def endpoint_slug(endpoint):
+    return re.sub(r'[^\w.-]+', '_', endpoint).strip('_') or 'unknown'
+
+
+def frame_label(frame):
+    """``module.Classe.fonction`` : ni ';' ni espace, séparateurs du format replié"""
+    module = frame.f_globals.get('__name__', '?')
+    return f"{module}.{frame.f_code.co_qualname}".replace(';', ':').replace(' ', '_')
+
+
+def collapse(frame):
+    """Pile d'un frame, de la racine vers la feuille, au format replié"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class StackSampler:
+    """Échantillonne la pile d'un thread depuis un thread dédié"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiling-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        path.write_text(''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()))
+
+
+class Profile:
+    """Un profil en cours ; ``endpoint`` peut être précisé avant la fin (action d'admin)"""
+
+    def __init__(self, endpoint, mode=None, interval=None):
+        self.endpoint = endpoint
+        self.mode = mode or getattr(settings, 'PROFILING_MODE', 'sampling')
+        if self.mode not in MODES:
+            raise ValueError(f"PROFILING_MODE inconnu : {self.mode!r} ({', '.join(MODES)})")
+        self.interval = interval or getattr(settings, 'PROFILING_INTERVAL', 0.005)
+        self.path = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.mode == 'cprofile':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.profiler = StackSampler(threading.get_ident(), self.interval)
+            self.profiler.start()
+
+    def stop(self):
+        if self.mode == 'cprofile':
+            self.profiler.disable()
+        else:
+            self.profiler.stop()
+        self.duration = time.perf_counter() - self.started
+
+    def save(self):
+        """Écrit le fichier du profil (rien si aucun échantillon) ; retourne son chemin"""
+        if self.mode == 'sampling' and not self.profiler.stacks:
+            return None
+        directory = profile_dir() / endpoint_slug(self.endpoint)
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = timezone.now().strftime('%Y%m%dT%H%M%S%f')
+        self.path = directory / f"{stamp}-{os.getpid()}-{self.duration * 1000:.0f}ms{MODES[self.mode]}"
+        if self.mode == 'cprofile':
+            self.profiler.dump_stats(self.path)
+        else:
+            self.profiler.write(self.path)
+        _prune(directory)
+        return self.path
+
+
+def _prune(directory):
+    """Ne garde que les PROFILING_KEEP profils les plus récents d'un point d'entrée"""
+    keep = getattr(settings, 'PROFILING_KEEP', 200)
+    files = sorted(directory.iterdir(), key=lambda path: path.name)
+    for path in files[:max(len(files) - keep, 0)]:
+        path.unlink(missing_ok=True)
+
+
+def _begin(endpoint, rate):
+    """Tire au sort et démarre un profil ; retourne (profil ou DECLINED, jeton)"""
+    if random.random() < rate and _busy.acquire(blocking=False):
+        profile = Profile(endpoint)
+        try:
+            profile.start()
+        except BaseException:
+            _busy.release()
+            raise
+        return profile, _current.set(profile)
+    return DECLINED, _current.set(DECLINED)
+
+
+def _end(profile, token):
+    _current.reset(token)
+    if profile is DECLINED:
+        return
+    try:
+        profile.stop()
+        profile.save()
+    finally:
+        _busy.release()
+
+
+def profiled(endpoint=None, rate=None):
+    """
+    Décorateur d'action d'admin ou de ``Command.handle`` : profile une fraction
+    des exécutions (``rate``, par défaut PROFILING_SAMPLE_RATE). Appelée pendant
+    une requête déjà tirée par le middleware, la fonction ne fait que nommer le
+    point d'entrée du profil de la requête.
+    """
+    def decorator(func):
+        name = endpoint or _default_endpoint(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            current = _current.get()
+            if current is not None:
+                if current is not DECLINED:
+                    current.endpoint = name
+                return func(*args, **kwargs)
+            effective_rate = sample_rate() if rate is None else rate
+            if effective_rate <= 0:
+                return func(*args, **kwargs)
+            profile, token = _begin(name, effective_rate)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _end(profile, token)
+        return wrapper
+    return decorator
+
+
+def _default_endpoint(func):
+    # sales.management.commands.import_orders -> command.import_orders ; sales.admin -> sales.OrderAdmin.action
+    module = func.__module__
+    if '.management.commands.' in module:
+        return f"command.{module.rsplit('.', 1)[1]}"
+    return f"{module.split('.', 1)[0]}.{func.__qualname__}"
+
+
+def request_endpoint(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is not None:
+        return match.view_name or match._func_path
+    return 'unresolved'
+
+
+@sync_and_async_middleware
+def profiling_middleware(get_response):
+    """Profile une fraction des requêtes ; retiré de la pile si PROFILING_SAMPLE_RATE vaut 0"""
+    rate = sample_rate()
+    if rate <= 0:
+        raise MiddlewareNotUsed
+
+    def finish(request, state):
+        profile, token = state
+        if profile is not DECLINED and profile.endpoint is None:
+            profile.endpoint = request_endpoint(request)
+        _end(profile, token)
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            state = _begin(None, rate)
+            try:
+                return await get_response(request)
+            finally:
+                finish(request, state)
+    else:
+        def middleware(request):
+            state = _begin(None, rate)
+            try:
+                return get_response(request)
+            finally:
+                finish(request, state)
+
+    return middleware
@@ -0,0 +1,61 @@
+"""
+Plans d'exécution des requêtes chaudes (tests de non-régression des index).
+
+``sequential_scans`` renvoie les tables lues intégralement par une requête :
+
+- PostgreSQL : ``EXPLAIN (FORMAT JSON)`` avec ``enable_seqscan`` désactivé
+  pour la transaction, afin que le planificateur ne préfère pas un parcours
+  séquentiel sur une petite base de test ; un « Seq Scan » restant signifie
+  qu'aucun index ne peut servir ;
+- SQLite : ``EXPLAIN QUERY PLAN`` ; ``SCAN <table>`` sans ``USING ... INDEX``.
+
+Les requêtes s'obtiennent depuis un queryset ou capturées pendant l'exécution
+du vrai code (``captured_selects``), pour tester les requêtes telles qu'elles
+partent en base.
+"""
+import json
+import re
+
+from django.db import connections, transaction
+from django.test.utils import CaptureQueriesContext
+
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+
+def explain(sql, params=(), using='default'):
+    """Plan d'exécution : lignes de texte (SQLite) ou arbre JSON (PostgreSQL)"""
+    connection = connections[using]
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params or None)
+            plan = cursor.fetchone()[0]
+            return json.loads(plan) if isinstance(plan, str) else plan
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params or None)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def sequential_scans(query, params=(), using=None):
+    """Tables parcourues intégralement par ``query`` (queryset ou SQL)"""
+    if hasattr(query, 'query'):
+        using = using or query.db
+        query, params = query.query.sql_with_params()
+    using = using or 'default'
+    plan = explain(query, params, using)
+    if connections[using].vendor == 'postgresql':
+        return sorted(_pg_seq_scans(plan[0]['Plan']))
+    return sorted(match.group(1) for line in plan if (match := SQLITE_SCAN.match(line)))
+
+
+def _pg_seq_scans(node):
+    if node.get('Node Type') == 'Seq Scan':
+        yield node['Relation Name']
+    for child in node.get('Plans', []):
+        yield from _pg_seq_scans(child)
+
+
+def captured_selects(func, using='default'):
+    """Exécute ``func`` et renvoie le SQL (paramètres inclus) des SELECT émis"""
+    with CaptureQueriesContext(connections[using]) as captured:
+        func()
+    return [query['sql'] for query in captured.captured_queries if query['sql'].lstrip().upper().startswith('SELECT')]
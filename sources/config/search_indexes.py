@@ -0,0 +1,64 @@
+"""
+Index trigrammes (PostgreSQL) pour la recherche admin et l'autocomplete.
+
+La recherche admin filtre par ``icontains``, traduit en
+``UPPER(col::text) LIKE UPPER('%terme%')`` : aucun index B-tree ne sert.
+Un index GIN ``gin_trgm_ops`` sur la même expression, si. L'opération est
+sans effet hors PostgreSQL (SQLite en développement), et se contente d'un
+avertissement si l'extension pg_trgm n'est pas installée sur le serveur.
+"""
+import warnings
+
+from django.db.migrations.operations.base import Operation
+
+
+class TrigramSearchIndexes(Operation):
+    reversible = True
+    reduces_to_sql = False
+
+    def __init__(self, model_name, fields):
+        self.model_name = model_name
+        self.fields = fields
+
+    def deconstruct(self):
+        return self.__class__.__qualname__, [self.model_name, self.fields], {}
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def _indexes(self, app_label, state):
+        model = state.apps.get_model(app_label, self.model_name)
+        table = model._meta.db_table
+        for field_name in self.fields:
+            column = model._meta.get_field(field_name).column
+            yield f"{table}_{column}_trgm"[:63], table, column
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+            available = cursor.fetchone() is not None
+        if not available:
+            warnings.warn(f"pg_trgm indisponible : pas d'index de recherche sur {self.model_name}")
+            return
+        quote = schema_editor.quote_name
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for name, table, column in self._indexes(app_label, to_state):
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} "
+                f"USING gin ((UPPER({quote(column)}::text)) gin_trgm_ops)"
+            )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for name, _, _ in self._indexes(app_label, from_state):
+            schema_editor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(name)}")
+
+    def describe(self):
+        return f"Index trigrammes de recherche sur {self.model_name} ({', '.join(self.fields)})"
+
+    @property
+    def migration_name_fragment(self):
+        return f"{self.model_name.lower()}_search_trgm"
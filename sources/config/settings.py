@@ -42,9 +42,11 @@ INSTALLED_APPS = [
     'procurement.apps.ProcurementConfig',
     'sales.apps.SalesConfig',
     'company.apps.CompanyConfig',
+    'outbox.apps.OutboxConfig',
 ]
 
 MIDDLEWARE = [
+    'config.profiling.profiling_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,6 +54,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'config.db_router.replica_pinning_middleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -73,6 +76,37 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
+
+# Intervalle (s) entre deux contrôles du tampon de version du cache TaxRate / CompanySettings
+REFERENCE_CACHE_CHECK_INTERVAL = float(os.environ.get('REFERENCE_CACHE_CHECK_INTERVAL', 1.0))
+
+# Outbox : reprises des handlers en échec (backoff exponentiel)
+OUTBOX_MAX_ATTEMPTS = 10
+OUTBOX_BACKOFF_SECONDS = 5
+OUTBOX_BACKOFF_MAX_SECONDS = 3600
+
+# Ancienneté (jours) à partir de laquelle une commande livrée ou annulée part en archive (sales.archive)
+ORDER_ARCHIVE_AFTER_DAYS = int(os.environ.get('ORDER_ARCHIVE_AFTER_DAYS', 365))
+
+# Recul (minutes) des points de stock (inventory.ledger.take_checkpoint) : un mouvement est daté avant la
+# validation de sa transaction, le point ne couvre que les mouvements plus anciens que la plus longue transaction
+STOCK_CHECKPOINT_LAG_MINUTES = int(os.environ.get('STOCK_CHECKPOINT_LAG_MINUTES', 10))
+
+# Nombre de rendus PDF de factures en parallèle (pool dédié des vues async)
+INVOICE_PDF_WORKERS = int(os.environ.get('INVOICE_PDF_WORKERS', 4))
+
+# API catalogue (inventory.catalog) : jetons Bearer acceptés, séparés par des virgules. Sans jeton l'API
+# est fermée, sauf ouverture explicite (CATALOG_API_PUBLIC=1 : catalogue en accès libre)
+CATALOG_API_TOKENS = [token for token in os.environ.get('CATALOG_API_TOKENS', '').split(',') if token]
+CATALOG_API_PUBLIC = os.environ.get('CATALOG_API_PUBLIC') == '1'
+
+# Profilage échantillonné (config.profiling) : fraction des requêtes, actions et commandes profilées, 0 = désactivé
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_MODE = os.environ.get('PROFILING_MODE', 'sampling')  # 'sampling' (.folded) ou 'cprofile' (.prof)
+PROFILING_INTERVAL = float(os.environ.get('PROFILING_INTERVAL', 0.005))  # pas d'échantillonnage (s)
+PROFILING_DIR = Path(os.environ.get('PROFILING_DIR', BASE_DIR / 'profiles'))
+PROFILING_KEEP = 200  # profils conservés par point d'entrée
 
 
 # Database
@@ -89,6 +123,46 @@ DATABASES = {
     }
 }
 
+# Réplique en lecture optionnelle (reporting, exports, tableau de bord, recherche)
+# Activée dès que DB_REPLICA_HOST ou DB_REPLICA_NAME est défini.
+if os.environ.get('DB_REPLICA_HOST') or os.environ.get('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'ENGINE': os.environ.get('DB_REPLICA_ENGINE', DATABASES['default']['ENGINE']),
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.environ.get('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.environ.get('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.environ.get('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['config.db_router.ReplicaRouter']
+
+# Durée (s) pendant laquelle un client qui vient d'écrire reste lu sur la base principale
+DATABASE_REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', 5))
+
+# Cache partagé par tous les processus (workers web, worker outbox, commandes) : les tampons de
+# version des caches locaux y vivent et doivent être vus de tous (contrôle company.E001).
+# Redis si REDIS_URL est défini (paquet redis), sinon une table de la base, à créer après migrate par
+# manage.py createcachetable (contrôle company.W001, cf. README).
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+            # Fragments du catalogue et affinités par produit : de l'ordre d'une entrée par produit
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -141,6 +215,14 @@ JAZZMIN_SETTINGS = {
     "show_sidebar": True,
     "navigation_expanded": True,
     
+    # Rapports hors modèles
+    "custom_links": {
+        "sales": [
+            {"name": "Rapport de marge", "url": "margin_report", "icon": "fas fa-chart-line", "permissions": ["sales.view_order"]},
+            {"name": "TVA collectée", "url": "vat_report", "icon": "fas fa-percent", "permissions": ["sales.view_order"]},
+        ],
+    },
+
     "topmenu_links": [
         {"name": "Home", "url": "admin:index", "permissions": ["auth.view_user"]},
         {"model": "auth.User"},
@@ -161,6 +243,7 @@ JAZZMIN_SETTINGS = {
         "procurement.purchaseprice": "fas fa-tags",
         "sales.customer": "fas fa-users-tie",
         "sales.order": "fas fa-file-invoice-dollar",
+        "sales.archivedorder": "fas fa-archive",
         "sales.promotion": "fas fa-percentage",
         "sales.creditnote": "fas fa-hand-holding-usd",
     },
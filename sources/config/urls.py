@@ -19,5 +19,6 @@ from django.urls import path, include
 
 urlpatterns = [
     path('sales/', include('sales.urls')),
+    path('catalog/', include('inventory.urls')),
     path('admin/', admin.site.urls),
 ]
@@ -1,25 +1,90 @@
 from django.contrib import admin
+from config.db_router import ReplicaSearchMixin
+from config.exports import Export, ExportMixin
 
 # Register your models here.
-from .models import Category, Brand, Product
+from .models import Category, Brand, Product, StockMovement, StockCheckpoint, DemandForecast
 # On importe l'Inline depuis l'autre application
 from procurement.admin import SupplierPriceInline
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(ReplicaSearchMixin, admin.ModelAdmin):
     list_display = ('name', 'parent', 'slug')
     list_filter = ('parent',)
     search_fields = ('name',)
+    ordering = ('name',)
     prepopulated_fields = {'slug': ('name',)} # Génère le slug automatiquement
 
 @admin.register(Brand)
-class BrandAdmin(admin.ModelAdmin):
+class BrandAdmin(ReplicaSearchMixin, admin.ModelAdmin):
     list_display = ('name',)
+    search_fields = ('name',)
+    ordering = ('name',)
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'category', 'brand', 'retail_price')
-    list_filter = ('category', 'brand')
-    search_fields = ('name',)
+class ProductAdmin(ExportMixin, ReplicaSearchMixin, admin.ModelAdmin):
+    list_display = ('name', 'sku', 'category', 'brand', 'retail_price', 'abc_class', 'xyz_class')
+    list_filter = ('abc_class', 'xyz_class', 'category', 'brand')
+    search_fields = ('name', 'sku')
+    ordering = ('name',)
+    list_select_related = ('category', 'brand')
+    export_plan = Export([
+        ("ID", 'id'),
+        ("SKU", 'sku'),
+        ("Nom", 'name'),
+        ("Catégorie", 'category__name'),
+        ("Marque", 'brand__name'),
+        ("Taux TVA", 'tax_rate__rate'),
+        ("Prix HT", 'retail_price'),
+        ("Prix TTC", 'retail_price_incl_tax'),
+        ("Coeff. marge", 'margin_coefficient'),
+        ("Stock", 'stock_quantity'),
+        ("Seuil d'alerte", 'low_stock_threshold'),
+        ("Classe ABC", 'abc_class'),
+        ("Classe XYZ", 'xyz_class'),
+    ], filename='produits')
     # On insère l'Inline ici
-    inlines = [SupplierPriceInline]
\ No newline at end of file
+    inlines = [SupplierPriceInline]
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    # Journal append-only : consultation seule
+    list_display = ('product', 'quantity', 'reason', 'reference', 'created_at')
+    list_filter = ('reason',)
+    search_fields = ('reference', 'product__sku')
+    list_select_related = ('product',)
+    raw_id_fields = ('product',)
+    date_hierarchy = 'created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(StockCheckpoint)
+class StockCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('product', 'quantity', 'unit_cost', 'taken_at')
+    list_select_related = ('product',)
+    raw_id_fields = ('product',)
+    date_hierarchy = 'taken_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(DemandForecast)
+class DemandForecastAdmin(admin.ModelAdmin):
+    list_display = ('product', 'total', 'rmse', 'start_date', 'generated_at')
+    list_select_related = ('product',)
+    search_fields = ('product__name', 'product__sku')
+    ordering = ('-total',)
+    raw_id_fields = ('product',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
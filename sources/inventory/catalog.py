@@ -0,0 +1,150 @@
+"""
+Catalogue produits en lecture seule (API JSON des connecteurs boutique et
+places de marché, cf. inventory.views).
+
+Chaque produit est sérialisé une fois en JSON (prix TTC et HT, stock
+disponible, marque, chemin de catégorie) et ce fragment est gardé en cache :
+une page n'est que l'assemblage des fragments de ses produits, sans
+sérialisation ni jointure. Deux tampons partagés dans le backend de cache
+(company.versioning) :
+
+- ``VERSION_KEY`` (``<horodatage ms>-<aléa>``) change à toute modification du
+  catalogue et donne l'ETag et le Last-Modified des réponses : un client qui
+  renvoie ce qu'il a reçu obtient un 304 sans lire le catalogue (avec le
+  cache en base, la lecture du tampon reste une requête sur sa table) ;
+- ``GENERATION_KEY`` entre dans la clé des fragments ; changé par une
+  modification de catégorie, de marque ou de taux de TVA, il rend tous les
+  fragments obsolètes d'un coup (les anciens expirent après CACHE_TIMEOUT).
+
+Le backend doit être partagé par tous les workers (contrôle company.E001) :
+avec un cache local, chaque worker aurait son propre tampon (ETag différents
+d'un worker à l'autre) et ne verrait pas les invalidations des autres, ce qui
+servirait des 304 sur un catalogue modifié. Un tampon évincé est remplacé
+par un seul nouveau (cache.add), repris par tous les workers.
+
+Un produit modifié (save/delete, décrémentation du stock à l'expédition) ne
+perd que son propre fragment : chaque produit a son tampon, qui entre aussi
+dans la clé de son fragment et que l'invalidation remplace. Le tampon est lu
+avant le produit : un fragment construit pendant une modification concurrente
+est rangé sous l'ancien tampon, que plus personne ne lit ; la compaction des compteurs répartis ne change
+pas le stock disponible et n'invalide rien (sauf survente ramenée à zéro).
+Comme pour company.reference_cache, les invalidations partent une fois la
+transaction validée.
+"""
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from company.versioning import SharedVersion, random_stamp
+from . import counters, labels
+from .models import Product
+
+CACHE_TIMEOUT = 3600
+VERSION_KEY = 'inventory:catalog:version'
+GENERATION_KEY = 'inventory:catalog:generation'
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def _stamp():
+    return f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:12]}"
+
+
+_version = SharedVersion(VERSION_KEY, _stamp)
+_generation = SharedVersion(GENERATION_KEY, _stamp)
+
+
+def version():
+    """Tampon de version du catalogue (ETag des réponses)"""
+    return _version.get()
+
+
+def last_modified(stamp=None):
+    """Date de la dernière modification connue du catalogue"""
+    millis = int((stamp or version()).split('-', 1)[0])
+    return datetime.fromtimestamp(millis / 1000, tz=timezone.utc)
+
+
+def _payload_key(generation, pk, stamp):
+    return f'inventory:catalog:{generation}:{pk}:{stamp}'
+
+
+def _stamp_key(pk):
+    return f'inventory:catalog:product:{pk}'
+
+
+def _product_stamps(pks):
+    """Tampons des produits ``pks`` ; ceux évincés sont remplacés comme SharedVersion.get"""
+    keys = {pk: _stamp_key(pk) for pk in pks}
+    stamps = cache.get_many(list(keys.values()))
+    return {pk: stamps[key] if key in stamps else SharedVersion(key).get() for pk, key in keys.items()}
+
+
+def serialize(product):
+    """Fragment JSON d'un produit (annoté par counters.with_available_stock, marque et TVA jointes)"""
+    return json.dumps({
+        'id': product.pk,
+        'sku': product.sku,
+        'name': product.name,
+        'brand': product.brand.name if product.brand_id else None,
+        'category': labels.category_path(product.category_id),
+        'price_incl_tax': product.retail_price_incl_tax,
+        'price_excl_tax': product.retail_price,
+        'vat_rate': product.tax_rate.rate,
+        'stock': product.available_stock,
+    }, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def payloads(pks):
+    """Fragments JSON des produits ``pks`` (dans cet ordre, inconnus omis), construits au besoin"""
+    generation = _generation.get()
+    stamps = _product_stamps(pks)
+    keys = {pk: _payload_key(generation, pk, stamps[pk]) for pk in pks}
+    cached = cache.get_many(list(keys.values()))
+    found = {pk: cached[key] for pk, key in keys.items() if key in cached}
+
+    missing = [pk for pk in pks if pk not in found]
+    if missing:
+        labels.refresh()  # pas de chemin de catégorie périmé figé pour CACHE_TIMEOUT
+        products = counters.with_available_stock(
+            Product.objects.filter(pk__in=missing).select_related('brand', 'tax_rate')
+        )
+        built = {product.pk: serialize(product) for product in products}
+        cache.set_many({keys[pk]: payload for pk, payload in built.items()}, CACHE_TIMEOUT)
+        found.update(built)
+    return [found[pk] for pk in pks if pk in found]
+
+
+def page(cursor=0, limit=PAGE_SIZE):
+    """
+    Produits d'identifiant supérieur à ``cursor``, par identifiant croissant.
+    Retourne (fragments, curseur de la page suivante ou None). La pagination
+    par curseur reste stable quand des produits sont ajoutés ou supprimés, et
+    chaque page coûte un parcours de la clé primaire, quelle que soit sa position.
+    """
+    pks = list(Product.objects.filter(pk__gt=cursor).order_by('pk').values_list('pk', flat=True)[:limit + 1])
+    next_cursor = pks[limit - 1] if len(pks) > limit else None
+    return payloads(pks[:limit]), next_cursor
+
+
+def invalidate_products(pks):
+    """Fragments des produits ``pks`` à reconstruire, nouvelle version du catalogue"""
+    pks = list(pks)
+
+    def run():
+        # Les anciens fragments ne sont plus lus et expirent après CACHE_TIMEOUT
+        cache.set_many({_stamp_key(pk): random_stamp() for pk in pks}, None)
+        _version.set()
+    transaction.on_commit(run)
+
+
+def invalidate():
+    """Tous les fragments à reconstruire (catégorie, marque ou TVA modifiée)"""
+    _generation.bump()
+    _version.bump()
@@ -0,0 +1,162 @@
+"""
+Classement ABC / XYZ du catalogue.
+
+ABC : part cumulée du CA HT de la période, produits triés par CA décroissant
+(A jusqu'à 80 %, B jusqu'à 95 %, C au-delà et produits sans vente).
+XYZ : coefficient de variation de la demande hebdomadaire (X ≤ 0,5,
+Y ≤ 1, Z au-delà ou sans vente).
+
+La période est faite de semaines complètes (jusqu'au dernier dimanche) : d'une
+nuit à l'autre elle ne bouge pas, et seuls les produits des commandes dont le
+statut a changé depuis le dernier passage (Order.status_changed_at : paiement,
+annulation, import) sont réagrégés.
+Quand la période avance, s'y ajoutent les produits dont des ventes entrent ou
+sortent de la période. Le classement ABC, relatif à tout le catalogue, est
+ensuite recalculé en mémoire sur les CA stockés : seuls les produits dont la
+classe change sont écrits.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+
+from sales.archive import line_source
+from sales.margins import DEFAULT_STATUSES, LINE_REVENUE_HT
+from sales.models import OrderLine
+from .demand import DemandHistory
+from .models import Product
+
+A_SHARE, B_SHARE = 0.80, 0.95
+X_CV, Y_CV = 0.5, 1.0
+FULL_RUN_RATIO = 0.2  # au-delà de cette part du catalogue à reprendre, passage complet
+
+
+def period(weeks, today=None):
+    """(premier jour, dernier jour) : ``weeks`` semaines complètes jusqu'au dernier dimanche"""
+    today = today or timezone.localdate()
+    end = today - timedelta(days=today.weekday() + 1)
+    return end - timedelta(weeks=weeks) + timedelta(days=1), end
+
+
+def changed_products(since, weeks, today=None):
+    """ids des produits dont les ventes sur la période ont pu changer depuis ``since``"""
+    start, end = period(weeks, today)
+    previous_start, previous_end = period(weeks, timezone.localdate(since))
+
+    ids = set(
+        OrderLine.objects.filter(order__status_changed_at__gte=since)
+        .values_list('product_id', flat=True).distinct()
+    )
+    if (previous_start, previous_end) != (start, end):
+        moved = (
+            Q(order__created_at__date__range=(previous_start, start - timedelta(days=1)))
+            | Q(order__created_at__date__range=(previous_end + timedelta(days=1), end))
+        )
+        ids.update(
+            line_source(previous_start).objects.filter(moved, order__status__in=DEFAULT_STATUSES)
+            .values_list('product_id', flat=True).distinct()
+        )
+    ids.update(Product.objects.filter(classified_at__isnull=True).values_list('pk', flat=True))
+    return ids
+
+
+def _demand_classes(history, weeks):
+    """Itère (id produit, CV, classe XYZ) à partir des séries journalières"""
+    import numpy as np  # Dépendance optionnelle : pip install numpy
+
+    for ids, matrix in history.blocks():
+        weekly = matrix.reshape(len(ids), weeks, 7).sum(axis=2)
+        mean = weekly.mean(axis=1)
+        cv = np.divide(weekly.std(axis=1), mean, out=np.full_like(mean, np.inf), where=mean > 0)
+        classes = np.where(cv <= X_CV, 'X', np.where(cv <= Y_CV, 'Y', 'Z'))
+        for product_id, value, xyz in zip(ids.tolist(), cv.tolist(), classes.tolist()):
+            yield product_id, (round(value, 4) if value != float('inf') else None), xyz
+
+
+def revenue_classes(revenue):
+    """Classes ABC (tableau de 'A'/'B'/'C') d'un tableau de CA, dans le même ordre"""
+    import numpy as np
+
+    revenue = np.asarray(revenue, dtype=np.float64)
+    classes = np.full(len(revenue), 'C')
+    total = revenue.sum()
+    if total <= 0:
+        return classes
+    order = np.argsort(-revenue, kind='stable')
+    ranked = revenue[order]
+    before = (np.cumsum(ranked) - ranked) / total  # part cumulée des produits mieux classés
+    classes[order] = np.where(ranked <= 0, 'C', np.where(before < A_SHARE, 'A', np.where(before < B_SHARE, 'B', 'C')))
+    return classes
+
+
+def _chunks(ids, size):
+    for first in range(0, len(ids), size):
+        yield ids[first:first + size]
+
+
+def classify(weeks=52, full=False, now=None, batch_size=5000):
+    """Met à jour le classement ABC/XYZ du catalogue. Retourne un dict de métriques."""
+    started_at = now or timezone.now()
+    today = timezone.localdate(started_at)
+    start, end = period(weeks, today)
+    last_run = Product.objects.aggregate(last=Max('classified_at'))['last']
+
+    products = None
+    if not full and last_run is not None:
+        products = changed_products(last_run, weeks, today)
+        if len(products) > FULL_RUN_RATIO * Product.objects.count():
+            products = None
+
+    # 1. CA et variabilité des produits à reprendre
+    lines = line_source(start).objects.filter(
+        order__status__in=DEFAULT_STATUSES, order__created_at__date__range=(start, end),
+    )
+    if products is not None:
+        lines = lines.filter(product_id__in=products)
+    revenue = dict(lines.values_list('product_id').annotate(revenue=Sum(LINE_REVENUE_HT)).order_by())
+
+    history = DemandHistory(weeks * 7, end=end, products=products)
+    scope = Product.objects.all() if products is None else Product.objects.filter(pk__in=products)
+    current = {pk: values for pk, *values in scope.values_list('pk', 'window_revenue', 'demand_cv', 'xyz_class')}
+
+    # bulk_update est coûteux (CASE par ligne) : les produits sans vente passent
+    # par un UPDATE groupé, et seuls les produits dont une valeur change sont écrits
+    unsold, updated = [], []
+    for product_id, cv, xyz in _demand_classes(history, weeks):
+        amount = round(revenue.get(product_id) or 0, 2)
+        if current[product_id] == [amount, cv, xyz]:
+            continue
+        if cv is None and not amount:
+            unsold.append(product_id)
+        else:
+            updated.append(Product(pk=product_id, window_revenue=amount, demand_cv=cv, xyz_class=xyz))
+
+    with transaction.atomic():
+        for ids in _chunks(unsold, batch_size):
+            Product.objects.filter(pk__in=ids).update(window_revenue=0, demand_cv=None, xyz_class='Z')
+        Product.objects.bulk_update(updated, ['window_revenue', 'demand_cv', 'xyz_class'], batch_size=1000)
+        if products is None:
+            Product.objects.update(classified_at=started_at)
+        for ids in _chunks(list(products or ()), batch_size):
+            Product.objects.filter(pk__in=ids).update(classified_at=started_at)
+
+        # 2. ABC sur tout le catalogue, à partir des CA stockés : un UPDATE par classe
+        rows = list(Product.objects.values_list('pk', 'window_revenue', 'abc_class'))
+        classes = revenue_classes([float(amount) for _, amount, _ in rows]).tolist()
+        moves = {}
+        for (pk, _, previous), abc in zip(rows, classes):
+            if abc != previous:
+                moves.setdefault(abc, []).append(pk)
+        for abc, pks in moves.items():
+            for ids in _chunks(pks, batch_size):
+                Product.objects.filter(pk__in=ids).update(abc_class=abc)
+
+    return {
+        'products': len(rows),
+        'reprocessed': len(current),
+        'updated': len(unsold) + len(updated),
+        'abc_changed': sum(len(pks) for pks in moves.values()),
+        'full': products is None,
+        'period': (start, end),
+    }
@@ -0,0 +1,139 @@
+"""
+Compteurs de stock répartis (opt-in) pour les produits très sollicités.
+
+Par défaut une vente décrémente Product.stock_quantity : pendant une vente
+flash, toutes les transactions qui touchent le même produit se sérialisent
+sur cette ligne. Pour un produit avec ``stock_shards = N``, la décrémentation
+va sur l'une de N lignes StockShard tirée au hasard : les écritures
+concurrentes se répartissent sur N verrous au lieu d'un.
+
+Stock disponible = stock_quantity + somme des deltas des shards. La
+compaction (commande compact_stock_shards) reporte périodiquement les deltas
+dans stock_quantity, sans verrou prolongé : chaque shard est diminué de la
+valeur lue (delta = delta - lu), les décrémentations concurrentes sont donc
+conservées.
+"""
+import logging
+import random
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+from . import catalog, ledger
+from .models import Product, StockMovement, StockShard
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_shards(product):
+    """Crée les lignes de shard manquantes (0..N-1) d'un produit"""
+    if product.stock_shards:
+        StockShard.objects.bulk_create(
+            [StockShard(product=product, index=index) for index in range(product.stock_shards)],
+            ignore_conflicts=True,
+        )
+
+
+def shard_total():
+    """Sous-requête : somme des deltas en attente du produit (OuterRef pk)"""
+    return Coalesce(
+        Subquery(
+            StockShard.objects.filter(product=OuterRef('pk'))
+            .order_by().values('product')
+            .annotate(total=Sum('delta'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def with_available_stock(queryset=None):
+    """Annote ``available_stock`` (compteur + deltas en attente)"""
+    queryset = Product.objects.all() if queryset is None else queryset
+    return queryset.annotate(available_stock=F('stock_quantity') + shard_total())
+
+
+def _sum_case(key, quantities):
+    return Case(
+        *[When(**{key: pk}, then=Value(qty)) for pk, qty in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def decrement(quantities):
+    """
+    Décrémente le stock {product_id: quantité} : un UPDATE pour les compteurs
+    simples, un pour les shards (une ligne tirée au hasard par produit).
+
+    Un compteur simple ne descend pas sous zéro : la vente est enregistrée
+    mais le manque est rendu (survente {product_id: unités manquantes}) au
+    lieu de violer la contrainte et de faire échouer tout le lot. Les shards
+    peuvent devenir négatifs ; la compaction borne le report (cf. compact).
+    """
+    sharded = dict(
+        Product.objects.filter(pk__in=quantities, stock_shards__gt=0).values_list('pk', 'stock_shards')
+    )
+    plain = {pk: qty for pk, qty in quantities.items() if pk not in sharded}
+    oversold = {}
+    with transaction.atomic():
+        if plain:
+            stock = dict(
+                Product.objects.select_for_update().filter(pk__in=plain).values_list('pk', 'stock_quantity')
+            )
+            oversold = {pk: plain[pk] - qty for pk, qty in stock.items() if plain[pk] > qty}
+            Product.objects.filter(pk__in=plain).update(
+                stock_quantity=Greatest(F('stock_quantity') - _sum_case('pk', plain), Value(0))
+            )
+        if sharded:
+            picked = Q()
+            for pk, shards in sharded.items():
+                picked |= Q(product_id=pk, index=random.randrange(shards))
+            StockShard.objects.filter(picked).update(
+                delta=F('delta') - _sum_case('product_id', {pk: quantities[pk] for pk in sharded})
+            )
+        catalog.invalidate_products(quantities)
+    return oversold
+
+
+def compact(product_ids=None):
+    """
+    Reporte les deltas des shards dans stock_quantity. Les shards au-delà de
+    ``stock_shards`` (produit redescendu) sont supprimés une fois vidés.
+
+    Des shards survendus (stock disponible négatif) ne font pas échouer la
+    compaction sur la contrainte stock_quantity >= 0 : le compteur est ramené
+    à zéro et le manque journalisé en ajustement (cf. ledger.OVERSOLD_REFERENCE),
+    comme une survente à la décrémentation. Retourne le nombre de produits compactés.
+    """
+    with transaction.atomic():
+        shards = StockShard.objects.exclude(delta=0)
+        if product_ids is not None:
+            shards = shards.filter(product_id__in=product_ids)
+        read = list(shards.values_list('pk', 'product_id', 'delta'))
+
+        totals = defaultdict(int)
+        for _, product_id, delta in read:
+            totals[product_id] += delta
+        if read:
+            stock = dict(
+                Product.objects.select_for_update().filter(pk__in=totals).values_list('pk', 'stock_quantity')
+            )
+            oversold = {pk: -(qty + totals[pk]) for pk, qty in stock.items() if qty + totals[pk] < 0}
+            StockShard.objects.filter(pk__in=[pk for pk, _, _ in read]).update(
+                delta=F('delta') - _sum_case('pk', {pk: delta for pk, _, delta in read})
+            )
+            Product.objects.filter(pk__in=totals).update(
+                stock_quantity=Greatest(F('stock_quantity') + _sum_case('pk', totals), Value(0))
+            )
+            if oversold:
+                ledger.record_movements(
+                    [(pk, missing, ledger.OVERSOLD_REFERENCE) for pk, missing in oversold.items()],
+                    StockMovement.ADJUSTMENT,
+                )
+                catalog.invalidate_products(oversold)
+                logger.warning("Survente à la compaction (produit : unités manquantes) : %s", oversold)
+        StockShard.objects.filter(index__gte=F('product__stock_shards'), delta=0).delete()
+    return len(totals)
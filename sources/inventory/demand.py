@@ -0,0 +1,73 @@
+"""
+Séries de demande journalière par produit, pour les calculs vectorisés
+(prévision, classification ABC/XYZ).
+
+Une seule requête agrégée (produit, jour, quantité) sur les lignes des
+commandes vendues, archive comprise quand la période y remonte
+(sales.archive.line_source) ; le résultat est gardé sous forme de trois tableaux
+triés par produit, puis découpé en matrices denses produits × jours par
+blocs, pour borner la mémoire sur un gros catalogue.
+"""
+from datetime import timedelta
+
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from sales.archive import line_source
+from sales.margins import DEFAULT_STATUSES
+from .models import Product
+
+
+class DemandHistory:
+    """
+    Historique de ventes journalier de tout le catalogue sur ``days`` jours
+    jusqu'à ``end`` inclus (par défaut hier : la journée en cours, incomplète,
+    tirerait la fin de la série vers le bas)
+    """
+
+    def __init__(self, days, end=None, statuses=DEFAULT_STATUSES, products=None, using=None):
+        import numpy as np  # Dépendance optionnelle : pip install numpy
+
+        self.end = end or timezone.localdate() - timedelta(days=1)
+        self.start = self.end - timedelta(days=days - 1)
+        self.days = days
+
+        catalog = Product.objects.using(using)
+        lines = line_source(self.start, using).objects.using(using)
+        if products is not None:  # sous-ensemble du catalogue (ids)
+            catalog = catalog.filter(pk__in=products)
+            lines = lines.filter(product_id__in=products)
+        self.product_ids = np.fromiter(catalog.order_by('pk').values_list('pk', flat=True), dtype=np.int64)
+        rows = (
+            lines
+            .filter(order__status__in=statuses, order__created_at__date__range=(self.start, self.end))
+            .annotate(day=TruncDate('order__created_at'))
+            .values_list('product_id', 'day')
+            .annotate(quantity=Sum('quantity'))
+            .order_by('product_id')
+        )
+        products, offsets, quantities = [], [], []
+        for product_id, day, quantity in rows.iterator(chunk_size=20000):
+            products.append(product_id)
+            offsets.append((day - self.start).days)
+            quantities.append(quantity)
+        self._products = np.asarray(products, dtype=np.int64)
+        self._offsets = np.asarray(offsets, dtype=np.int64)
+        self._quantities = np.asarray(quantities, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def blocks(self, size=25000):
+        """Itère (ids produits, matrice float32 produits × jours) par blocs de ``size`` produits"""
+        import numpy as np
+
+        for first in range(0, len(self.product_ids), size):
+            ids = self.product_ids[first:first + size]
+            lo = np.searchsorted(self._products, ids[0], side='left')
+            hi = np.searchsorted(self._products, ids[-1], side='right')
+            matrix = np.zeros((len(ids), self.days), dtype=np.float32)
+            # (produit, jour) est unique (GROUP BY) : affectation directe
+            matrix[np.searchsorted(ids, self._products[lo:hi]), self._offsets[lo:hi]] = self._quantities[lo:hi]
+            yield ids, matrix
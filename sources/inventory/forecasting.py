@@ -0,0 +1,102 @@
+"""
+Prévision de demande par produit.
+
+Lissage exponentiel de Holt-Winters additif, tendance amortie et saisonnalité
+hebdomadaire, vectorisé sur la matrice produits × jours : la boucle porte sur
+les jours, chaque pas traite tous les produits et toutes les combinaisons de
+paramètres de la grille à la fois. Chaque produit garde la combinaison dont
+l'erreur de prévision à un pas est la plus faible.
+"""
+import itertools
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .demand import DemandHistory
+from .models import DemandForecast
+
+SEASON = 7
+DAMPING = 0.98
+ALPHAS = (0.05, 0.2, 0.5)
+BETAS = (0.0, 0.05)
+GAMMAS = (0.05, 0.3)
+GRID = tuple(itertools.product(ALPHAS, BETAS, GAMMAS))
+
+
+def holt_winters(matrix, horizon, grid=GRID, damping=DAMPING):
+    """
+    Ajuste le modèle sur chaque ligne de ``matrix`` (produits × jours, au moins
+    deux semaines) et retourne (prévisions produits × horizon, indice de la
+    combinaison retenue, RMSE à un pas).
+    """
+    import numpy as np  # Dépendance optionnelle : pip install numpy
+
+    n, days = matrix.shape
+    if days < 2 * SEASON:
+        raise ValueError("Au moins deux semaines d'historique sont nécessaires")
+
+    series = np.ascontiguousarray(matrix.T, dtype=np.float32)  # jours × produits : accès contigu par jour
+    params = np.asarray(grid, dtype=np.float32)
+    alpha, beta, gamma = (params[:, i, None] for i in range(3))  # (k, 1) : diffusés sur les produits
+
+    first, second = series[:SEASON].mean(axis=0), series[SEASON:2 * SEASON].mean(axis=0)
+    level = np.tile(first, (len(params), 1))
+    trend = np.tile((second - first) / SEASON, (len(params), 1))
+    season = np.tile(series[:SEASON] - first, (len(params), 1, 1))  # (k, 7, n)
+    sse = np.zeros_like(level)
+
+    for t in range(days):
+        observed = series[t]
+        seasonal = season[:, t % SEASON]
+        damped = damping * trend
+        if t >= 2 * SEASON:  # les deux premières semaines servent à l'initialisation
+            sse += np.square(observed - (level + damped + seasonal))
+        new_level = alpha * (observed - seasonal) + (1 - alpha) * (level + damped)
+        trend = beta * (new_level - level) + (1 - beta) * damped
+        season[:, t % SEASON] = gamma * (observed - new_level) + (1 - gamma) * seasonal
+        level = new_level
+
+    best = sse.argmin(axis=0)
+    columns = np.arange(n)
+    level, trend = level[best, columns], trend[best, columns]
+    season = season[best, :, columns]  # (n, 7)
+
+    steps = np.arange(1, horizon + 1)
+    damped_steps = np.cumsum(damping ** steps)
+    forecast = level[:, None] + damped_steps * trend[:, None] + season[:, (days + steps - 1) % SEASON]
+    rmse = np.sqrt(sse[best, columns] / max(days - 2 * SEASON, 1))
+    return np.clip(forecast, 0, None), best, rmse
+
+
+def run(history_days=730, horizon=28, block_size=25000, end=None, using=None):
+    """Recalcule la prévision de tout le catalogue. Retourne un dict de métriques."""
+    started = time.perf_counter()
+    history = DemandHistory(history_days, end=end, using=using)
+    loaded = time.perf_counter()
+
+    first_day = history.end + timedelta(days=1)
+    generated_at = timezone.now()
+    stats = {'products': len(history), 'load_seconds': loaded - started}
+    with transaction.atomic(using=using):
+        DemandForecast.objects.using(using).all().delete()
+        for ids, matrix in history.blocks(block_size):
+            forecast, best, rmse = holt_winters(matrix, horizon)
+            DemandForecast.objects.using(using).bulk_create(
+                [
+                    DemandForecast(
+                        product_id=int(product_id),
+                        generated_at=generated_at,
+                        start_date=first_day,
+                        daily=[round(float(value), 2) for value in row],
+                        total=round(float(row.sum()), 2),
+                        rmse=round(float(error), 3),
+                        params=','.join(str(value) for value in GRID[choice]),
+                    )
+                    for product_id, row, choice, error in zip(ids, forecast, best, rmse)
+                ],
+                batch_size=5000,
+            )
+    stats['seconds'] = time.perf_counter() - started
+    return stats
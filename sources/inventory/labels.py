@@ -0,0 +1,53 @@
+"""
+Libellés des catégories (chemin complet « Parent > Enfant ») mis en cache.
+
+Category.__str__ remontait les parents une requête à la fois, pour chaque
+catégorie affichée. Les chemins de toutes les catégories sont calculés en une
+requête et gardés en mémoire dans chaque processus, rechargés quand leur
+tampon de version partagé change (company.versioning, changé par inventory.signals).
+"""
+from company.versioning import LocalSnapshot
+
+VERSION_KEY = 'inventory:category-paths:version'
+
+
+def _load():
+    from .models import Category
+
+    parents = {}
+    names = {}
+    for pk, name, parent_id in Category.objects.values_list('pk', 'name', 'parent_id'):
+        names[pk], parents[pk] = name, parent_id
+
+    paths = {}
+    for pk in names:
+        chain, node, seen = [], pk, set()
+        while node is not None and node not in seen:  # garde-fou contre un cycle
+            seen.add(node)
+            chain.append(names.get(node, '?'))
+            node = parents.get(node)
+        paths[pk] = ' > '.join(reversed(chain))
+    return paths
+
+
+_snapshot = LocalSnapshot(VERSION_KEY, _load)
+
+
+def category_path(pk):
+    """Chemin complet d'une catégorie (None si inconnue)"""
+    if pk is None:
+        return None
+    path = _snapshot.get().get(pk)
+    if path is None:
+        path = _snapshot.load().get(pk)
+    return path
+
+
+def refresh():
+    """Contrôle le tampon partagé sans attendre l'intervalle (avant de mettre un libellé en cache)"""
+    _snapshot.get(force=True)
+
+
+def invalidate():
+    """Vide le cache local et change le tampon partagé une fois la transaction validée"""
+    _snapshot.invalidate()
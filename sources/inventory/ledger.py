@@ -0,0 +1,137 @@
+"""
+Stock à date et valorisation d'inventaire.
+
+Stock à une date = dernier point (StockCheckpoint) antérieur + somme des
+mouvements (StockMovement) postérieurs à ce point. Les points sont pris chaque
+nuit (commande stock_checkpoint) et bornent la part du journal à rejouer.
+Tout est calculé en SQL, par sous-requêtes corrélées couvertes par les index
+(product, taken_at) et (product, created_at) : une requête quel que soit le
+nombre de produits.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import (
+    Count, DateTimeField, DecimalField, Exists, ExpressionWrapper, F, IntegerField, OuterRef, Q, Subquery, Sum, Value,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from procurement.models import as_of_bound, price_as_of
+from .models import Product, StockCheckpoint, StockMovement
+
+EPOCH = timezone.make_aware(datetime(1970, 1, 1))
+VALUE = DecimalField(max_digits=16, decimal_places=2)
+OVERSOLD_REFERENCE = 'SURVENTE'  # ajustement : stock ramené à zéro plutôt qu'un compteur négatif
+
+GROUPINGS = {
+    'category': ('category_id', 'category__name'),
+    'brand': ('brand_id', 'brand__name'),
+}
+
+
+def record_movements(rows, reason, created_at=None):
+    """Journalise en masse des variations [(product_id, quantité signée, référence)]"""
+    created_at = created_at or timezone.now()
+    StockMovement.objects.bulk_create(
+        [
+            StockMovement(product_id=product_id, quantity=quantity, reason=reason, reference=reference, created_at=created_at)
+            for product_id, quantity, reference in rows if quantity
+        ],
+        batch_size=1000,
+    )
+
+
+def unit_cost_as_of(bound):
+    """Sous-requête : coût d'achat HT du produit (OuterRef pk) en vigueur avant ``bound``"""
+    return price_as_of('pk', bound)
+
+
+def stock_as_of(when, queryset=None):
+    """
+    Produits annotés au ``when`` (une date inclut toute la journée) :
+    checkpoint_at, quantity_as_of, unit_cost_as_of et value_as_of.
+    """
+    bound = as_of_bound(when)
+    queryset = Product.objects.all() if queryset is None else queryset
+
+    checkpoint = StockCheckpoint.objects.filter(product=OuterRef('pk'), taken_at__lt=bound).order_by('-taken_at')
+    since = Coalesce(OuterRef('checkpoint_at'), Value(EPOCH), output_field=DateTimeField())
+    delta = (
+        StockMovement.objects
+        .filter(product=OuterRef('pk'), created_at__gt=since, created_at__lt=bound)
+        .order_by().values('product')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    return queryset.annotate(
+        checkpoint_at=Subquery(checkpoint.values('taken_at')[:1]),
+        checkpoint_quantity=Coalesce(Subquery(checkpoint.values('quantity')[:1]), 0),
+        checkpoint_cost=Subquery(checkpoint.values('unit_cost')[:1]),
+        ledger_delta=Coalesce(Subquery(delta, output_field=IntegerField()), 0),
+        quantity_as_of=ExpressionWrapper(F('checkpoint_quantity') + F('ledger_delta'), output_field=IntegerField()),
+        unit_cost_as_of=Coalesce(unit_cost_as_of(bound), F('checkpoint_cost'), output_field=VALUE),
+        value_as_of=ExpressionWrapper(F('quantity_as_of') * F('unit_cost_as_of'), output_field=VALUE),
+    )
+
+
+def take_checkpoint(at=None, batch_size=2000):
+    """
+    Photo du stock au journal pour les produits ayant bougé depuis leur dernier
+    point (les autres restent valides). Retourne le nombre de points écrits.
+
+    Par défaut le point est pris STOCK_CHECKPOINT_LAG_MINUTES avant l'heure
+    courante : un mouvement porte l'heure de son écriture, pas celle de la
+    validation de sa transaction, et ne doit pas tomber avant un point déjà
+    pris (il serait ignoré par stock_as_of).
+    """
+    if at is None:
+        lag = getattr(settings, 'STOCK_CHECKPOINT_LAG_MINUTES', 10)
+        at = timezone.now() - timedelta(minutes=lag)
+    moved_since = StockMovement.objects.filter(
+        product=OuterRef('pk'),
+        created_at__gt=Coalesce(OuterRef('checkpoint_at'), Value(EPOCH), output_field=DateTimeField()),
+        created_at__lte=at,
+    )
+    rows = (
+        stock_as_of(at)
+        .filter(Exists(moved_since))
+        .values_list('pk', 'quantity_as_of', 'unit_cost_as_of')
+        .iterator(chunk_size=batch_size)
+    )
+    created, batch = 0, []
+    for product_id, quantity, unit_cost in rows:
+        batch.append(StockCheckpoint(product_id=product_id, taken_at=at, quantity=quantity, unit_cost=unit_cost))
+        if len(batch) >= batch_size:
+            created += len(StockCheckpoint.objects.bulk_create(batch))
+            batch = []
+    if batch:
+        created += len(StockCheckpoint.objects.bulk_create(batch))
+    return created
+
+
+def drift(queryset=None):
+    """Produits dont le stock (compteur + shards) diverge du journal (écritures hors journal)"""
+    from .counters import shard_total
+
+    return (
+        stock_as_of(timezone.now(), queryset)
+        .annotate(available_stock=F('stock_quantity') + shard_total())
+        .exclude(available_stock=F('quantity_as_of'))
+    )
+
+
+def valuation(as_of, group_by='category', queryset=None):
+    """Quantité et valeur au coût par catégorie ou par marque, en une requête"""
+    key, label = GROUPINGS[group_by]
+    return (
+        stock_as_of(as_of, queryset)
+        .values(key, label)
+        .annotate(
+            products=Count('pk'),
+            quantity=Sum('quantity_as_of'),
+            value=Sum('value_as_of'),
+            uncosted=Count('pk', filter=Q(unit_cost_as_of__isnull=True) & ~Q(quantity_as_of=0)),
+        )
+        .order_by(label)
+    )
@@ -0,0 +1,73 @@
+import statistics
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from company.models import TaxRate
+from inventory import counters
+from inventory.models import Category, Product, StockShard
+
+class Command(BaseCommand):
+    help = (
+        "Banc de contention : N threads décrémentent le même produit, compteur simple puis "
+        "compteurs répartis. À lancer sur PostgreSQL (SQLite verrouille toute la base)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--orders', type=int, default=200, help="Décrémentations par thread")
+        parser.add_argument('--shards', type=int, default=16)
+        parser.add_argument('--hold-ms', type=float, default=5.0,
+                            help="Durée simulée du reste de la transaction de commande, verrou tenu")
+
+    def handle(self, *args, **options):
+        category = Category.objects.get_or_create(name="Banc de test", defaults={'slug': 'banc-de-test'})[0]
+        product = Product.objects.create(
+            name="Produit banc contention", category=category, tax_rate=TaxRate.objects.first(),
+            retail_price=1, stock_quantity=10 ** 9,
+        )
+        try:
+            for label, shards in (("compteur simple", 0), (f"{options['shards']} compteurs répartis", options['shards'])):
+                Product.objects.filter(pk=product.pk).update(stock_shards=shards)
+                product.refresh_from_db()
+                counters.ensure_shards(product)
+                self.report(label, self.run(product.pk, options))
+            counters.compact([product.pk])
+        finally:
+            StockShard.objects.filter(product=product).delete()
+            Product.objects.filter(pk=product.pk).delete()
+
+    def run(self, product_id, options):
+        latencies, lock = [], threading.Lock()
+        hold = options['hold_ms'] / 1000
+
+        def worker():
+            local = []
+            try:
+                for _ in range(options['orders']):
+                    started = time.perf_counter()
+                    with transaction.atomic():
+                        counters.decrement({product_id: 1})
+                        time.sleep(hold)
+                    local.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+            with lock:
+                latencies.extend(local)
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, time.perf_counter() - started
+
+    def report(self, label, result):
+        latencies, elapsed = result
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+        self.stdout.write(
+            f"{label:<28} {len(latencies) / elapsed:>8.0f} décr./s | "
+            f"p50 {statistics.median(latencies) * 1000:6.1f} ms | p95 {p95 * 1000:6.1f} ms"
+        )
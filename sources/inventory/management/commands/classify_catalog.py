@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from config.profiling import profiled
+from inventory import classification
+
+class Command(BaseCommand):
+    help = "Classement ABC (part du CA) / XYZ (variabilité de la demande) du catalogue, incrémental"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--weeks', type=int, default=52, help="Période de classement (semaines complètes)")
+        parser.add_argument('--full', action='store_true', help="Reprend tout le catalogue")
+
+    @profiled()
+    def handle(self, *args, **options):
+        stats = classification.classify(options['weeks'], full=options['full'])
+        start, end = stats['period']
+        mode = "complet" if stats['full'] else "incrémental"
+        self.stdout.write(self.style.SUCCESS(
+            f"Classement {mode} du {start} au {end} : {stats['reprocessed']}/{stats['products']} produits repris "
+            f"({stats['updated']} modifiés), "
+            f"{stats['abc_changed']} changements de classe ABC."
+        ))
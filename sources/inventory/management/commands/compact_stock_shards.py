@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from config.profiling import profiled
+from inventory.counters import compact
+
+class Command(BaseCommand):
+    help = "Reporte les compteurs de stock répartis dans Product.stock_quantity"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, default=0,
+                            help="Compacter en boucle toutes les N secondes (0 = une seule passe)")
+
+    @profiled()
+    def handle(self, *args, **options):
+        try:
+            while True:
+                started = time.perf_counter()
+                products = compact()
+                if products or not options['every']:
+                    self.stdout.write(f"{products} produits compactés en {(time.perf_counter() - started) * 1000:.0f} ms")
+                if not options['every']:
+                    break
+                time.sleep(options['every'])
+        except KeyboardInterrupt:
+            pass
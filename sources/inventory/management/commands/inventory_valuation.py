@@ -0,0 +1,47 @@
+import csv
+from datetime import date
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from config.profiling import profiled
+from inventory import ledger
+
+class Command(BaseCommand):
+    help = "Quantité et valeur au coût du stock à une date, par catégorie et par marque (point + journal)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--as-of', required=True, help="Date AAAA-MM-JJ (stock en fin de journée)")
+        parser.add_argument('--by', choices=['category', 'brand', 'both'], default='both')
+        parser.add_argument('--csv', action='store_true', help="Sortie CSV (;) au lieu du tableau")
+
+    @profiled()
+    def handle(self, *args, **options):
+        try:
+            as_of = date.fromisoformat(options['as_of'])
+        except ValueError:
+            raise CommandError(f"Date invalide : {options['as_of']}")
+
+        groupings = ['category', 'brand'] if options['by'] == 'both' else [options['by']]
+        writer = csv.writer(self.stdout, delimiter=';') if options['csv'] else None
+        if writer:
+            writer.writerow(['regroupement', 'id', 'libelle', 'produits', 'quantite', 'valeur', 'sans_cout'])
+
+        for group_by in groupings:
+            key, label = ledger.GROUPINGS[group_by]
+            rows = list(ledger.valuation(as_of, group_by))
+            if writer:
+                for row in rows:
+                    writer.writerow([group_by, row[key], row[label], row['products'], row['quantity'],
+                                     round(row['value'] or 0, 2), row['uncosted']])
+                continue
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"Stock au {as_of:%d/%m/%Y} par {group_by}"))
+            total_quantity, total_value = 0, Decimal('0.00')
+            for row in rows:
+                value = round(Decimal(row['value'] or 0), 2)
+                total_quantity += row['quantity'] or 0
+                total_value += value
+                warning = f"  ({row['uncosted']} sans coût)" if row['uncosted'] else ''
+                self.stdout.write(
+                    f"  {str(row[label] or '-')[:40]:<40} {row['quantity'] or 0:>10} {value:>14}{warning}"
+                )
+            self.stdout.write(f"  {'TOTAL':<40} {total_quantity:>10} {total_value:>14}")
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from config.profiling import profiled
+from django.db import transaction
+from inventory import ledger
+
+class Command(BaseCommand):
+    help = "Prend le point de stock nocturne (quantité + coût) des produits ayant bougé depuis le dernier point"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--check-drift', action='store_true',
+                            help="Signaler les produits dont le compteur diverge du journal")
+
+    @profiled()
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            created = ledger.take_checkpoint(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{created} points de stock écrits en {time.perf_counter() - started:.1f}s."
+        ))
+
+        if options['check_drift']:
+            drifting = list(ledger.drift().values_list('pk', 'available_stock', 'quantity_as_of')[:50])
+            for pk, counter, journal in drifting:
+                self.stdout.write(self.style.WARNING(f"Produit {pk} : compteur {counter}, journal {journal}"))
+            if not drifting:
+                self.stdout.write("Compteurs et journal concordent.")
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_product_sku'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField(verbose_name='Pris le')),
+                ('quantity', models.IntegerField(verbose_name='Quantité')),
+                ('unit_cost', models.DecimalField(decimal_places=2, max_digits=10, null=True, verbose_name='Coût unitaire HT')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_checkpoints', to='inventory.product')),
+            ],
+            options={
+                'verbose_name': 'Point de stock',
+                'verbose_name_plural': 'Points de stock',
+                'constraints': [models.UniqueConstraint(fields=('product', 'taken_at'), name='stock_checkpoint_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(verbose_name='Variation')),
+                ('reason', models.CharField(choices=[('INITIAL', 'Stock initial'), ('SALE', 'Vente expédiée'), ('RECEIPT', 'Réception fournisseur'), ('RETURN', 'Retour client'), ('ADJUSTMENT', 'Ajustement manuel')], max_length=10, verbose_name='Motif')),
+                ('reference', models.CharField(blank=True, max_length=50, verbose_name='Référence')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='inventory.product')),
+            ],
+            options={
+                'verbose_name': 'Mouvement de stock',
+                'verbose_name_plural': 'Mouvements de stock',
+                'indexes': [models.Index(fields=['product', 'created_at'], name='stock_movement_asof_idx')],
+            },
+        ),
+    ]
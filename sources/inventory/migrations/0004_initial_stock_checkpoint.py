@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:04
+
+from django.db import migrations
+from django.utils import timezone
+
+
+def checkpoint(apps, schema_editor):
+    # Point de départ du journal : le stock actuel, valorisé au prix du fournisseur principal
+    Product = apps.get_model('inventory', 'Product')
+    SupplierPrice = apps.get_model('procurement', 'SupplierPrice')
+    StockCheckpoint = apps.get_model('inventory', 'StockCheckpoint')
+
+    costs = dict(
+        SupplierPrice.objects.order_by('product_id', 'is_preferred', 'updated_at').values_list('product_id', 'price')
+    )
+    now = timezone.now()
+    StockCheckpoint.objects.bulk_create(
+        (
+            StockCheckpoint(product_id=pk, taken_at=now, quantity=quantity, unit_cost=costs.get(pk))
+            for pk, quantity in Product.objects.values_list('pk', 'stock_quantity').iterator(chunk_size=2000)
+        ),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_stock_ledger'),
+        ('procurement', '0002_alter_supplierprice_options_supplier_currency_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(checkpoint, migrations.RunPython.noop),
+    ]
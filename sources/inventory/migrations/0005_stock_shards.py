@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_initial_stock_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock_shards',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Produit très sollicité (vente flash) : nombre de compteurs de stock répartis, 0 = désactivé', verbose_name='Compteurs répartis'),
+        ),
+        migrations.CreateModel(
+            name='StockShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField()),
+                ('delta', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_counter_shards', to='inventory.product')),
+            ],
+            options={
+                'verbose_name': 'Compteur de stock réparti',
+                'verbose_name_plural': 'Compteurs de stock répartis',
+                'constraints': [models.UniqueConstraint(fields=('product', 'index'), name='stock_shard_unique')],
+            },
+        ),
+    ]
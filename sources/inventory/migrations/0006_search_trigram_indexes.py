@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:40
+
+from django.db import migrations
+
+from config.search_indexes import TrigramSearchIndexes
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_stock_shards'),
+    ]
+
+    operations = [
+        TrigramSearchIndexes('Product', ['name', 'sku']),
+        TrigramSearchIndexes('Category', ['name']),
+        TrigramSearchIndexes('Brand', ['name']),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandForecast',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='demand_forecast', serialize=False, to='inventory.product')),
+                ('generated_at', models.DateTimeField(verbose_name='Calculée le')),
+                ('start_date', models.DateField(verbose_name='Premier jour prévu')),
+                ('daily', models.JSONField(verbose_name='Quantités journalières')),
+                ('total', models.FloatField(db_index=True, verbose_name="Total sur l'horizon")),
+                ('rmse', models.FloatField(verbose_name='Erreur à un pas (RMSE)')),
+                ('params', models.CharField(max_length=30, verbose_name='Paramètres (alpha,beta,gamma)')),
+            ],
+            options={
+                'verbose_name': 'Prévision de demande',
+                'verbose_name_plural': 'Prévisions de demande',
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_demand_forecast'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='abc_class',
+            field=models.CharField(blank=True, choices=[('A', 'A'), ('B', 'B'), ('C', 'C')], editable=False, max_length=1, verbose_name='Classe ABC'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='classified_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Classé le'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='demand_cv',
+            field=models.FloatField(editable=False, null=True, verbose_name='Variabilité de la demande'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='window_revenue',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14, verbose_name='CA HT (période de classement)'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='xyz_class',
+            field=models.CharField(blank=True, choices=[('X', 'X'), ('Y', 'Y'), ('Z', 'Z')], editable=False, max_length=1, verbose_name='Classe XYZ'),
+        ),
+    ]
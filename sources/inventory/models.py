@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from decimal import Decimal
 from django.utils.translation import gettext_lazy as _
+from company import money, reference_cache
 
 class Category(models.Model):
     name = models.CharField(_("Name"), max_length=100)
@@ -17,6 +19,12 @@ class Category(models.Model):
         verbose_name_plural = "Categories"
 
     def __str__(self):
+        # Chemin complet depuis le cache (une requête pour toutes les catégories)
+        if self.pk is not None:
+            from .labels import category_path
+            path = category_path(self.pk)
+            if path is not None:
+                return path
         full_path = [self.name]
         k = self.parent
         while k is not None:
@@ -32,6 +40,7 @@ class Brand(models.Model):
 
 class Product(models.Model):
     name = models.CharField(max_length=200)
+    sku = models.CharField("Référence (SKU)", max_length=64, unique=True, null=True, blank=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     brand = models.ForeignKey(Brand, on_delete=models.SET_NULL, null=True)
     
@@ -49,6 +58,55 @@ class Product(models.Model):
     margin_coefficient = models.DecimalField("Coeff. Marge", max_digits=4, decimal_places=2, default=1.50)
     stock_quantity = models.PositiveIntegerField("Stock disponible", default=0)
     low_stock_threshold = models.PositiveIntegerField("Seuil d'alerte", default=5)
+    stock_shards = models.PositiveSmallIntegerField(
+        "Compteurs répartis", default=0,
+        help_text="Produit très sollicité (vente flash) : nombre de compteurs de stock répartis, 0 = désactivé",
+    )
+
+    # --- Classement ABC (part du CA) / XYZ (variabilité de la demande), cf. inventory.classification ---
+    ABC_CLASSES = [('A', 'A'), ('B', 'B'), ('C', 'C')]
+    XYZ_CLASSES = [('X', 'X'), ('Y', 'Y'), ('Z', 'Z')]
+    abc_class = models.CharField("Classe ABC", max_length=1, choices=ABC_CLASSES, blank=True, editable=False)
+    xyz_class = models.CharField("Classe XYZ", max_length=1, choices=XYZ_CLASSES, blank=True, editable=False)
+    window_revenue = models.DecimalField("CA HT (période de classement)", max_digits=14, decimal_places=2,
+                                         default=0, editable=False)
+    demand_cv = models.FloatField("Variabilité de la demande", null=True, editable=False)
+    classified_at = models.DateTimeField("Classé le", null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Alerte stock du tableau de bord : seuls les produits sous leur seuil sont indexés
+            models.Index(fields=['id'], condition=models.Q(stock_quantity__lte=models.F('low_stock_threshold')),
+                         name='product_low_stock_idx'),
+        ]
+
+    _loaded_stock = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # On garde le stock lu en base : toute variation passe au journal (cf. save)
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_stock = instance.__dict__.get('stock_quantity')
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None or 'stock_quantity' in fields:
+            self._loaded_stock = self.stock_quantity
+
+    @property
+    def available_stock(self):
+        """Stock réel : compteur + décrémentations en attente de compaction (cf. inventory.counters)"""
+        if '_available_stock' in self.__dict__:
+            return self._available_stock  # annoté par counters.with_available_stock
+        if not self.stock_shards or self.pk is None:
+            return self.stock_quantity
+        pending = self.stock_counter_shards.aggregate(total=models.Sum('delta'))['total'] or 0
+        return self.stock_quantity + pending
+
+    @available_stock.setter
+    def available_stock(self, value):
+        self._available_stock = value
 
     @property
     def is_in_stock(self):
@@ -59,8 +117,10 @@ class Product(models.Model):
         return self.stock_quantity <= self.low_stock_threshold
     
     def save(self, *args, **kwargs):
-        # On définit le multiplicateur de taxe dès le début (toujours dispo via FK tax_rate)
-        tax_multiplier = 1 + (self.tax_rate.rate / 100)
+        # On définit le taux de taxe dès le début (cache de référence, sans requête)
+        # Les calculs se font en centimes entiers, cf. company.money
+        tax_rate = reference_cache.get_tax_rate(self.tax_rate_id) or self.tax_rate
+        vat_bp = money.rate_to_bp(tax_rate.rate)
 
         # 1. LOGIQUE DE CALCUL VIA MARGE (Seulement si l'objet existe déjà en base)
         if self.pk and self.retail_price_incl_tax == Decimal('0.00'):
@@ -69,24 +129,133 @@ class Product(models.Model):
             if purchase_prices and purchase_prices.exists():
                 purchase_price_ht = purchase_prices.first().price
                 # Calcul : HT Achat * Marge * TVA
-                calculated_ttc = purchase_price_ht * self.margin_coefficient * tax_multiplier
-                self.retail_price_incl_tax = calculated_ttc.quantize(Decimal('0.01'))
+                calculated_ttc = money.margin_price_incl_tax_cents(
+                    money.to_cents(purchase_price_ht), money.to_cents(self.margin_coefficient), vat_bp
+                )
+                self.retail_price_incl_tax = money.from_cents(calculated_ttc)
 
         # 2. SYNCHRONISATION HT / TTC
         # Cas A : On a le TTC mais pas le HT
         if self.retail_price_incl_tax and not self.retail_price:
-            self.retail_price = (self.retail_price_incl_tax / tax_multiplier).quantize(Decimal('0.01'))
+            self.retail_price = money.from_cents(
+                money.excl_tax_cents(money.to_cents(self.retail_price_incl_tax), vat_bp)
+            )
         
         # Cas B : On a le HT mais pas encore le TTC (ou TTC à zéro)
         elif self.retail_price and (not self.retail_price_incl_tax or self.retail_price_incl_tax == Decimal('0.00')):
-            self.retail_price_incl_tax = (self.retail_price * tax_multiplier).quantize(Decimal('0.01'))
+            self.retail_price_incl_tax = money.from_cents(money.incl_tax_cents(money.to_cents(self.retail_price), vat_bp))
             
         # Cas C : RE-CALCUL DE SÉCURITÉ (Les deux sont là, on synchronise sur le HT)
         # Indispensable si on change la TVA ou le HT manuellement
         elif self.retail_price and self.retail_price_incl_tax:
-            self.retail_price_incl_tax = (self.retail_price * tax_multiplier).quantize(Decimal('0.01'))
+            self.retail_price_incl_tax = money.from_cents(money.incl_tax_cents(money.to_cents(self.retail_price), vat_bp))
+
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                delta, reason = self.stock_quantity, StockMovement.INITIAL
+            else:
+                delta, reason = self.stock_quantity - (self._loaded_stock or 0), StockMovement.ADJUSTMENT
+                if self._loaded_stock is None:
+                    delta = 0  # stock non chargé (only/defer) : rien à journaliser
+            if delta:
+                StockMovement.objects.create(product=self, quantity=delta, reason=reason)
+            if self.stock_shards:
+                from .counters import ensure_shards
+                ensure_shards(self)
+        self._loaded_stock = self.stock_quantity
+
+    def __str__(self):
+        return f"{self.name} ({self.retail_price_incl_tax}€ TTC)"
 
-        super().save(*args, **kwargs)
+# -------------------------------------------------------------------
+# JOURNAL DE STOCK
+# -------------------------------------------------------------------
+
+class StockMovement(models.Model):
+    """Journal append-only des variations de stock (quantité signée)"""
+    INITIAL = 'INITIAL'
+    SALE = 'SALE'
+    RECEIPT = 'RECEIPT'
+    RETURN = 'RETURN'
+    ADJUSTMENT = 'ADJUSTMENT'
+    REASONS = [
+        (INITIAL, 'Stock initial'),
+        (SALE, 'Vente expédiée'),
+        (RECEIPT, 'Réception fournisseur'),
+        (RETURN, 'Retour client'),
+        (ADJUSTMENT, 'Ajustement manuel'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    quantity = models.IntegerField("Variation")
+    reason = models.CharField("Motif", max_length=10, choices=REASONS)
+    reference = models.CharField("Référence", max_length=50, blank=True)
+    created_at = models.DateTimeField("Date", default=timezone.now)
+
+    class Meta:
+        verbose_name = "Mouvement de stock"
+        verbose_name_plural = "Mouvements de stock"
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='stock_movement_asof_idx'),
+            # Mouvements récents tous produits confondus (reclassement incrémental)
+            models.Index(fields=['created_at'], name='stock_movement_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} {self.quantity:+d} ({self.reason})"
+
+class StockCheckpoint(models.Model):
+    """Photo du stock (quantité + coût unitaire) prise chaque nuit, cf. inventory.ledger"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_checkpoints')
+    taken_at = models.DateTimeField("Pris le")
+    quantity = models.IntegerField("Quantité")
+    unit_cost = models.DecimalField("Coût unitaire HT", max_digits=10, decimal_places=2, null=True)
+
+    class Meta:
+        verbose_name = "Point de stock"
+        verbose_name_plural = "Points de stock"
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'taken_at'], name='stock_checkpoint_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} : {self.quantity} au {self.taken_at:%Y-%m-%d}"
+
+class StockShard(models.Model):
+    """Compteur réparti : delta de stock en attente de compaction dans Product.stock_quantity"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_counter_shards')
+    index = models.PositiveSmallIntegerField()
+    delta = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Compteur de stock réparti"
+        verbose_name_plural = "Compteurs de stock répartis"
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'index'], name='stock_shard_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}#{self.index} : {self.delta:+d}"
+
+# -------------------------------------------------------------------
+# PRÉVISION DE DEMANDE
+# -------------------------------------------------------------------
+
+class DemandForecast(models.Model):
+    """Prévision journalière d'un produit : une ligne compacte par produit (cf. inventory.forecasting)"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='demand_forecast')
+    generated_at = models.DateTimeField("Calculée le")
+    start_date = models.DateField("Premier jour prévu")
+    daily = models.JSONField("Quantités journalières")
+    total = models.FloatField("Total sur l'horizon", db_index=True)
+    rmse = models.FloatField("Erreur à un pas (RMSE)")
+    params = models.CharField("Paramètres (alpha,beta,gamma)", max_length=30)
+
+    class Meta:
+        verbose_name = "Prévision de demande"
+        verbose_name_plural = "Prévisions de demande"
 
     def __str__(self):
-        return f"{self.name} ({self.retail_price_incl_tax}€ TTC)"
\ No newline at end of file
+        return f"{self.product_id} : {self.total:.1f} sur {len(self.daily)} j"
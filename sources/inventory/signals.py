@@ -0,0 +1,23 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from company.models import TaxRate
+from .models import Brand, Category, Product
+from . import catalog, labels
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_labels(sender, **kwargs):
+    # Un renommage ou un déplacement change le chemin de toute la descendance
+    labels.invalidate()
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_catalog_product(sender, instance, **kwargs):
+    catalog.invalidate_products([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=TaxRate)
+@receiver([post_save, post_delete], sender=Brand)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_catalog(sender, **kwargs):
+    # Libellés repris par les fragments de nombreux produits : tout le catalogue est reconstruit
+    catalog.invalidate()
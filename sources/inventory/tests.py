@@ -1,3 +1,359 @@
-from django.test import TestCase
+import io
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from company.models import TaxRate
+from company.tests import LOCAL_CACHE
+from inventory import catalog, classification, counters, forecasting, labels, ledger
+from inventory.models import Brand, Category, DemandForecast, Product, StockCheckpoint, StockMovement, StockShard
+from procurement.models import Supplier, SupplierPrice, SupplierPriceHistory
+from sales.transitions import transition_many
+
+
+def at(day, hour=12):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()) + timedelta(hours=hour))
+
+
+class StockLedgerTests(TestCase):
+    def setUp(self):
+        tva20 = TaxRate.objects.create(name="TVA 20%", rate=Decimal("20.00"), is_default=True)
+        self.cameras = Category.objects.create(name="Cameras", slug="cameras")
+        self.lenses = Category.objects.create(name="Objectifs", slug="objectifs")
+        brand = Brand.objects.create(name="Nikon")
+        self.body = Product.objects.create(name="Z6", category=self.cameras, brand=brand, tax_rate=tva20,
+                                           retail_price=Decimal("1000.00"), stock_quantity=10)
+        self.lens = Product.objects.create(name="50mm", category=self.lenses, brand=brand, tax_rate=tva20,
+                                           retail_price=Decimal("200.00"), stock_quantity=4)
+        supplier = Supplier.objects.create(name="Global Supplier", email="sales@global.com")
+        SupplierPrice.objects.create(product=self.body, supplier=supplier, price=Decimal("600.00"), is_preferred=True)
+        SupplierPriceHistory.objects.update(valid_from=at(date(2024, 1, 1)))
+        StockMovement.objects.update(created_at=at(date(2024, 1, 1)))
+
+    def test_save_records_variations(self):
+        self.assertEqual(self.body.stock_movements.get().reason, StockMovement.INITIAL)
+        product = Product.objects.get(pk=self.body.pk)
+        product.stock_quantity = 7
+        product.save()
+        product.save()  # sans changement : rien de plus
+        self.assertEqual(list(product.stock_movements.order_by('pk').values_list('quantity', flat=True)), [10, -3])
+
+    def test_as_of_is_checkpoint_plus_ledger(self):
+        ledger.record_movements([(self.body.pk, -2, 'DP-1')], StockMovement.SALE, created_at=at(date(2024, 2, 10)))
+        ledger.take_checkpoint(at=at(date(2024, 2, 28), 23))
+        ledger.record_movements([(self.body.pk, 5, 'PO-1')], StockMovement.RECEIPT, created_at=at(date(2024, 3, 5)))
+
+        self.assertEqual(StockCheckpoint.objects.get(product=self.body).quantity, 8)
+        quantity = lambda day: ledger.stock_as_of(day).get(pk=self.body.pk).quantity_as_of
+        self.assertEqual(quantity(date(2024, 1, 31)), 10)
+        self.assertEqual(quantity(date(2024, 2, 10)), 8)
+        self.assertEqual(quantity(date(2024, 3, 31)), 13)
+
+        # Le point suivant ne reprend que les produits ayant bougé
+        self.assertEqual(ledger.take_checkpoint(at=at(date(2024, 3, 31), 23)), 1)
+        self.assertEqual(quantity(date(2024, 4, 1)), 13)
+
+    @override_settings(STOCK_CHECKPOINT_LAG_MINUTES=10)
+    def test_checkpoint_leaves_room_for_open_transactions(self):
+        started = timezone.now() - timedelta(minutes=2)  # transaction ouverte pendant le point
+        self.assertEqual(ledger.take_checkpoint(), 2)
+        self.assertLess(StockCheckpoint.objects.get(product=self.body).taken_at, started)
+        ledger.record_movements([(self.body.pk, -3, 'DP-3')], StockMovement.SALE, created_at=started)
+
+        self.assertEqual(ledger.stock_as_of(timezone.now()).get(pk=self.body.pk).quantity_as_of, 7)
+        self.assertEqual(ledger.take_checkpoint(), 0)  # repris par un point suivant, une fois le recul passé
+
+    def test_valuation_by_category(self):
+        ledger.record_movements([(self.lens.pk, -1, 'DP-2')], StockMovement.SALE, created_at=at(date(2024, 6, 1)))
+        rows = {row['category__name']: row for row in ledger.valuation(date(2024, 12, 31))}
+        self.assertEqual(rows["Cameras"]['quantity'], 10)
+        self.assertEqual(round(Decimal(rows["Cameras"]['value']), 2), Decimal("6000.00"))
+        self.assertEqual(rows["Objectifs"]['quantity'], 3)
+        self.assertEqual(rows["Objectifs"]['uncosted'], 1)
+
+    def test_commands_run(self):
+        call_command('stock_checkpoint', '--check-drift', stdout=io.StringIO())
+        call_command('inventory_valuation', '--as-of', '2024-12-31', stdout=io.StringIO())
+
+
+class ShardedCounterTests(TestCase):
+    def setUp(self):
+        tva20 = TaxRate.objects.create(name="TVA 20%", rate=Decimal("20.00"), is_default=True)
+        category = Category.objects.create(name="Cameras", slug="cameras")
+        self.hot = Product.objects.create(name="Z6", category=category, tax_rate=tva20,
+                                          retail_price=Decimal("1000.00"), stock_quantity=100, stock_shards=4)
+        self.plain = Product.objects.create(name="Z5", category=category, tax_rate=tva20,
+                                            retail_price=Decimal("800.00"), stock_quantity=100)
+
+    def test_decrements_spread_over_shards_and_compact(self):
+        self.assertEqual(self.hot.stock_counter_shards.count(), 4)
+        for _ in range(20):
+            counters.decrement({self.hot.pk: 2, self.plain.pk: 1})
+
+        self.hot.refresh_from_db(); self.plain.refresh_from_db()
+        self.assertEqual(self.hot.stock_quantity, 100)  # compteur principal jamais touché
+        self.assertEqual(self.hot.available_stock, 60)
+        self.assertEqual(self.plain.stock_quantity, 80)
+        self.assertEqual(counters.with_available_stock().get(pk=self.hot.pk).available_stock, 60)
+
+        self.assertEqual(counters.compact(), 1)
+        self.hot.refresh_from_db()
+        self.assertEqual((self.hot.stock_quantity, self.hot.available_stock), (60, 60))
+        self.assertFalse(StockShard.objects.exclude(delta=0).exists())
+
+    def test_oversold_shards_compact_to_zero(self):
+        counters.decrement({self.hot.pk: 70})
+        counters.decrement({self.hot.pk: 50})
+        ledger.record_movements([(self.hot.pk, -120, 'CMD')], StockMovement.SALE)
+
+        with self.assertLogs('inventory.counters', 'WARNING'):
+            self.assertEqual(counters.compact(), 1)
+        self.hot.refresh_from_db()
+        self.assertEqual(self.hot.stock_quantity, 0)
+        adjustment = StockMovement.objects.get(product=self.hot, reason=StockMovement.ADJUSTMENT)
+        self.assertEqual((adjustment.quantity, adjustment.reference), (20, ledger.OVERSOLD_REFERENCE))
+        self.assertFalse(ledger.drift().filter(pk=self.hot.pk).exists())
+
+    def test_disabling_drops_shards_once_compacted(self):
+        counters.decrement({self.hot.pk: 3})
+        Product.objects.filter(pk=self.hot.pk).update(stock_shards=0)
+        counters.compact()
+        self.hot.refresh_from_db()
+        self.assertEqual(self.hot.stock_quantity, 97)
+        self.assertFalse(self.hot.stock_counter_shards.exists())
+
+
+@override_settings(REFERENCE_CACHE_CHECK_INTERVAL=0, CACHES=LOCAL_CACHE)
+class CategoryLabelTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        labels._snapshot.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.photo = Category.objects.create(name="Photo", slug="photo")
+            self.lenses = Category.objects.create(name="Objectifs", slug="objectifs", parent=self.photo)
+
+    def test_paths_are_cached_and_invalidated(self):
+        self.assertEqual(str(self.lenses), "Photo > Objectifs")
+        categories = list(Category.objects.all())
+        with self.assertNumQueries(0):  # aucun parent relu
+            self.assertEqual(sorted(str(c) for c in categories), ["Photo", "Photo > Objectifs"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.photo.name = "Image"
+            self.photo.save()
+        self.assertEqual(str(Category.objects.get(pk=self.lenses.pk)), "Image > Objectifs")
+
+
+@override_settings(REFERENCE_CACHE_CHECK_INTERVAL=0, CACHES=LOCAL_CACHE, CATALOG_API_PUBLIC=True)
+class CatalogApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        labels._snapshot.clear()
+        tva20 = TaxRate.objects.create(name="TVA 20%", rate=Decimal("20.00"), is_default=True)
+        self.photo = Category.objects.create(name="Photo", slug="photo")
+        lenses = Category.objects.create(name="Objectifs", slug="objectifs", parent=self.photo)
+        brand = Brand.objects.create(name="Nikon")
+        self.products = [
+            Product.objects.create(name=f"Objectif {focal}mm", sku=f"NK-{focal}", category=lenses, brand=brand,
+                                   tax_rate=tva20, retail_price=Decimal("100.00"), stock_quantity=focal)
+            for focal in (24, 35, 50)
+        ]
+
+    def get(self, url, **headers):
+        return self.client.get(url, headers=headers)
+
+    def test_cursor_pagination(self):
+        response = self.get('/catalog/products/?limit=2')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([item['sku'] for item in data['results']], ["NK-24", "NK-35"])
+        self.assertEqual(data['results'][0], {
+            'id': self.products[0].pk, 'sku': "NK-24", 'name': "Objectif 24mm", 'brand': "Nikon",
+            'category': "Photo > Objectifs", 'price_incl_tax': "120.00", 'price_excl_tax': "100.00",
+            'vat_rate': "20.00", 'stock': 24,
+        })
+        data = self.client.get(data['next']).json()
+        self.assertEqual([item['sku'] for item in data['results']], ["NK-50"])
+        self.assertIsNone(data['next'])
+        self.assertEqual(self.get(f'/catalog/products/{self.products[1].pk}/').json()['stock'], 35)
+        self.assertEqual(self.get('/catalog/products/999999/').status_code, 404)
+        self.assertEqual(self.get('/catalog/products/?cursor=x').status_code, 400)
+
+    def test_unchanged_catalog_costs_no_query(self):
+        response = self.get('/catalog/products/')
+        with self.assertNumQueries(1):  # fragments en cache : seule la liste des identifiants est lue
+            self.assertEqual(self.get('/catalog/products/').content, response.content)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get('/catalog/products/', If_None_Match=response['ETag']).status_code, 304)
+            self.assertEqual(
+                self.get('/catalog/products/', If_Modified_Since=response['Last-Modified']).status_code, 304
+            )
+        # Autre page : autre ETag
+        self.assertEqual(self.get('/catalog/products/?limit=1', If_None_Match=response['ETag']).status_code, 200)
+
+    def test_changes_invalidate(self):
+        etag = self.get('/catalog/products/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.get(pk=self.products[0].pk)
+            product.retail_price = Decimal("110.00")
+            product.save()
+        response = self.get('/catalog/products/', If_None_Match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['price_incl_tax'], "132.00")
+
+        # Expédition : décrémentation par UPDATE, sans save
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.decrement({self.products[1].pk: 5})
+        self.assertEqual(self.get(f'/catalog/products/{self.products[1].pk}/').json()['stock'], 30)
+
+        # Catégorie renommée : tous les fragments sont reconstruits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.photo.name = "Image"
+            self.photo.save()
+        categories = {item['category'] for item in self.get('/catalog/products/').json()['results']}
+        self.assertEqual(categories, {"Image > Objectifs"})
+
+    def test_change_during_rebuild_is_not_cached(self):
+        pk = self.products[0].pk
+        with_available_stock = counters.with_available_stock
+
+        def racing(queryset):
+            products = list(with_available_stock(queryset))  # lu avant la modification
+            with self.captureOnCommitCallbacks(execute=True):  # modification validée entre-temps
+                Product.objects.filter(pk=pk).update(retail_price=Decimal("110.00"),
+                                                     retail_price_incl_tax=Decimal("132.00"))
+                catalog.invalidate_products([pk])
+            return products
+
+        with mock.patch.object(catalog.counters, 'with_available_stock', racing):
+            self.assertEqual(self.get(f'/catalog/products/{pk}/').json()['price_incl_tax'], "120.00")
+        self.assertEqual(self.get(f'/catalog/products/{pk}/').json()['price_incl_tax'], "132.00")
+
+    def test_gzip(self):
+        response = self.get('/catalog/products/', Accept_Encoding='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(self.get('/catalog/products/', Accept_Encoding='gzip',
+                                  If_None_Match=response['ETag']).status_code, 304)
+
+    @override_settings(CATALOG_API_TOKENS=['s3cret'])
+    def test_token(self):
+        self.assertEqual(self.get('/catalog/products/').status_code, 401)
+        self.assertEqual(self.get('/catalog/products/', Authorization='Bearer nope').status_code, 401)
+        self.assertEqual(self.get('/catalog/products/', Authorization='Bearer s3cret').status_code, 200)
+
+    @override_settings(CATALOG_API_TOKENS=[], CATALOG_API_PUBLIC=False)
+    def test_closed_without_tokens(self):
+        self.assertEqual(self.get('/catalog/products/').status_code, 401)
+        self.assertEqual(self.get('/catalog/products/', Authorization='Bearer ').status_code, 401)
+
+    def test_version_is_shared_between_workers(self):
+        stamp = catalog.version()
+        catalog._version.set()  # invalidation faite par un autre worker
+        self.assertNotEqual(catalog.version(), stamp)
+        cache.delete(catalog.VERSION_KEY)  # évincée : un seul nouveau tampon, repris par tous
+        self.assertEqual(catalog.version(), catalog.version())
+
+
+class DemandForecastTests(TestCase):
+    def setUp(self):
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            self.skipTest("numpy non installé")
+
+    def test_weekly_pattern_is_forecast(self):
+        import numpy as np
+        week = np.array([2, 2, 2, 2, 4, 6, 0], dtype=np.float32)
+        matrix = np.vstack([np.tile(week, 8), np.zeros(56, dtype=np.float32)])
+        forecast, _, rmse = forecasting.holt_winters(matrix, 7)
+        np.testing.assert_allclose(forecast[0], week, atol=0.05)
+        self.assertEqual(forecast[1].sum(), 0)
+        self.assertLess(rmse[0], 0.01)
+
+    def test_command_stores_one_row_per_product(self):
+        from sales.tests import make_catalog, make_customer, make_order
+        from sales.models import Order
+
+        camera, lens, _ = make_catalog()
+        customer, billing, shipping = make_customer()
+        for _ in range(3):
+            make_order(customer, billing, shipping, [(camera, 2), (lens, 1)])
+        make_order(customer, billing, shipping, [(lens, 5)])  # brouillon : ignoré
+        Order.objects.filter(pk__in=Order.objects.order_by('pk').values('pk')[:3]).update(
+            status='PAID', created_at=timezone.now() - timedelta(days=1),
+        )
+
+        call_command('forecast_demand', '--history-days', '28', '--horizon', '14', stdout=io.StringIO())
+        self.assertEqual(DemandForecast.objects.count(), 3)
+        forecast = DemandForecast.objects.get(product=camera)
+        self.assertEqual(len(forecast.daily), 14)
+        self.assertEqual(forecast.start_date, timezone.localdate())  # historique arrêté à hier
+        self.assertGreater(forecast.total, DemandForecast.objects.get(product=lens).total)
+
+
+class ClassificationTests(TestCase):
+    def setUp(self):
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            self.skipTest("numpy non installé")
+        from sales.tests import make_catalog, make_customer
+
+        self.now = at(date(2024, 6, 12), 2)  # mercredi : période jusqu'au dimanche 9 juin
+        self.steady, self.bursty, self.idle = make_catalog()
+        self.customer = make_customer()
+        for week in range(8):
+            self.sell(self.steady, 10, date(2024, 6, 3) - timedelta(weeks=week))
+        self.sell(self.bursty, 15, date(2024, 5, 1))
+
+    def sell(self, product, quantity, day, paid_at=None):
+        from sales.tests import make_order
+        order = make_order(*self.customer, [(product, quantity)])
+        type(order).objects.filter(pk=order.pk).update(status='PAID', created_at=at(day),
+                                                       status_changed_at=paid_at or at(day))
+        return order
+
+    def classes(self):
+        return {p.pk: (p.abc_class, p.xyz_class) for p in Product.objects.all()}
+
+    def test_revenue_classes(self):
+        self.assertEqual(classification.revenue_classes([5, 80, 0, 15]).tolist(), ['C', 'A', 'C', 'B'])
+        self.assertEqual(classification.revenue_classes([0, 0]).tolist(), ['C', 'C'])
+
+    def test_full_then_incremental(self):
+        stats = classification.classify(weeks=8, now=self.now)
+        self.assertTrue(stats['full'])
+        self.assertEqual(self.classes(), {
+            self.steady.pk: ('A', 'X'), self.bursty.pk: ('B', 'Z'), self.idle.pk: ('C', 'Z'),
+        })
+
+        # Nuit suivante, même période : seul le produit vendu (commande du 5 payée le 12) est repris
+        self.sell(self.idle, 20, date(2024, 6, 5), paid_at=self.now + timedelta(hours=10))
+        with mock.patch.object(classification, 'FULL_RUN_RATIO', 1):
+            stats = classification.classify(weeks=8, now=self.now + timedelta(days=1))
+        self.assertEqual((stats['full'], stats['reprocessed']), (False, 1))
+        self.assertEqual(Product.objects.get(pk=self.idle.pk).window_revenue, Decimal("2000.00"))
+        self.assertEqual(stats['abc_changed'], 1)
+        self.assertEqual(self.classes()[self.idle.pk], ('A', 'Z'))
+
+    def test_cancellation_is_reprocessed(self):
+        order = self.sell(self.idle, 20, date(2024, 6, 5))
+        classification.classify(weeks=8, now=self.now)
+        self.assertEqual(Product.objects.get(pk=self.idle.pk).window_revenue, Decimal("2000.00"))
+
+        # Annulée après le passage, sans aucun mouvement de stock (jamais expédiée)
+        with mock.patch('django.utils.timezone.now', return_value=self.now + timedelta(hours=10)):
+            transition_many(type(order).objects.filter(pk=order.pk), 'CANCELLED')
+        with mock.patch.object(classification, 'FULL_RUN_RATIO', 1):
+            stats = classification.classify(weeks=8, now=self.now + timedelta(days=1))
+        self.assertEqual((stats['full'], stats['reprocessed']), (False, 1))
+        self.assertEqual(Product.objects.get(pk=self.idle.pk).window_revenue, 0)
+
+    def test_command_runs(self):
+        call_command('classify_catalog', '--full', stdout=io.StringIO())
@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('products/', views.catalog_products, name='catalog_products'),
+    path('products/<int:product_id>/', views.catalog_product, name='catalog_product'),
+]
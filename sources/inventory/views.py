@@ -1,3 +1,84 @@
-from django.shortcuts import render
+import functools
+import hashlib
+import hmac
+import json
 
-# Create your views here.
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_GET
+
+from . import catalog
+
+
+def catalog_token_required(view):
+    """
+    Jeton ``Authorization: Bearer`` parmi CATALOG_API_TOKENS. Sans jeton
+    configuré tout appel est refusé, sauf si CATALOG_API_PUBLIC ouvre le catalogue.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        tokens = getattr(settings, 'CATALOG_API_TOKENS', [])
+        if tokens or not getattr(settings, 'CATALOG_API_PUBLIC', False):
+            scheme, _, given = request.headers.get('Authorization', '').partition(' ')
+            if scheme.lower() != 'bearer' or not any(hmac.compare_digest(given, token) for token in tokens):
+                response = JsonResponse({'error': "Jeton d'accès au catalogue invalide"}, status=401)
+                response['WWW-Authenticate'] = 'Bearer'
+                return response
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _catalog_etag(request, *args, **kwargs):
+    # Version du catalogue + URL : une page inchangée répond 304 sans lire le catalogue. Le tampon vit
+    # dans le cache partagé (company.E001) : même ETag sur tous les workers, changé par toute invalidation
+    return hashlib.md5(f"{catalog.version()}:{request.get_full_path()}".encode(), usedforsecurity=False).hexdigest()
+
+
+def _catalog_last_modified(request, *args, **kwargs):
+    return catalog.last_modified()
+
+
+def _json(body):
+    return HttpResponse(body, content_type='application/json')
+
+
+def _limit(request):
+    try:
+        return min(max(int(request.GET.get('limit', catalog.PAGE_SIZE)), 1), catalog.MAX_PAGE_SIZE)
+    except ValueError:
+        return catalog.PAGE_SIZE
+
+
+@require_GET
+@catalog_token_required
+@gzip_page
+@condition(etag_func=_catalog_etag, last_modified_func=_catalog_last_modified)
+def catalog_products(request):
+    """Catalogue paginé par curseur (JSON, ?cursor=<dernier id reçu>&limit=100), cf. inventory.catalog"""
+    try:
+        cursor = max(int(request.GET.get('cursor', 0)), 0)
+    except ValueError:
+        return JsonResponse({'error': "Curseur invalide"}, status=400)
+    limit = _limit(request)
+    results, next_cursor = catalog.page(cursor, limit)
+    next_url = None
+    if next_cursor is not None:
+        next_url = request.build_absolute_uri(
+            f"{reverse('catalog_products')}?{urlencode({'cursor': next_cursor, 'limit': limit})}"
+        )
+    return _json(f'{{"results":[{",".join(results)}],"next":{json.dumps(next_url)}}}')
+
+
+@require_GET
+@catalog_token_required
+@gzip_page
+@condition(etag_func=_catalog_etag, last_modified_func=_catalog_last_modified)
+def catalog_product(request, product_id):
+    """Fiche catalogue d'un produit (JSON)"""
+    results = catalog.payloads([product_id])
+    if not results:
+        raise Http404("Produit inconnu")
+    return _json(results[0])
@@ -0,0 +1,15 @@
+"""
+Banc de charge HTTP du back-office, autonome et hors ligne.
+
+    python -m loadtest --seed --orders 20000 --server wsgi -c 16 -n 400
+    python -m loadtest --server asgi --scenarios invoice_pdf changelist -c 64 -d 30
+
+Le projet est lancé sous un vrai serveur (gunicorn ou uvicorn s'ils sont
+installés, sinon le serveur WSGI multi-thread de Django) sur une base SQLite
+dédiée (``--db``) ou sur la base configurée (``--project-db``), alimentée en
+volume par ``--seed``. Les scénarios (liste des commandes, fiche commande,
+facture PDF, actions d'admin, rapports...) sont joués avec N utilisateurs
+concurrents ; le rapport donne p50/p95/p99 et le débit par scénario.
+
+Aucune dépendance hors Django et la bibliothèque standard.
+"""
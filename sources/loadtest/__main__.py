@@ -0,0 +1,112 @@
+import argparse
+import json
+import os
+import sys
+from contextlib import nullcontext
+from pathlib import Path
+
+from . import __doc__ as DESCRIPTION
+from .server import SOURCES, Server
+
+
+def parse_args(argv=None):
+    from .scenarios import DEFAULT, SCENARIOS
+
+    parser = argparse.ArgumentParser(prog='python -m loadtest', description=DESCRIPTION,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    data = parser.add_argument_group("base de données")
+    data.add_argument('--db', default=str(SOURCES / 'loadtest.sqlite3'), help="Fichier SQLite du banc")
+    data.add_argument('--project-db', action='store_true', help="Utiliser la base configurée du projet")
+    data.add_argument('--seed', action='store_true', help="Ajouter un jeu de données en volume avant le banc")
+    data.add_argument('--customers', type=int, default=2000)
+    data.add_argument('--products', type=int, default=500)
+    data.add_argument('--orders', type=int, default=20000)
+
+    server = parser.add_argument_group("serveur")
+    server.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi')
+    server.add_argument('--workers', type=int, default=2)
+    server.add_argument('--threads', type=int, default=8, help="Threads par worker (gunicorn)")
+    server.add_argument('--url', help="Viser un serveur déjà lancé sur la même base au lieu d'en démarrer un")
+
+    load = parser.add_argument_group("charge")
+    load.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=DEFAULT)
+    load.add_argument('-c', '--concurrency', type=int, default=16, help="Utilisateurs virtuels par scénario")
+    load.add_argument('-n', '--requests', type=int, default=200, help="Requêtes par scénario")
+    load.add_argument('-d', '--duration', type=float, help="Durée par scénario (s), prime sur -n")
+    load.add_argument('--warmup', type=int, default=10, help="Requêtes de chauffe par scénario, hors statistiques")
+    load.add_argument('--json', type=Path, help="Écrire aussi les résultats en JSON")
+    return parser.parse_args(argv)
+
+
+def setup(args):
+    """Configure Django sur la base du banc (migrée au besoin) et la peuple si demandé"""
+    env = {'DJANGO_SETTINGS_MODULE': 'loadtest.settings'}
+    if args.project_db:
+        env['LOADTEST_PROJECT_DB'] = '1'
+    else:
+        env['LOADTEST_DB'] = str(Path(args.db).resolve())
+    os.environ.update(env)
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command('migrate', verbosity=0)
+    call_command('createcachetable', verbosity=0)
+
+    from sales.models import Order
+    from .seed import seed
+
+    if args.seed or not Order.objects.exists():
+        print("Génération du jeu de données...")
+        seed(args.customers, args.products, args.orders, log=lambda message: print(f"  {message}"))
+    return env
+
+
+def login():
+    """Identifiant de session du super-utilisateur du banc"""
+    from django.test import Client
+    from .seed import _user
+
+    client = Client()
+    client.force_login(_user())
+    return client.cookies['sessionid'].value
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    env = setup(args)
+
+    from .runner import format_table, run
+    from .scenarios import SCENARIOS, Context
+
+    ctx = Context()
+    sessionid = login()
+    if args.url:
+        server, label = None, args.url
+    else:
+        server = Server(args.server, args.workers, args.threads, env=env, log=SOURCES / 'loadtest-server.log')
+        label = server.label
+
+    rows = []
+    with server or nullcontext():
+        base_url = args.url or server.url
+        print(f"{label} | {args.concurrency} utilisateurs | {len(ctx.order_ids)} commandes échantillonnées")
+        print(format_table([]))
+        for name in args.scenarios:
+            scenario = SCENARIOS[name]
+            if args.warmup:
+                run(scenario, ctx, base_url, sessionid, concurrency=min(args.concurrency, args.warmup),
+                    requests=args.warmup)
+            rows.append((name, run(scenario, ctx, base_url, sessionid, args.concurrency, args.requests, args.duration)))
+            print(format_table(rows[-1:]).splitlines()[-1])
+
+    if args.json:
+        args.json.write_text(json.dumps({
+            'server': label, 'concurrency': args.concurrency, 'results': dict(rows),
+        }, indent=2))
+    return 1 if any(stats['errors'] for _, stats in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
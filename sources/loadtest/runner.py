@@ -0,0 +1,108 @@
+"""
+Exécution d'un scénario par N utilisateurs virtuels (threads) et statistiques.
+
+Chaque utilisateur enchaîne ses requêtes sans temps de réflexion, jusqu'au
+nombre total de requêtes ou à la durée demandés, ou jusqu'à ce que le scénario
+n'ait plus rien à jouer (il renvoie alors None, ex. brouillons épuisés). Une
+requête est en erreur si le statut final n'est pas 200 ou si elle aboutit à la
+page de connexion.
+"""
+import random
+import secrets
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Session:
+    """Client HTTP authentifié (cookie de session staff + jeton CSRF non masqué)"""
+
+    def __init__(self, base_url, sessionid=None):
+        self.base_url = base_url.rstrip('/')
+        self.csrf = secrets.token_hex(16)  # 32 caractères : accepté tel quel par CsrfViewMiddleware
+        self.opener = urllib.request.build_opener()  # suit les redirections (actions d'admin), en-têtes compris
+        self.cookies = f'csrftoken={self.csrf}' + (f'; sessionid={sessionid}' if sessionid else '')
+
+    def request(self, method, path, body=None, timeout=120):
+        request = urllib.request.Request(
+            self.base_url + path, method=method, data=body.encode() if body is not None else None,
+            headers={'Cookie': self.cookies, 'X-CSRFToken': self.csrf,
+                     'Content-Type': 'application/x-www-form-urlencoded'},
+        )
+        started = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=timeout) as response:
+                response.read()
+                ok = response.status == 200 and '/admin/login/' not in response.url
+        except (urllib.error.URLError, OSError):
+            ok = False
+        return time.perf_counter() - started, ok
+
+
+def run(scenario, ctx, base_url, sessionid, concurrency=16, requests=200, duration=None, seed=0):
+    """Joue ``scenario`` ; ``duration`` (s) prime sur ``requests``. Retourne un dict de statistiques."""
+    results, lock = [], threading.Lock()
+    remaining = [requests]
+    deadline = [None]
+
+    def next_slot():
+        with lock:
+            if deadline[0] is not None:
+                return time.perf_counter() < deadline[0]
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        session = Session(base_url, sessionid)
+        local = []
+        while next_slot():
+            step = scenario(ctx, rng)
+            if step is None:
+                break
+            local.append(session.request(*step))
+        with lock:
+            results.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    if duration:
+        deadline[0] = started + duration
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = [seconds for seconds, ok in results if ok]
+    return {
+        'requests': len(results),
+        'errors': sum(1 for _, ok in results if not ok),
+        'throughput': len(results) / elapsed if elapsed else 0.0,
+        'mean': statistics.mean(latencies) if latencies else 0.0,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+    }
+
+
+def format_table(rows):
+    """rows : [(scénario, stats)] -> tableau texte"""
+    lines = [f"{'scénario':<18} {'requêtes':>9} {'erreurs':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"]
+    for name, stats in rows:
+        lines.append(
+            f"{name:<18} {stats['requests']:>9} {stats['errors']:>8} {stats['throughput']:>8.1f} "
+            f"{stats['p50'] * 1000:>8.0f} {stats['p95'] * 1000:>8.0f} {stats['p99'] * 1000:>8.0f}"
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,92 @@
+"""
+Scénarios du banc : chacun produit, pour une itération, la requête HTTP à jouer.
+
+Les identifiants (commandes, brouillons, promotions) sont tirés au démarrage
+dans la base du banc ; les actions d'admin sont postées comme depuis la liste
+(``action`` + ``_selected_action``). Les scénarios qui écrivent sont hors du
+jeu par défaut.
+"""
+import threading
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.utils import timezone
+
+ADMIN_PAGE_SIZE = 100  # list_per_page par défaut
+
+
+class Context:
+    """Données tirées une fois dans la base, partagées par les utilisateurs virtuels"""
+
+    def __init__(self, sample=2000):
+        from sales.models import Order, Promotion
+
+        self.order_ids = list(Order.objects.order_by('?').values_list('pk', flat=True)[:sample])
+        self.pages = max(min(Order.objects.count() // ADMIN_PAGE_SIZE, 50), 1)
+        self.drafts = list(Order.objects.filter(status='DRAFT').values_list('pk', flat=True))
+        self.promotion_ids = list(Promotion.objects.values_list('pk', flat=True)[:20])
+        self.today = timezone.localdate()
+        self._lock = threading.Lock()
+
+    def take_drafts(self, count):
+        """Brouillons jamais encore utilisés (chaque commande ne passe qu'une fois à PAID)"""
+        with self._lock:
+            taken, self.drafts = self.drafts[:count], self.drafts[count:]
+        return taken
+
+
+def _action(path, action, ids):
+    return 'POST', path, urlencode([('action', action), ('index', 0)] + [('_selected_action', pk) for pk in ids])
+
+
+def changelist(ctx, rng):
+    return 'GET', f'/admin/sales/order/?p={rng.randrange(ctx.pages) + 1}', None
+
+
+def change_form(ctx, rng):
+    return 'GET', f'/admin/sales/order/{rng.choice(ctx.order_ids)}/change/', None
+
+
+def customer_search(ctx, rng):
+    return 'GET', f'/admin/sales/customer/?q=Banc{rng.randrange(1000)}', None
+
+
+def invoice_pdf(ctx, rng):
+    return 'GET', f'/sales/order/{rng.choice(ctx.order_ids)}/pdf/', None
+
+
+def export_lines(ctx, rng):
+    return _action('/admin/sales/order/', 'export_lines_csv', rng.sample(ctx.order_ids, min(20, len(ctx.order_ids))))
+
+
+def margin_report(ctx, rng):
+    return 'GET', f"/sales/reports/margins/?group_by={rng.choice(['product', 'brand', 'category'])}", None
+
+
+def vat_report(ctx, rng):
+    start = ctx.today - timedelta(days=rng.choice([30, 90, 365]))
+    return 'GET', f'/sales/reports/vat/?start={start.isoformat()}&end={ctx.today.isoformat()}', None
+
+
+def promo_simulation(ctx, rng):
+    return _action('/admin/sales/promotion/', 'simulate_last_year', [rng.choice(ctx.promotion_ids)])
+
+
+def mark_paid(ctx, rng):
+    # Brouillons épuisés : une action sans sélection répond 200 sans rien faire, on s'arrête
+    drafts = ctx.take_drafts(5)
+    return _action('/admin/sales/order/', 'mark_as_paid', drafts) if drafts else None
+
+
+SCENARIOS = {
+    'changelist': changelist,
+    'change_form': change_form,
+    'customer_search': customer_search,
+    'invoice_pdf': invoice_pdf,
+    'export_lines': export_lines,
+    'margin_report': margin_report,
+    'vat_report': vat_report,
+    'promo_simulation': promo_simulation,
+    'mark_paid': mark_paid,  # écrit : transitions DRAFT -> PAID et événements outbox
+}
+DEFAULT = ['changelist', 'change_form', 'customer_search', 'invoice_pdf', 'export_lines', 'margin_report', 'vat_report']
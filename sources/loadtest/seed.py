@@ -0,0 +1,145 @@
+"""
+Jeu de données en volume pour le banc (bulk_create : ni signaux ni outbox).
+
+Crée un catalogue, des clients avec leurs adresses, des commandes de 1 à 5
+lignes réparties sur l'année écoulée et dans tous les statuts, ainsi qu'un
+super-utilisateur ``loadtest`` pour les pages d'admin.
+"""
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from company import money
+from company.models import CompanySettings, TaxRate
+from inventory.models import Brand, Category, Product
+from procurement.models import Supplier, SupplierPrice, SupplierPriceHistory
+from sales.models import Address, Carrier, Customer, Order, OrderLine, Promotion, allocate_references
+
+USERNAME = 'loadtest'
+STATUSES = ['DRAFT', 'PAID', 'PAID', 'SHIPPED', 'DELIVERED', 'DELIVERED', 'DELIVERED', 'CANCELLED']
+BATCH = 2000
+
+
+def seed(customers=2000, products=500, orders=20000, rng=None, log=print):
+    """Ajoute le volume demandé à la base courante. Retourne le super-utilisateur du banc."""
+    rng = rng or random.Random(0)
+    with transaction.atomic():
+        user = _user()
+        if not CompanySettings.objects.exists():
+            CompanySettings.objects.create(name="Banc de charge", email="bench@example.com",
+                                           address="1 rue du Banc", zip_code="75000", city="Paris")
+        rates = [
+            TaxRate.objects.get_or_create(rate=Decimal("20.00"), defaults={'name': "TVA 20%", 'is_default': True})[0],
+            TaxRate.objects.get_or_create(rate=Decimal("5.50"), defaults={'name': "TVA 5.5%"})[0],
+        ]
+        carrier = Carrier.objects.get_or_create(name="Banc Express", defaults={'base_cost': Decimal("9.90")})[0]
+
+        catalog = _catalog(products, rates, rng)
+        log(f"{len(catalog)} produits")
+        addresses = _customers(customers, rng)
+        log(f"{len(addresses)} clients")
+        count = _orders(orders, catalog, addresses, carrier, rates[0], rng)
+        log(f"{count} commandes")
+        _promotion(catalog, rng)
+    return user
+
+
+def _user():
+    user = User.objects.filter(username=USERNAME).first()
+    if user is None:
+        user = User.objects.create_superuser(USERNAME, 'loadtest@example.com', USERNAME)
+    return user
+
+
+def _catalog(count, rates, rng):
+    first = Product.objects.count()
+    brands = Brand.objects.bulk_create([Brand(name=f"Marque banc {first + i}") for i in range(max(count // 25, 1))])
+    root = Category.objects.create(name=f"Banc {first}", slug=f"banc-{first}")
+    categories = Category.objects.bulk_create([
+        Category(name=f"Rayon {first + i}", slug=f"rayon-banc-{first + i}", parent=root)
+        for i in range(max(count // 50, 1))
+    ])
+    supplier = Supplier.objects.get_or_create(name="Fournisseur banc", defaults={'email': 'bench@example.com'})[0]
+
+    catalog = []
+    for i in range(count):
+        rate = rates[0] if rng.random() < 0.9 else rates[1]
+        price = Decimal(rng.randrange(500, 100000)).scaleb(-2)
+        catalog.append(Product(
+            name=f"Produit banc {first + i}", sku=f"BENCH-{first + i:07d}",
+            category=rng.choice(categories), brand=rng.choice(brands), tax_rate=rate,
+            retail_price=price,
+            retail_price_incl_tax=money.from_cents(money.incl_tax_cents(money.to_cents(price), money.rate_to_bp(rate.rate))),
+            stock_quantity=rng.randrange(0, 500),
+        ))
+    catalog = Product.objects.bulk_create(catalog, batch_size=BATCH)
+    costs = [(product, (product.retail_price * Decimal("0.6")).quantize(Decimal("0.01"))) for product in catalog]
+    SupplierPrice.objects.bulk_create([
+        SupplierPrice(product=product, supplier=supplier, price=cost, is_preferred=True) for product, cost in costs
+    ], batch_size=BATCH)
+    # Historique en vigueur avant les commandes générées (coûts du rapport de marge)
+    valid_from = timezone.now() - timedelta(days=400)
+    SupplierPriceHistory.objects.bulk_create([
+        SupplierPriceHistory(product=product, supplier=supplier, price=cost, is_preferred=True, valid_from=valid_from)
+        for product, cost in costs
+    ], batch_size=BATCH)
+    return catalog
+
+
+def _customers(count, rng):
+    first = Customer.objects.count()
+    customers = Customer.objects.bulk_create([
+        Customer(first_name=f"Client{first + i}", last_name=f"Banc{first + i}", email=f"client{first + i}@bench.example",
+                 is_professional=rng.random() < 0.1)
+        for i in range(count)
+    ], batch_size=BATCH)
+    addresses = Address.objects.bulk_create([
+        Address(customer=customer, address_type=kind, label=kind.title(), street_address=f"{i} rue du Banc",
+                city="Paris", postal_code="75000")
+        for i, customer in enumerate(customers) for kind in ('BILLING', 'SHIPPING')
+    ], batch_size=BATCH)
+    return [(customer, addresses[2 * i], addresses[2 * i + 1]) for i, customer in enumerate(customers)]
+
+
+def _orders(count, catalog, addresses, carrier, shipping_rate, rng):
+    now = timezone.now()
+    created = 0
+    for start in range(0, count, BATCH):
+        size = min(BATCH, count - start)
+        references = allocate_references(size)
+        orders = []
+        for reference in references:
+            customer, billing, shipping = rng.choice(addresses)
+            orders.append(Order(
+                reference=reference, customer=customer, billing_address=billing, shipping_address=shipping,
+                status=rng.choice(STATUSES), carrier=carrier, shipping_cost=carrier.base_cost,
+                shipping_tax_rate=shipping_rate,
+            ))
+        orders = Order.objects.bulk_create(orders)
+        OrderLine.objects.bulk_create([
+            OrderLine(order=order, product=product, quantity=rng.randint(1, 3),
+                      unit_price_incl_tax=product.retail_price_incl_tax, vat_rate=product.tax_rate.rate)
+            for order in orders for product in rng.sample(catalog, min(rng.randint(1, 5), len(catalog)))
+        ], batch_size=BATCH)
+        # created_at est en auto_now_add : dates réparties sur l'année après coup, un UPDATE par lot
+        Order.objects.filter(pk__in=[order.pk for order in orders]).update(created_at=Case(
+            *[When(pk=order.pk, then=Value(now - timedelta(hours=rng.randrange(365 * 24)))) for order in orders],
+            output_field=DateTimeField(),
+        ))
+        created += len(orders)
+    return created
+
+
+def _promotion(catalog, rng):
+    """Promotion inactive ciblant une marque (scénario de simulation)"""
+    now = timezone.now()
+    promotion = Promotion.objects.create(
+        name=f"Banc -15 % {Promotion.objects.count()}", promo_type='BRAND_OFFER', discount_type='PERCENT',
+        value=Decimal("15.00"), start_date=now, end_date=now + timedelta(days=30), active=False,
+    )
+    promotion.target_brands.add(rng.choice(catalog).brand)
@@ -0,0 +1,103 @@
+"""
+Lancement du projet sous un serveur HTTP, dans un processus séparé.
+
+- wsgi : gunicorn (``--workers`` x ``--threads``) s'il est installé, sinon le
+  serveur WSGI multi-thread de Django (un processus, un thread par requête) ;
+- asgi : uvicorn (``--workers``), requis.
+
+Exécuté directement (``python -m loadtest.server PORT``), ce module sert le
+projet avec le serveur multi-thread de Django, sans journal des requêtes.
+"""
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+SOURCES = Path(__file__).resolve().parent.parent
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def command(kind, port, workers=2, threads=8):
+    """Ligne de commande et libellé du serveur"""
+    bind = f'127.0.0.1:{port}'
+    if kind == 'asgi':
+        if not importlib.util.find_spec('uvicorn'):
+            raise RuntimeError("Le mode asgi nécessite uvicorn (pip install uvicorn).")
+        return ([sys.executable, '-m', 'uvicorn', 'config.asgi:application', '--host', '127.0.0.1',
+                 '--port', str(port), '--workers', str(workers), '--no-access-log', '--log-level', 'warning'],
+                f"uvicorn {workers} worker(s)")
+    if importlib.util.find_spec('gunicorn'):
+        return ([sys.executable, '-m', 'gunicorn', 'config.wsgi', '-b', bind, '-w', str(workers),
+                 '--threads', str(threads), '--log-level', 'warning'],
+                f"gunicorn {workers} worker(s) x {threads} threads")
+    return [sys.executable, '-m', 'loadtest.server', str(port)], "serveur WSGI multi-thread de Django"
+
+
+class Server:
+    """Serveur du projet le temps d'un bloc ``with`` ; ``url`` est sa racine"""
+
+    def __init__(self, kind='wsgi', workers=2, threads=8, env=None, log=None, startup_timeout=60):
+        self.port = free_port()
+        self.url = f'http://127.0.0.1:{self.port}'
+        self.args, self.label = command(kind, self.port, workers, threads)
+        self.env = {**os.environ, **(env or {})}
+        self.log = log  # fichier recevant la sortie d'erreur du serveur (tracebacks)
+        self.startup_timeout = startup_timeout
+        self.process = None
+
+    def __enter__(self):
+        stderr = open(self.log, 'ab') if self.log else subprocess.DEVNULL
+        self.process = subprocess.Popen(self.args, cwd=SOURCES, env=self.env, stdout=subprocess.DEVNULL, stderr=stderr)
+        if self.log:
+            stderr.close()  # le processus garde sa copie
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Le serveur s'est arrêté au démarrage (code {self.process.returncode}).")
+            try:
+                urllib.request.urlopen(self.url + '/admin/login/', timeout=2).close()
+                return self
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.2)
+        self.__exit__()
+        raise RuntimeError(f"Le serveur ne répond pas après {self.startup_timeout}s.")
+
+    def __exit__(self, *exc_info):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+def serve(port):
+    """Serveur WSGI multi-thread de Django, silencieux (repli sans gunicorn)"""
+    import django
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    django.setup()
+    httpd = ThreadedWSGIServer(('127.0.0.1', port), QuietHandler)
+    httpd.daemon_threads = True
+    httpd.set_app(WSGIHandler())
+    httpd.serve_forever()
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'loadtest.settings')
+    serve(int(sys.argv[1]))
@@ -0,0 +1,26 @@
+"""Réglages du banc : ceux du projet, base SQLite dédiée sauf LOADTEST_PROJECT_DB=1"""
+import os
+
+from config.settings import *  # noqa: F401,F403
+from config.settings import DATABASES
+
+DEBUG = False
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+
+if not os.environ.get('LOADTEST_PROJECT_DB'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('LOADTEST_DB', 'loadtest.sqlite3'),
+            # Écrivains concurrents (actions d'admin) : attente du verrou plutôt qu'une erreur immédiate
+            'OPTIONS': {'timeout': 30, 'transaction_mode': 'IMMEDIATE', 'init_command': 'PRAGMA journal_mode=WAL;'},
+        }
+    }
+
+# Erreurs serveur dans le journal du serveur (DEBUG est coupé)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {'django.request': {'handlers': ['console'], 'level': 'ERROR'}},
+}
@@ -0,0 +1,46 @@
+import random
+
+from django.test import LiveServerTestCase, SimpleTestCase
+
+from loadtest import runner, scenarios
+from loadtest.__main__ import login
+from loadtest.seed import seed
+from sales.models import Order
+
+
+class PercentileTests(SimpleTestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual([runner.percentile(values, pct) for pct in (50, 95, 99)], [51, 95, 99])
+        self.assertEqual(runner.percentile([], 95), 0.0)
+
+
+class ScenarioTests(LiveServerTestCase):
+    """Chaque scénario joué contre le serveur de test, sur un petit jeu de données"""
+
+    def setUp(self):
+        seed(customers=10, products=8, orders=80, rng=random.Random(1), log=lambda message: None)
+        self.ctx = scenarios.Context()
+        self.sessionid = login()
+
+    def test_scenarios_run_without_errors(self):
+        drafts = set(self.ctx.drafts)
+        self.assertGreater(len(drafts), 5)  # mark_paid : deux lots de 5 brouillons au plus
+        for name, scenario in scenarios.SCENARIOS.items():
+            with self.subTest(name):
+                stats = runner.run(scenario, self.ctx, self.live_server_url, self.sessionid, concurrency=1, requests=2)
+                self.assertEqual((stats['requests'], stats['errors']), (2, 0))
+                self.assertGreater(stats['p50'], 0)
+        taken = drafts - set(self.ctx.drafts)  # brouillons consommés par mark_paid
+        self.assertTrue(taken)
+        self.assertEqual(Order.objects.filter(pk__in=taken, status='PAID').count(), len(taken))
+
+    def test_exhausted_drafts_stop_mark_paid(self):
+        self.ctx.drafts = self.ctx.drafts[:3]
+        stats = runner.run(scenarios.mark_paid, self.ctx, self.live_server_url, self.sessionid,
+                           concurrency=2, requests=10)
+        self.assertEqual((stats['requests'], stats['errors']), (1, 0))
+
+    def test_anonymous_requests_are_errors(self):
+        stats = runner.run(scenarios.changelist, self.ctx, self.live_server_url, None, concurrency=2, requests=4)
+        self.assertEqual(stats['errors'], 4)
@@ -0,0 +1,88 @@
+"""
+Comparaison de charge WSGI / ASGI sur le téléchargement des factures PDF.
+
+Lancer le projet avec l'un ou l'autre serveur, puis ce script contre lui :
+
+    gunicorn config.wsgi -w 2 --threads 4 -b 127.0.0.1:8000
+    uvicorn config.asgi:application --workers 2 --port 8001
+
+    python loadtest_invoices.py http://127.0.0.1:8000 --orders 1-50 -c 32 -n 500
+    python loadtest_invoices.py http://127.0.0.1:8001 --orders 1-50 -c 32 -n 500
+
+Aucune dépendance hors bibliothèque standard. Pour un banc complet (serveur,
+données et scénarios d'admin), voir ``python -m loadtest``.
+"""
+import argparse
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def parse_ids(spec):
+    start, _, end = spec.partition('-')
+    return list(range(int(start), int(end or start) + 1))
+
+
+def fetch(url, cookie):
+    request = urllib.request.Request(url, headers={'Cookie': f'sessionid={cookie}'} if cookie else {})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+            ok = response.status == 200
+    except Exception:
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run(base_url, path, ids, concurrency, total, cookie):
+    def task(i):
+        order_id = ids[i % len(ids)]
+        return fetch(base_url.rstrip('/') + path.format(order_id=order_id), cookie)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(task, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [duration for duration, ok in results if ok]
+    errors = sum(1 for _, ok in results if not ok)
+    return {
+        'requests': total,
+        'errors': errors,
+        'throughput': total / elapsed if elapsed else 0.0,
+        'mean': statistics.mean(latencies) if latencies else 0.0,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base_url')
+    parser.add_argument('--path', default='/sales/order/{order_id}/pdf/')
+    parser.add_argument('--orders', default='1-10', help="Plage d'IDs de commandes, ex: 1-50")
+    parser.add_argument('-c', '--concurrency', type=int, default=16)
+    parser.add_argument('-n', '--requests', type=int, default=200)
+    parser.add_argument('--sessionid', help="Cookie de session staff (endpoints de reporting)")
+    args = parser.parse_args()
+
+    stats = run(args.base_url, args.path, parse_ids(args.orders), args.concurrency, args.requests, args.sessionid)
+    print(
+        f"{stats['requests']} requêtes, {stats['errors']} erreurs, {stats['throughput']:.1f} req/s | "
+        f"moy {stats['mean'] * 1000:.0f} ms, p50 {stats['p50'] * 1000:.0f} ms, "
+        f"p95 {stats['p95'] * 1000:.0f} ms, p99 {stats['p99'] * 1000:.0f} ms"
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+from django.contrib import admin
+from .models import OutboxEvent
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'topic', 'created_at', 'available_at', 'processed_at', 'attempts')
+    list_filter = ('topic',)
+    readonly_fields = ('created_at',)
\ No newline at end of file
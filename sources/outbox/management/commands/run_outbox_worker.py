@@ -0,0 +1,43 @@
+import time
+from django.core.management.base import BaseCommand
+from outbox.worker import lag_metrics, process_batch
+
+class Command(BaseCommand):
+    help = "Traite les événements de l'outbox par lots (SELECT ... FOR UPDATE SKIP LOCKED)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--sleep', type=float, default=1.0, help="Pause (s) quand la file est vide")
+        parser.add_argument('--topic', action='append', dest='topics', help="Limiter à un sujet (répétable)")
+        parser.add_argument('--once', action='store_true', help="Vider la file puis s'arrêter")
+        parser.add_argument('--stats', action='store_true', help="Afficher les métriques de retard et quitter")
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            metrics = lag_metrics()
+            self.stdout.write(
+                f"En attente : {metrics['pending']} | Abandonnés : {metrics['dead']} | "
+                f"Retard max : {metrics['oldest_pending_seconds']:.1f}s"
+            )
+            return
+
+        self.stdout.write("Worker outbox démarré...")
+        try:
+            while True:
+                started = time.perf_counter()
+                stats = process_batch(options['batch_size'], options['topics'])
+                if not stats['claimed']:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"Lot : {stats['processed']} traités, {stats['failed']} en échec "
+                    f"({stats['claimed'] / elapsed:.0f} évt/s, retard {stats['lag']:.1f}s)"
+                )
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS("Worker outbox arrêté."))
@@ -0,0 +1,28 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class OutboxEvent(models.Model):
+    """Événement métier écrit dans la même transaction que la modification qui l'a produit."""
+    topic = models.CharField("Sujet", max_length=100, db_index=True)
+    payload = models.JSONField(default=dict)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField("Disponible à partir de", default=timezone.now)
+    processed_at = models.DateTimeField("Traité le", null=True, blank=True)
+
+    # Reprises
+    attempts = models.PositiveIntegerField("Tentatives", default=0)
+    last_error = models.TextField("Dernière erreur", blank=True)
+
+    class Meta:
+        verbose_name = "Événement (outbox)"
+        verbose_name_plural = "Événements (outbox)"
+        indexes = [
+            # Seuls les événements en attente sont parcourus par le worker
+            models.Index(fields=['available_at', 'id'], condition=Q(processed_at__isnull=True), name='outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} #{self.pk}"
@@ -0,0 +1,39 @@
+"""
+Publication des événements et registre des handlers.
+
+Un handler reçoit un lot complet d'OutboxEvent du même sujet et doit le
+traiter de façon ensembliste ; s'il lève une exception, le lot est rejoué par
+moitiés et seuls les événements fautifs sont replanifiés avec backoff (cf.
+outbox.worker).
+"""
+from .models import OutboxEvent
+
+_handlers = {}
+
+
+def publish(topic, payload):
+    """À appeler dans la transaction de la modification métier"""
+    return OutboxEvent.objects.create(topic=topic, payload=payload)
+
+
+def handler(topic):
+    """Décorateur : @handler('order.shipped') def f(events): ..."""
+    def register(func):
+        _handlers[topic] = func
+        return func
+    return register
+
+
+def get_handler(topic):
+    return _handlers.get(topic)
+
+
+def topics():
+    return list(_handlers)
+
+
+def publish_many(topic, payloads):
+    """Publication ensembliste (un seul INSERT par lot)"""
+    return OutboxEvent.objects.bulk_create(
+        [OutboxEvent(topic=topic, payload=payload) for payload in payloads], batch_size=1000
+    )
@@ -0,0 +1,89 @@
+from django.test import TestCase
+
+from inventory import ledger
+from inventory.models import StockMovement
+from outbox import registry
+from outbox.models import OutboxEvent
+from outbox.registry import handler
+from outbox.worker import process_batch
+from sales.tests import make_catalog, make_customer, make_order
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.products = make_catalog()
+        self.customer, self.billing, self.shipping = make_customer()
+
+    def test_shipping_publishes_once_and_worker_decrements_stock(self):
+        p1, p2, _ = self.products
+        orders = [make_order(self.customer, self.billing, self.shipping, [(p1, 2), (p2, 1)], status='PAID') for _ in range(3)]
+        for order in orders:
+            order.status = 'SHIPPED'
+            order.save()
+        orders[0].tracking_number = "XY123"
+        orders[0].save()  # déjà expédiée : pas de nouvel événement
+
+        self.assertEqual(OutboxEvent.objects.filter(topic='order.shipped').count(), 3)
+        p1.refresh_from_db()
+        self.assertEqual(p1.stock_quantity, 50)  # rien tant que le worker n'est pas passé
+
+        stats = process_batch()  # 3 paiements (order.paid) + 3 expéditions
+        self.assertEqual((stats['claimed'], stats['processed'], stats['failed']), (6, 6, 0))
+        p1.refresh_from_db(); p2.refresh_from_db()
+        self.assertEqual((p1.stock_quantity, p2.stock_quantity), (44, 47))
+        self.assertEqual(process_batch()['claimed'], 0)
+
+        # Chaque expédition est journalisée : journal et compteurs concordent
+        self.assertEqual(StockMovement.objects.filter(reason=StockMovement.SALE).count(), 6)
+        self.assertFalse(ledger.drift().exists())
+
+    def test_oversold_product_does_not_fail_the_batch(self):
+        p1, p2, _ = self.products
+        p1.stock_quantity = 5
+        p1.save()
+        orders = [
+            make_order(self.customer, self.billing, self.shipping, lines, status='PAID')
+            for lines in ([(p1, 4)], [(p1, 4)], [(p2, 1)])
+        ]
+        OutboxEvent.objects.all().delete()
+        # Expéditions publiées sans contrôle de stock (import, écriture directe)
+        registry.publish_many('order.shipped', [{'order_id': order.pk} for order in orders])
+
+        with self.assertLogs('sales.handlers', 'WARNING'):
+            stats = process_batch()
+        self.assertEqual((stats['processed'], stats['failed']), (3, 0))
+        p1.refresh_from_db(); p2.refresh_from_db()
+        self.assertEqual((p1.stock_quantity, p2.stock_quantity), (0, 49))
+        adjustment = StockMovement.objects.get(reason=StockMovement.ADJUSTMENT, product=p1, reference='SURVENTE')
+        self.assertEqual(adjustment.quantity, 3)
+        self.assertFalse(ledger.drift().exists())
+
+    def test_failing_event_is_isolated_from_its_batch(self):
+        @handler('test.picky')
+        def picky(events):
+            if any(event.payload['fail'] for event in events):
+                raise RuntimeError("refusé")
+        self.addCleanup(registry._handlers.pop, 'test.picky', None)
+
+        events = registry.publish_many('test.picky', [{'fail': index == 3} for index in range(8)])
+        stats = process_batch(topics=['test.picky'])
+        self.assertEqual((stats['processed'], stats['failed']), (7, 1))
+        failed = OutboxEvent.objects.get(processed_at__isnull=True, topic='test.picky')
+        self.assertEqual(failed.pk, events[3].pk)
+        self.assertIn("refusé", failed.last_error)
+
+    def test_failing_handler_is_rescheduled_with_backoff(self):
+        @handler('test.boom')
+        def boom(events):
+            raise RuntimeError("boom")
+        self.addCleanup(registry._handlers.pop, 'test.boom', None)
+
+        event = OutboxEvent.objects.create(topic='test.boom', payload={})
+        stats = process_batch()
+        self.assertEqual(stats['failed'], 1)
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 1)
+        self.assertIsNone(event.processed_at)
+        self.assertGreater(event.available_at, event.created_at)
+        self.assertIn("boom", event.last_error)
+        self.assertEqual(process_batch()['claimed'], 0)
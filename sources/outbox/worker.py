@@ -0,0 +1,112 @@
+"""
+Traitement par lots des événements de l'outbox.
+
+Chaque lot est réclamé avec SELECT ... FOR UPDATE SKIP LOCKED : plusieurs
+workers peuvent tourner en parallèle sans se marcher dessus. Les handlers
+s'exécutent dans un savepoint par sujet ; si un lot échoue, il est rejoué par
+moitiés (chacune dans son savepoint) jusqu'à isoler les événements fautifs,
+seuls replanifiés avec un backoff exponentiel : un événement défaillant ne
+bloque pas le reste de son sujet.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEvent
+from .registry import get_handler
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def pending(now=None):
+    now = now or timezone.now()
+    return OutboxEvent.objects.filter(
+        processed_at__isnull=True,
+        available_at__lte=now,
+        attempts__lt=_setting('OUTBOX_MAX_ATTEMPTS', 10),
+    )
+
+
+def backoff(attempts):
+    """Délai avant nouvelle tentative : base * 2^(n-1), plafonné"""
+    base = _setting('OUTBOX_BACKOFF_SECONDS', 5)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), _setting('OUTBOX_BACKOFF_MAX_SECONDS', 3600)))
+
+
+def process_batch(batch_size=500, topics=None):
+    """Réclame et traite un lot. Retourne un dict de métriques."""
+    now = timezone.now()
+    stats = {'claimed': 0, 'processed': 0, 'failed': 0, 'lag': None}
+
+    with transaction.atomic():
+        queryset = pending(now)
+        if topics:
+            queryset = queryset.filter(topic__in=topics)
+        events = list(queryset.select_for_update(skip_locked=True).order_by('available_at', 'id')[:batch_size])
+        if not events:
+            return stats
+
+        stats['claimed'] = len(events)
+        stats['lag'] = (now - min(event.created_at for event in events)).total_seconds()
+
+        by_topic = defaultdict(list)
+        for event in events:
+            by_topic[event.topic].append(event)
+
+        done, failed = [], []
+        for topic, topic_events in by_topic.items():
+            func = get_handler(topic)
+            if func is None:
+                topic_done, topic_failed = [], [(event, LookupError(f"Aucun handler pour le sujet '{topic}'"))
+                                                for event in topic_events]
+            else:
+                topic_done, topic_failed = _handle(func, topic_events)
+            for event in topic_done:
+                event.processed_at = now
+            for event, exc in topic_failed:
+                event.attempts += 1
+                event.available_at = now + backoff(event.attempts)
+                event.last_error = f"{type(exc).__name__}: {exc}"
+            done.extend(topic_done)
+            failed.extend(event for event, _ in topic_failed)
+
+        OutboxEvent.objects.bulk_update(done, ['processed_at'])
+        OutboxEvent.objects.bulk_update(failed, ['attempts', 'available_at', 'last_error'])
+
+    stats['processed'] = len(done)
+    stats['failed'] = len(failed)
+    return stats
+
+
+def _handle(func, events):
+    """Exécute le handler ; un lot en échec est rejoué par moitiés. Retourne (traités, [(événement, erreur)])."""
+    try:
+        with transaction.atomic():
+            func(events)
+    except Exception as exc:
+        if len(events) == 1:
+            return [], [(events[0], exc)]
+    else:
+        return events, []
+    middle = len(events) // 2
+    first_done, first_failed = _handle(func, events[:middle])
+    last_done, last_failed = _handle(func, events[middle:])
+    return first_done + last_done, first_failed + last_failed
+
+
+def lag_metrics():
+    """Profondeur de file, âge du plus ancien événement en attente, événements abandonnés"""
+    now = timezone.now()
+    waiting = OutboxEvent.objects.filter(processed_at__isnull=True)
+    max_attempts = _setting('OUTBOX_MAX_ATTEMPTS', 10)
+    oldest = waiting.filter(attempts__lt=max_attempts).order_by('created_at').values_list('created_at', flat=True).first()
+    return {
+        'pending': waiting.filter(attempts__lt=max_attempts).count(),
+        'dead': waiting.filter(attempts__gte=max_attempts).count(),
+        'oldest_pending_seconds': (now - oldest).total_seconds() if oldest else 0.0,
+    }
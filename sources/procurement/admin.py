@@ -1,23 +1,58 @@
 from django.contrib import admin
-from .models import Supplier, SupplierPrice, SupplierOffer
+from config.autocomplete import PreloadedAutocompleteInlineMixin
+from config.db_router import ReplicaSearchMixin
+from config.exports import Export, ExportMixin
+from .models import Supplier, SupplierPrice, SupplierOffer, SupplierPriceHistory
 
 # On définit comment afficher les prix d'achat à l'intérieur d'un autre modèle
 # Note : on utilise maintenant SupplierPrice
-class SupplierPriceInline(admin.TabularInline):
+class SupplierPriceInline(PreloadedAutocompleteInlineMixin, admin.TabularInline):
     model = SupplierPrice
     extra = 1  
     fields = ('supplier', 'price', 'lead_time_days', 'is_preferred')
+    autocomplete_fields = ('supplier',)
 
 @admin.register(Supplier)
-class SupplierAdmin(admin.ModelAdmin):
+class SupplierAdmin(ReplicaSearchMixin, admin.ModelAdmin):
     list_display = ('name', 'email')
     search_fields = ('name',)
+    ordering = ('name',)
 
 @admin.register(SupplierPrice)
-class SupplierPriceAdmin(admin.ModelAdmin):
+class SupplierPriceAdmin(ExportMixin, ReplicaSearchMixin, admin.ModelAdmin):
     list_display = ('product', 'supplier', 'price', 'is_preferred')
-    list_filter = ('supplier', 'product')
+    # Pas de filtre par produit : la liste latérale contiendrait tout le catalogue
+    list_filter = ('supplier',)
+    search_fields = ('product__name', 'product__sku', 'supplier__name')
+    list_select_related = ('product', 'supplier')
+    autocomplete_fields = ('product', 'supplier')
+    export_plan = Export([
+        ("ID", 'id'),
+        ("Fournisseur", 'supplier__name'),
+        ("Produit ID", 'product_id'),
+        ("SKU", 'product__sku'),
+        ("Produit", 'product__name'),
+        ("Prix d'achat HT", 'price'),
+        ("Devise", 'supplier__currency'),
+        ("Délai (jours)", 'lead_time_days'),
+        ("Principal", 'is_preferred'),
+        ("Mis à jour", 'updated_at'),
+    ], filename='prix_fournisseurs')
 
 @admin.register(SupplierOffer)
 class SupplierOfferAdmin(admin.ModelAdmin):
-    list_display = ('supplier', 'description', 'valid_until')
\ No newline at end of file
+    list_display = ('supplier', 'description', 'valid_until')
+
+@admin.register(SupplierPriceHistory)
+class SupplierPriceHistoryAdmin(admin.ModelAdmin):
+    # Append-only : consultation seule
+    list_display = ('product', 'supplier', 'price', 'is_preferred', 'valid_from')
+    list_filter = ('supplier',)
+    list_select_related = ('product', 'supplier')
+    date_hierarchy = 'valid_from'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
\ No newline at end of file
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_product_sku'),
+        ('procurement', '0002_alter_supplierprice_options_supplier_currency_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupplierPriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name="Prix d'achat HT")),
+                ('is_preferred', models.BooleanField(default=False, verbose_name='Fournisseur principal ?')),
+                ('valid_from', models.DateTimeField(default=django.utils.timezone.now, verbose_name='En vigueur depuis')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='purchase_price_history', to='inventory.product')),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='procurement.supplier')),
+            ],
+            options={
+                'verbose_name': 'Historique prix fournisseur',
+                'verbose_name_plural': 'Historique prix fournisseurs',
+                'indexes': [models.Index(fields=['product', 'supplier', 'valid_from'], name='supplier_price_hist_asof_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:55
+
+from django.db import migrations
+
+
+def backfill(apps, schema_editor):
+    # Point de départ de l'historique : le prix actuel, en vigueur depuis sa dernière mise à jour
+    SupplierPrice = apps.get_model('procurement', 'SupplierPrice')
+    SupplierPriceHistory = apps.get_model('procurement', 'SupplierPriceHistory')
+    SupplierPriceHistory.objects.bulk_create(
+        (
+            SupplierPriceHistory(
+                product_id=price.product_id, supplier_id=price.supplier_id, price=price.price,
+                is_preferred=price.is_preferred, valid_from=price.updated_at,
+            )
+            for price in SupplierPrice.objects.iterator(chunk_size=2000)
+        ),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('procurement', '0003_supplier_price_history'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:40
+
+from django.db import migrations
+
+from config.search_indexes import TrigramSearchIndexes
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('procurement', '0004_backfill_supplier_price_history'),
+    ]
+
+    operations = [
+        TrigramSearchIndexes('Supplier', ['name']),
+    ]
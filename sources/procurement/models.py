@@ -1,4 +1,7 @@
-from django.db import models
+from datetime import date, datetime, time, timedelta
+from django.db import connections, models, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
 from inventory.models import Product
 
 class Supplier(models.Model):
@@ -40,9 +43,107 @@ class SupplierPrice(models.Model):
         verbose_name_plural = "Prix Fournisseurs"
         unique_together = ('product', 'supplier')
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # On garde les valeurs lues en base pour n'historiser que les vrais changements
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = (instance.__dict__.get('price'), instance.__dict__.get('is_preferred'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, '_loaded_values', None)
+        changed = self._state.adding or loaded != (self.price, self.is_preferred)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if changed:
+                SupplierPriceHistory.objects.create(
+                    product_id=self.product_id,
+                    supplier_id=self.supplier_id,
+                    price=self.price,
+                    is_preferred=self.is_preferred,
+                    valid_from=self.updated_at,
+                )
+        self._loaded_values = (self.price, self.is_preferred)
+
     def __str__(self):
         return f"{self.supplier.name} : {self.price}{self.supplier.currency} (Délai: {self.lead_time_days}j)"
 
+def as_of_bound(when):
+    """Une date inclut toute la journée : on retourne la borne exclusive (lendemain 00:00)"""
+    if isinstance(when, datetime):
+        return when + timedelta(microseconds=1)
+    if isinstance(when, date):
+        return timezone.make_aware(datetime.combine(when + timedelta(days=1), time.min))
+    return when
+
+class SupplierPriceHistoryQuerySet(models.QuerySet):
+    def as_of(self, when):
+        """Prix en vigueur à une date, une ligne par couple (produit, fournisseur), en une requête"""
+        bound = as_of_bound(when)
+        rows = self.filter(valid_from__lt=bound)
+        if connections[self.db].vendor == 'postgresql':
+            # DISTINCT ON (product, supplier) ... ORDER BY valid_from DESC : parcours de l'index
+            return rows.order_by('product_id', 'supplier_id', '-valid_from', '-id').distinct('product_id', 'supplier_id')
+        latest = (
+            SupplierPriceHistory.objects
+            .filter(product=OuterRef('product'), supplier=OuterRef('supplier'), valid_from__lt=bound)
+            .order_by('-valid_from', '-id')
+            .values('id')[:1]
+        )
+        return rows.filter(id=Subquery(latest))
+
+def price_as_of(product_ref, bound, inclusive=False):
+    """
+    Sous-requête : prix d'achat HT en vigueur pour le produit ``product_ref``
+    (référence externe) avant ``bound`` (valeur ou OuterRef, incluse si
+    ``inclusive``). On prend d'abord le dernier prix de chaque fournisseur à
+    cette date, puis celui du fournisseur alors principal, à défaut le plus
+    récent : un fournisseur qui n'est plus principal ne l'emporte pas avec un
+    ancien prix.
+    """
+    lookup = 'valid_from__lte' if inclusive else 'valid_from__lt'
+    latest = (
+        SupplierPriceHistory.objects
+        .filter(product=OuterRef('product'), supplier=OuterRef('supplier'),
+                **{lookup: OuterRef(bound) if isinstance(bound, OuterRef) else bound})
+        .order_by('-valid_from', '-id')
+        .values('id')[:1]
+    )
+    return Subquery(
+        SupplierPriceHistory.objects
+        .filter(product=OuterRef(product_ref), id=Subquery(latest), **{lookup: bound})
+        .order_by('-is_preferred', '-valid_from', '-id')
+        .values('price')[:1]
+    )
+
+def cost_as_of(product_ref, date_ref):
+    """
+    Sous-requête : coût d'achat HT en vigueur pour un produit à une date
+    (fournisseur principal, à défaut le dernier prix connu). Les deux
+    arguments sont des références externes, ex: cost_as_of('product', 'order__created_at').
+    """
+    return price_as_of(product_ref, OuterRef(date_ref), inclusive=True)
+
+class SupplierPriceHistory(models.Model):
+    """Historique append-only des prix d'achat (une ligne par changement)"""
+    product = models.ForeignKey('inventory.Product', on_delete=models.CASCADE, related_name='purchase_price_history')
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='price_history')
+    price = models.DecimalField("Prix d'achat HT", max_digits=10, decimal_places=2)
+    is_preferred = models.BooleanField("Fournisseur principal ?", default=False)
+    valid_from = models.DateTimeField("En vigueur depuis", default=timezone.now)
+
+    objects = SupplierPriceHistoryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Historique prix fournisseur"
+        verbose_name_plural = "Historique prix fournisseurs"
+        indexes = [
+            models.Index(fields=['product', 'supplier', 'valid_from'], name='supplier_price_hist_asof_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}/{self.supplier_id} : {self.price} depuis {self.valid_from:%Y-%m-%d}"
+
 class SupplierOffer(models.Model):
     """Remises spéciales accordées par le fournisseur"""
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='offers')
@@ -1,3 +1,83 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.db.models import DateTimeField, Value
 from django.test import TestCase
+from django.utils import timezone
+
+from company.models import TaxRate
+from inventory.models import Category, Product
+from procurement.models import (
+    Supplier, SupplierPrice, SupplierPriceHistory, as_of_bound, cost_as_of, price_as_of,
+)
+
+
+class SupplierPriceHistoryTests(TestCase):
+    def setUp(self):
+        tva20 = TaxRate.objects.create(name="TVA 20%", rate=Decimal("20.00"))
+        category = Category.objects.create(name="Lenses", slug="lenses")
+        self.products = [
+            Product.objects.create(name=f"Objectif {i}", category=category, tax_rate=tva20, retail_price=Decimal("100.00"))
+            for i in range(3)
+        ]
+        self.supplier = Supplier.objects.create(name="Global Supplier", email="sales@global.com")
+
+    def set_price(self, product, price, when, supplier=None, is_preferred=False):
+        supplier_price, _ = SupplierPrice.objects.get_or_create(
+            product=product, supplier=supplier or self.supplier, defaults={'price': price}
+        )
+        supplier_price.price = price
+        supplier_price.is_preferred = is_preferred
+        supplier_price.save()
+        # On antidate la ligne d'historique qui vient d'être écrite
+        SupplierPriceHistory.objects.filter(pk=SupplierPriceHistory.objects.latest('id').pk).update(valid_from=when)
+
+    def test_history_only_on_change(self):
+        supplier_price = SupplierPrice.objects.create(product=self.products[0], supplier=self.supplier, price=Decimal("10.00"))
+        supplier_price.lead_time_days = 3
+        supplier_price.save()
+        supplier_price = SupplierPrice.objects.get(pk=supplier_price.pk)
+        supplier_price.save()
+        supplier_price.price = Decimal("11.00")
+        supplier_price.save()
+        self.assertEqual(
+            list(SupplierPriceHistory.objects.order_by('id').values_list('price', flat=True)),
+            [Decimal("10.00"), Decimal("11.00")],
+        )
+
+    def test_as_of_returns_price_in_effect(self):
+        tz = timezone.get_current_timezone()
+        jan, mar, jun = (timezone.make_aware(datetime(2025, month, 1, 12), tz) for month in (1, 3, 6))
+        for product in self.products:
+            self.set_price(product, Decimal("10.00"), jan)
+            self.set_price(product, Decimal("12.00"), mar)
+        self.set_price(self.products[0], Decimal("15.00"), jun)
+
+        def prices(when):
+            return dict(SupplierPriceHistory.objects.as_of(when).values_list('product_id', 'price'))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(set(prices(date(2025, 2, 1)).values()), {Decimal("10.00")})
+        self.assertEqual(set(prices(date(2025, 3, 1)).values()), {Decimal("12.00")})  # journée incluse
+        self.assertEqual(prices(jun)[self.products[0].pk], Decimal("15.00"))
+        self.assertEqual(prices(jun - timedelta(seconds=1))[self.products[0].pk], Decimal("12.00"))
+        self.assertEqual(prices(date(2024, 12, 31)), {})
+
+    def test_cost_follows_current_preferred_supplier(self):
+        tz = timezone.get_current_timezone()
+        jan, apr, may = (timezone.make_aware(datetime(2025, month, 1, 12), tz) for month in (1, 4, 5))
+        other = Supplier.objects.create(name="Local Supplier", email="sales@local.com")
+        product = self.products[0]
+        self.set_price(product, Decimal("10.00"), jan, is_preferred=True)
+        self.set_price(product, Decimal("10.00"), apr, is_preferred=False)  # n'est plus principal
+        self.set_price(product, Decimal("20.00"), may, supplier=other)
+
+        def costs(when):
+            rows = Product.objects.filter(pk=product.pk).annotate(when=Value(when, DateTimeField()))
+            return rows.annotate(
+                cost=cost_as_of('pk', 'when'), cost_before=price_as_of('pk', as_of_bound(when)),
+            ).values_list('cost', 'cost_before').get()
 
-# Create your tests here.
+        self.assertEqual(costs(jan + timedelta(days=60)), (Decimal("10.00"), Decimal("10.00")))
+        # Plus aucun fournisseur principal : le dernier prix connu, pas l'ancien prix principal
+        self.assertEqual(costs(may + timedelta(days=30)), (Decimal("20.00"), Decimal("20.00")))
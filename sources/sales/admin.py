@@ -1,23 +1,55 @@
-from django.contrib import admin
+import uuid
+from datetime import timedelta
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
+from config.autocomplete import PreloadedAutocompleteInlineMixin
+from config.db_router import ReplicaSearchMixin, read_alias
+from config.exports import ExportMixin
+from config.profiling import profiled
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import Customer, Address, Carrier, Order, OrderLine, Promotion
+from .models import (
+    Customer, Address, Carrier, Order, OrderLine, Promotion, CreditNote, ProductAffinity,
+    ArchivedOrder, ArchivedOrderLine,
+)
+from .exports import CUSTOMER_EXPORT, ORDER_EXPORT, ORDER_LINE_EXPORT
+from .simulation import LineHistory, simulate
+from .transitions import transition_many
 
 class AddressInline(admin.TabularInline):
     model = Address
     extra = 1
 
-class OrderLineInline(admin.TabularInline):
+class OrderLineInline(PreloadedAutocompleteInlineMixin, admin.TabularInline):
     model = OrderLine
     extra = 1
+    autocomplete_fields = ('product',)
 
 @admin.register(Customer)
-class CustomerAdmin(admin.ModelAdmin):
-    list_display = ('last_name', 'first_name', 'email')
+class CustomerAdmin(ExportMixin, ReplicaSearchMixin, admin.ModelAdmin):
+    list_display = ('last_name', 'first_name', 'email', 'rfm_segment', 'paid_orders', 'lifetime_value', 'last_order_at')
+    list_filter = ('rfm_segment', 'is_professional')
+    search_fields = ('last_name', 'first_name', 'email', 'company_name')
+    ordering = ('last_name', 'first_name')
+    readonly_fields = ('rfm_segment', 'rfm_score', 'paid_orders', 'lifetime_value', 'average_order_value', 'last_order_at')
+    export_plan = CUSTOMER_EXPORT
     inlines = [AddressInline]
 
+@admin.register(Address)
+class AddressAdmin(ReplicaSearchMixin, admin.ModelAdmin):
+    # Source de l'autocomplete des adresses de commande, absente du menu
+    list_display = ('label', 'customer', 'address_type', 'city')
+    search_fields = ('customer__last_name', 'customer__email', 'label', 'street_address', 'city', 'postal_code')
+    list_select_related = ('customer',)
+    autocomplete_fields = ('customer',)
+    ordering = ('pk',)
+
+    def get_model_perms(self, request):
+        return {}
+
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(ExportMixin, admin.ModelAdmin):
     list_display = (
         'id', 
         'reference', 
@@ -29,6 +61,9 @@ class OrderAdmin(admin.ModelAdmin):
         'view_invoice_link'
     )
     readonly_fields = ('reference',)
+    autocomplete_fields = ('customer', 'billing_address', 'shipping_address')
+    list_select_related = ('customer', 'carrier')
+    inlines = [OrderLineInline]
     
     fieldsets = (
         ('General Info', {'fields': ('reference', 'customer', 'status')}),
@@ -38,7 +73,11 @@ class OrderAdmin(admin.ModelAdmin):
         ('Addresses', {'fields': ('billing_address', 'shipping_address')}),
     )
 
-    actions = ['generate_credit_notes']
+    actions = [
+        'generate_credit_notes', 'mark_as_paid', 'mark_as_shipped', 'mark_as_delivered',
+        'export_lines_csv', 'export_lines_xlsx',
+    ]
+    export_plan = ORDER_EXPORT
 
     def get_total(self, obj):
         # Méthode pour afficher le total (Produits + Livraison) dans la liste
@@ -47,6 +86,7 @@ class OrderAdmin(admin.ModelAdmin):
     get_total.short_description = 'Total Order'
 
     @admin.action(description="Generate a credit note for the selected orders")
+    @profiled()
     def generate_credit_notes(self, request, queryset):
         created_count = 0
         
@@ -78,22 +118,98 @@ class OrderAdmin(admin.ModelAdmin):
             messages.SUCCESS
         )
 
+    def _transition(self, request, queryset, to_status):
+        # Passage en masse : validation ensembliste, un seul UPDATE, effets de bord via l'outbox
+        try:
+            result = transition_many(queryset, to_status, strict=False)
+        except ValidationError as e:
+            self.message_user(request, ' '.join(e.messages), messages.ERROR)
+            return
+        self.message_user(request, f"{result['updated']} order(s) moved to {to_status}.", messages.SUCCESS)
+        if result['rejected']:
+            self.message_user(
+                request,
+                f"{len(result['rejected'])} order(s) ignored (illegal transition or invalid address): "
+                f"{', '.join(result['rejected'][:20])}",
+                messages.WARNING,
+            )
+
+    @admin.action(description="Mark as paid")
+    @profiled()
+    def mark_as_paid(self, request, queryset):
+        self._transition(request, queryset, 'PAID')
+
+    @admin.action(description="Mark as shipped")
+    @profiled()
+    def mark_as_shipped(self, request, queryset):
+        self._transition(request, queryset, 'SHIPPED')
+
+    @admin.action(description="Mark as delivered")
+    @profiled()
+    def mark_as_delivered(self, request, queryset):
+        self._transition(request, queryset, 'DELIVERED')
+
+    @admin.action(description="Export lines CSV (selection)")
+    def export_lines_csv(self, request, queryset):
+        return ORDER_LINE_EXPORT.csv_response(OrderLine.objects.filter(order__in=queryset.values('pk')))
+
+    @admin.action(description="Export lines XLSX (selection)")
+    def export_lines_xlsx(self, request, queryset):
+        return ORDER_LINE_EXPORT.xlsx_response(OrderLine.objects.filter(order__in=queryset.values('pk')))
+
     def view_invoice_link(self, obj):
         url = reverse('generate_invoice_pdf', args=[obj.id])
         return format_html('<a class="button" href="{}" target="_blank">📄 PDF</a>', url)
     
     view_invoice_link.short_description = "Facture"
 
+class ArchivedOrderLineInline(admin.TabularInline):
+    model = ArchivedOrderLine
+    fields = ('product', 'quantity', 'unit_price_incl_tax', 'vat_rate')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(ReplicaSearchMixin, admin.ModelAdmin):
+    # Alimentée par sales.archive (commande archive_orders) : consultation seule
+    list_display = ('id', 'reference', 'customer', 'status', 'created_at', 'archived_at', 'view_invoice_link')
+    list_filter = ('status',)
+    list_select_related = ('customer',)
+    search_fields = ('reference', 'customer__last_name', 'customer__email')
+    date_hierarchy = 'created_at'
+    ordering = ('-created_at',)
+    inlines = [ArchivedOrderLineInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def view_invoice_link(self, obj):
+        url = reverse('generate_invoice_pdf', args=[obj.id])
+        return format_html('<a class="button" href="{}" target="_blank">📄 PDF</a>', url)
+
+    view_invoice_link.short_description = "Facture"
+
 admin.site.register(Carrier)
 
 @admin.register(Promotion)
-class PromotionAdmin(admin.ModelAdmin):
-    list_display = ('name', 'promo_type', 'active', 'start_date', 'end_date')
+class PromotionAdmin(ReplicaSearchMixin, admin.ModelAdmin):
+    list_display = ('name', 'promo_type', 'active', 'start_date', 'end_date', 'uses', 'max_uses')
     list_filter = ('promo_type', 'active')
+    readonly_fields = ('uses',)
     search_fields = ('name', 'code')
     
-    # Interface pro pour gérer les listes de produits/catégories
-    filter_horizontal = (
+    # Listes de produits/catégories : autocomplete paginé (pas de <select> du catalogue entier)
+    autocomplete_fields = (
         'target_brands', 'target_categories', 'target_products',
         'excluded_categories', 'excluded_products'
     )
@@ -101,6 +217,7 @@ class PromotionAdmin(admin.ModelAdmin):
     fieldsets = (
         ('General Information', {'fields': ('name', 'promo_type', 'code', 'active')}),
         ('Value', {'fields': ('discount_type', 'value', 'start_date', 'end_date')}),
+        ('Usage limits', {'fields': ('max_uses', 'max_uses_per_customer', 'uses')}),
         ('Targeting (Inclusion)', {
             'classes': ('collapse',),
             'fields': ('target_brands', 'target_categories', 'target_products')
@@ -110,3 +227,37 @@ class PromotionAdmin(admin.ModelAdmin):
             'fields': ('excluded_categories', 'excluded_products')
         }),
     )
+    actions = ['simulate_last_year']
+
+    @admin.action(description="Simulate on the last 12 months of sales")
+    @profiled()
+    def simulate_last_year(self, request, queryset):
+        # Historique chargé une fois en colonnes, puis chaque promotion évaluée en vectoriel
+        history = LineHistory(using=read_alias())
+        for promotion in queryset:
+            result = simulate(promotion, history)
+            rate = result['margin_rate_after']
+            self.message_user(
+                request,
+                f"{promotion.name}: {result['affected_orders']}/{result['orders']} orders, "
+                f"discount {result['discount_ttc']} € TTC ({result['discount_ht']} € HT), "
+                f"margin {result['margin_before']} € -> {result['margin_after']} € HT"
+                + (f" ({rate:.1%})" if rate is not None else "")
+                + (f", {result['uncosted_lines']} line(s) without purchase cost" if result['uncosted_lines'] else ""),
+                messages.INFO,
+            )
+
+@admin.register(ProductAffinity)
+class ProductAffinityAdmin(admin.ModelAdmin):
+    # Calculé par sales.affinity : consultation seule
+    list_display = ('product', 'rank', 'related', 'co_orders', 'confidence', 'lift')
+    list_select_related = ('product', 'related')
+    search_fields = ('product__name', 'product__sku')
+    ordering = ('product', 'rank')
+    raw_id_fields = ('product', 'related')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
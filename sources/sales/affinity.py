@@ -0,0 +1,270 @@
+"""
+Produits fréquemment achetés ensemble.
+
+La matrice de co-occurrence produit × produit (ProductPairCount) compte, pour
+chaque paire a ≤ b, les commandes vendues (archive comprise) contenant les deux
+produits ; la diagonale compte les commandes contenant le produit. Elle est construite en
+NumPy, par morceaux de lignes triées par commande : les paires de chaque
+panier sont codées en entiers 64 bits et cumulées par np.unique, sans
+dictionnaire Python de paires.
+
+ProductAffinity garde, par produit, les TOP_K associations classées par
+confiance (part des commandes du produit contenant aussi l'autre) puis par
+lift (confiance rapportée à la fréquence de l'autre produit).
+
+Reconstruction complète : commande build_affinities. Ensuite chaque lot
+d'événements order.paid de l'outbox est ajouté à la matrice et le top-k des
+produits concernés recalculé (sales.handlers). Lecture : related_products(),
+en cache.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+
+from company.versioning import SharedVersion
+from .archive import line_source, order_source
+from .margins import DEFAULT_STATUSES
+from .models import OrderLine, ProductAffinity, ProductPairCount
+
+TOP_K = 10
+MIN_CO_ORDERS = 2
+MAX_BASKET = 50  # paniers plus grands ignorés (réassort, B2B) : ils noieraient les vraies affinités
+CHUNK_LINES = 200000
+CACHE_TIMEOUT = 3600
+VERSION_KEY = 'sales:affinity:version'
+
+
+# -------------------------------------------------------------------
+# MATRICE CREUSE
+# -------------------------------------------------------------------
+
+def basket_pairs(order_ids, product_ids):
+    """
+    Paires (a, b), a ≤ b, de chaque panier. Les lignes doivent être triées par
+    (commande, produit), sans doublon.
+    """
+    import numpy as np  # Dépendance optionnelle : pip install numpy
+
+    order_ids = np.asarray(order_ids, dtype=np.int64)
+    product_ids = np.asarray(product_ids, dtype=np.int64)
+    if not len(order_ids):
+        return product_ids, product_ids
+
+    starts = np.flatnonzero(np.r_[True, order_ids[1:] != order_ids[:-1]])
+    sizes = np.diff(np.r_[starts, len(order_ids)])
+    position = np.arange(len(order_ids)) - np.repeat(starts, sizes)
+    # Chaque ligne est associée à elle-même et aux lignes suivantes du panier
+    partners = np.where(np.repeat(sizes <= MAX_BASKET, sizes), np.repeat(sizes, sizes) - position, 0)
+    left = np.repeat(np.arange(len(order_ids)), partners)
+    right = left + np.arange(len(left)) - np.repeat(np.cumsum(partners) - partners, partners)
+    return product_ids[left], product_ids[right]
+
+
+class PairCounter:
+    """Cumul creux de paires (a, b) : clés a << 32 | b et effectifs, fusionnés par np.unique"""
+
+    def __init__(self, merge_every=5_000_000):
+        import numpy as np
+
+        self.keys = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self._pending = []
+        self._pending_size = 0
+        self.merge_every = merge_every
+
+    def add(self, a, b):
+        import numpy as np
+
+        keys, counts = np.unique((a << 32) | b, return_counts=True)
+        self._pending.append((keys, counts))
+        self._pending_size += len(keys)
+        if self._pending_size >= self.merge_every:
+            self._merge()
+
+    def _merge(self):
+        import numpy as np
+
+        if not self._pending:
+            return
+        keys = np.concatenate([self.keys, *(keys for keys, _ in self._pending)])
+        counts = np.concatenate([self.counts, *(counts for _, counts in self._pending)])
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=counts, minlength=len(self.keys)).astype(np.int64)
+        self._pending, self._pending_size = [], 0
+
+    def pairs(self):
+        """(a, b, effectif) triés par (a, b)"""
+        self._merge()
+        return self.keys >> 32, self.keys & 0xFFFFFFFF, self.counts
+
+
+def _sold_lines(order_ids=None):
+    # Reconstruction complète : paniers archivés compris ; commandes nouvellement payées : table chaude
+    source = line_source() if order_ids is None else OrderLine
+    lines = source.objects.filter(order__status__in=DEFAULT_STATUSES)
+    if order_ids is not None:
+        lines = lines.filter(order_id__in=order_ids)
+    return lines.values_list('order_id', 'product_id').distinct().order_by('order_id', 'product_id')
+
+
+def _count_pairs(lines, chunk_lines=CHUNK_LINES):
+    """Parcourt les lignes (commande, produit) par morceaux de paniers complets"""
+    counter = PairCounter()
+    orders, products = [], []
+    for order_id, product_id in lines.iterator(chunk_size=20000):
+        if len(orders) >= chunk_lines and order_id != orders[-1]:
+            counter.add(*basket_pairs(orders, products))
+            orders, products = [], []
+        orders.append(order_id)
+        products.append(product_id)
+    counter.add(*basket_pairs(orders, products))
+    return counter.pairs()
+
+
+# -------------------------------------------------------------------
+# TOP-K
+# -------------------------------------------------------------------
+
+def top_k(a, b, co_orders, supports, total_orders, sources=None, k=TOP_K, min_co_orders=MIN_CO_ORDERS):
+    """
+    Associations dirigées retenues : (produit, associé, rang, commandes
+    communes, confiance, lift). ``supports`` = (ids triés, commandes par id).
+    """
+    import numpy as np
+
+    off = a != b
+    source = np.r_[a[off], b[off]]
+    target = np.r_[b[off], a[off]]
+    co = np.r_[co_orders[off], co_orders[off]]
+    keep = co >= min_co_orders
+    if sources is not None:
+        keep &= np.isin(source, sources)
+    source, target, co = source[keep], target[keep], co[keep]
+
+    ids, counts = supports
+    source_support = counts[np.searchsorted(ids, source)].astype(np.float64)
+    target_support = counts[np.searchsorted(ids, target)].astype(np.float64)
+    confidence = co / source_support
+    lift = confidence * total_orders / target_support
+
+    order = np.lexsort((target, -lift, -confidence, source))
+    source, target, co, confidence, lift = (x[order] for x in (source, target, co, confidence, lift))
+    starts = np.flatnonzero(np.r_[True, source[1:] != source[:-1]]) if len(source) else np.empty(0, dtype=np.int64)
+    rank = np.arange(len(source)) - np.repeat(starts, np.diff(np.r_[starts, len(source)]))
+    kept = rank < k
+    return source[kept], target[kept], rank[kept], co[kept], confidence[kept], lift[kept]
+
+
+def _affinities(rows):
+    return [
+        ProductAffinity(product_id=source, related_id=target, rank=rank + 1, co_orders=co,
+                        confidence=round(confidence, 4), lift=round(lift, 3))
+        for source, target, rank, co, confidence, lift in zip(*(column.tolist() for column in rows))
+    ]
+
+
+def _supports(a, b, co_orders):
+    diagonal = a == b
+    return a[diagonal], co_orders[diagonal]
+
+
+def rebuild(batch_size=5000):
+    """Reconstruit matrice et top-k depuis toutes les commandes vendues. Retourne un dict de métriques."""
+    a, b, co_orders = _count_pairs(_sold_lines())
+    total_orders = order_source().objects.filter(status__in=DEFAULT_STATUSES).count()
+    affinities = _affinities(top_k(a, b, co_orders, _supports(a, b, co_orders), total_orders))
+
+    with transaction.atomic():
+        ProductPairCount.objects.all().delete()
+        for first in range(0, len(a), batch_size):
+            ProductPairCount.objects.bulk_create([
+                ProductPairCount(product_a_id=x, product_b_id=y, orders=n)
+                for x, y, n in zip(*(column[first:first + batch_size].tolist() for column in (a, b, co_orders)))
+            ])
+        ProductAffinity.objects.all().delete()
+        ProductAffinity.objects.bulk_create(affinities, batch_size=batch_size)
+        _version.bump()
+
+    return {'orders': total_orders, 'pairs': len(a), 'affinities': len(affinities)}
+
+
+def add_orders(order_ids):
+    """Ajoute des commandes nouvellement payées à la matrice et rafraîchit le top-k des produits concernés"""
+    import numpy as np
+
+    a, b, co_orders = _count_pairs(_sold_lines(order_ids))
+    if not len(a):
+        return 0
+
+    with transaction.atomic():
+        # Les paires sont créées puis verrouillées dans l'ordre des pk : deux
+        # workers ne perdent pas d'incrément et ne s'interbloquent pas
+        ProductPairCount.objects.bulk_create(
+            [ProductPairCount(product_a_id=x, product_b_id=y) for x, y in zip(a.tolist(), b.tolist())],
+            ignore_conflicts=True,
+        )
+        delta = dict(zip(((a << 32) | b).tolist(), co_orders.tolist()))
+        rows = [
+            row for row in ProductPairCount.objects.select_for_update()
+            .filter(product_a__in=set(a.tolist()), product_b__in=set(b.tolist())).order_by('pk')
+            if (row.product_a_id << 32 | row.product_b_id) in delta
+        ]
+        for row in rows:
+            row.orders += delta[row.product_a_id << 32 | row.product_b_id]
+        ProductPairCount.objects.bulk_update(rows, ['orders'], batch_size=1000)
+
+        products = np.unique(np.r_[a, b])
+        refresh(products.tolist())
+    return len(rows)
+
+
+def refresh(product_ids):
+    """Recalcule le top-k des produits donnés à partir de la matrice"""
+    import numpy as np
+
+    pairs = np.array(
+        ProductPairCount.objects.filter(Q(product_a__in=product_ids) | Q(product_b__in=product_ids))
+        .values_list('product_a_id', 'product_b_id', 'orders'),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    a, b, co_orders = pairs.T
+    partners = np.unique(np.r_[a, b])
+    supports = np.array(
+        ProductPairCount.objects.filter(product_a=F('product_b'), product_a__in=partners.tolist())
+        .order_by('product_a_id').values_list('product_a_id', 'orders'),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    total_orders = order_source().objects.filter(status__in=DEFAULT_STATUSES).count()
+    affinities = _affinities(top_k(a, b, co_orders, tuple(supports.T), total_orders, sources=product_ids))
+
+    with transaction.atomic():
+        ProductAffinity.objects.filter(product_id__in=product_ids).delete()
+        ProductAffinity.objects.bulk_create(affinities)
+        transaction.on_commit(lambda: cache.delete_many([_cache_key(pk) for pk in product_ids]))
+
+
+# -------------------------------------------------------------------
+# LECTURE
+# -------------------------------------------------------------------
+
+_version = SharedVersion(VERSION_KEY)
+
+
+def _cache_key(product_id):
+    return f'sales:affinity:{_version.get()}:{product_id}'
+
+
+def related_products(product_id, limit=TOP_K):
+    """Produits fréquemment achetés avec ``product_id`` (liste de dicts, du plus au moins associé)"""
+    key = _cache_key(product_id)
+    related = cache.get(key)
+    if related is None:
+        related = [
+            {'product_id': pk, 'name': name, 'sku': sku, 'co_orders': co, 'confidence': confidence, 'lift': lift}
+            for pk, name, sku, co, confidence, lift in
+            ProductAffinity.objects.filter(product_id=product_id).order_by('rank').values_list(
+                'related_id', 'related__name', 'related__sku', 'co_orders', 'confidence', 'lift',
+            )
+        ]
+        cache.set(key, related, CACHE_TIMEOUT)
+    return related[:limit]
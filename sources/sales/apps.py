@@ -7,4 +7,5 @@ class SalesConfig(AppConfig):
 
     def ready(self):
         # Cette méthode est appelée quand Django démarre
-        import sales.signals  # On importe les signaux ici
\ No newline at end of file
+        import sales.signals  # On importe les signaux ici
+        import sales.handlers  # Handlers de l'outbox
\ No newline at end of file
@@ -0,0 +1,111 @@
+"""
+Archivage des commandes closes.
+
+Les commandes livrées ou annulées depuis plus de ``ORDER_ARCHIVE_AFTER_DAYS``
+jours quittent ``Order`` / ``OrderLine`` pour ``ArchivedOrder`` /
+``ArchivedOrderLine`` (mêmes colonnes, identifiant et référence conservés),
+par lots : chaque lot est copié puis supprimé dans une seule transaction. Lancé
+régulièrement (commande ``archive_orders``), il garde les tables chaudes à une
+taille bornée par l'activité de l'année, quel que soit l'historique conservé.
+
+Lecture transparente :
+
+- les factures retrouvent une commande archivée par son identifiant ;
+- les rapports passent par ``order_source`` / ``line_source`` : les vues SQL
+  ``OrderHistory`` / ``OrderLineHistory`` (UNION ALL des deux tables) dès que
+  la période demandée remonte jusqu'à l'archive, les tables chaudes sinon.
+
+Le partitionnement natif de PostgreSQL par ``created_at`` n'est pas retenu :
+clés primaires et contraintes d'unicité (référence) devraient inclure la clé
+de partition, et les clés étrangères vers ``Order`` n'y survivraient pas.
+"""
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderLine, Order, OrderHistory, OrderLine, OrderLineHistory
+
+ARCHIVED_STATUSES = ('DELIVERED', 'CANCELLED')
+
+# Colonnes communes (status_changed_at ne sert qu'aux reprises incrémentales sur la table chaude)
+_ARCHIVED_FIELDS = {field.attname for field in ArchivedOrder._meta.concrete_fields}
+ORDER_FIELDS = [field.attname for field in Order._meta.concrete_fields if field.attname in _ARCHIVED_FIELDS]
+LINE_FIELDS = [field.attname for field in OrderLine._meta.concrete_fields]
+
+
+def default_cutoff():
+    return timezone.now() - timedelta(days=getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 365))
+
+
+def archivable(before=None):
+    """Commandes closes créées avant ``before`` (par défaut : il y a ORDER_ARCHIVE_AFTER_DAYS jours)"""
+    return Order.objects.filter(status__in=ARCHIVED_STATUSES, created_at__lt=before or default_cutoff())
+
+
+def archive_batch(before=None, batch_size=1000):
+    """Déplace au plus ``batch_size`` commandes (et leurs lignes) vers l'archive. Retourne le nombre déplacé."""
+    with transaction.atomic():
+        # Lignes verrouillées le temps du lot ; un archiveur concurrent prend les suivantes
+        ids = list(
+            archivable(before).select_for_update(skip_locked=True)
+            .order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        ArchivedOrder.objects.bulk_create(
+            [ArchivedOrder(**row) for row in Order.objects.filter(pk__in=ids).values(*ORDER_FIELDS)]
+        )
+        lines = OrderLine.objects.filter(order_id__in=ids)
+        ArchivedOrderLine.objects.bulk_create(
+            [ArchivedOrderLine(**row) for row in lines.values(*LINE_FIELDS)], batch_size=batch_size
+        )
+        lines.delete()
+        # Les utilisations de codes promo restent (order -> NULL) : elles comptent toujours dans les limites
+        Order.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def archive_orders(before=None, batch_size=1000, max_batches=None, log=None):
+    """Archive par lots jusqu'à épuisement (ou ``max_batches``). Retourne le nombre de commandes déplacées."""
+    before = before or default_cutoff()
+    total = batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(before, batch_size)
+        if not moved:
+            break
+        total += moved
+        batches += 1
+        if log:
+            log(f"Lot {batches} : {moved} commandes ({total} au total)")
+    return total
+
+
+def archive_horizon(using=None):
+    """Date de création de la commande archivée la plus récente (None : archive vide)"""
+    return ArchivedOrder.objects.using(using).aggregate(latest=Max('created_at'))['latest']
+
+
+def reaches_archive(start=None, using=None):
+    """Une période commençant à ``start`` (date, datetime ou None) touche-t-elle l'archive ?"""
+    horizon = archive_horizon(using)
+    if horizon is None:
+        return False
+    if start is None:
+        return True
+    if isinstance(start, datetime):
+        return start <= horizon
+    return start <= timezone.localdate(horizon) if isinstance(start, date) else True
+
+
+def order_source(start=None, using=None):
+    """Modèle de commandes à interroger pour une période commençant à ``start``"""
+    return OrderHistory if reaches_archive(start, using) else Order
+
+
+def line_source(start=None, using=None):
+    """Modèle de lignes à interroger pour une période commençant à ``start``"""
+    return OrderLineHistory if reaches_archive(start, using) else OrderLine
+
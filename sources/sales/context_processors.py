@@ -2,28 +2,38 @@ from sales.models import Order
 from inventory.models import Product
 from django.db.models import Sum, F
 from django.utils import timezone
+from config.db_router import use_replica
 
+# Requêtes du tableau de bord, partagées avec la vue JSON (sales.views.sales_stats).
+# Filtres indexables : order_status_created_idx, product_low_stock_idx (cf. tests des plans d'exécution)
+
+def month_orders(now=None):
+    """Commandes payées ou expédiées depuis le 1er du mois en cours (plage sur created_at)"""
+    month_start = timezone.localtime(now).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return Order.objects.filter(status__in=['PAID', 'SHIPPED'], created_at__gte=month_start)
+
+def low_stock_products():
+    return Product.objects.filter(stock_quantity__lte=F('low_stock_threshold'))
+
+def pending_orders():
+    return Order.objects.filter(status='DRAFT')
+
+@use_replica()
 def dashboard_stats(request):
     if not request.user.is_staff:
         return {}
 
     # 1. Chiffre d'affaires du mois en cours
-    current_month = timezone.now().month
-    ca_month = Order.objects.filter(
-        status__in=['PAID', 'SHIPPED'],
-        created_at__month=current_month
-    ).aggregate(total=Sum('lines__unit_price_incl_tax'))['total'] or 0
+    ca_month = month_orders().aggregate(total=Sum('lines__unit_price_incl_tax'))['total'] or 0
 
     # 2. Alertes Stock (Produits sous le seuil)
-    low_stock_count = Product.objects.filter(
-        stock_quantity__lte=F('low_stock_threshold')
-    ).count()
+    low_stock_count = low_stock_products().count()
 
     # 3. Commandes en attente de traitement
-    pending_orders = Order.objects.filter(status='DRAFT').count()
+    pending_count = pending_orders().count()
 
     return {
         'stat_ca_month': ca_month,
         'stat_low_stock': low_stock_count,
-        'stat_pending_orders': pending_orders,
+        'stat_pending_orders': pending_count,
     }
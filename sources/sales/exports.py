@@ -0,0 +1,147 @@
+"""
+Plans d'export (CSV / XLSX) des ventes : commandes, lignes et clients.
+
+Les totaux de commande sont ceux de la facture (Order.get_totals) au centime
+près : ils sont calculés en centimes entiers par company.money (HT arrondi au
+pair par ligne, port au taux de la commande, à défaut au taux par défaut),
+par morceaux de commandes avec une requête sur leurs lignes, sans instancier
+de commande. Un calcul SQL (ROUND au demi supérieur, flottants sous SQLite)
+ne retombait pas toujours sur les montants facturés.
+"""
+from collections import defaultdict
+from itertools import islice
+
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from company import money
+from config.db_router import read_alias
+from config.exports import CHUNK_SIZE, Export
+from .models import Order, OrderLine, shipping_vat_rate
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+TOTAL_FIELDS = ('total_products_ttc', 'total_ht', 'total_vat', 'grand_total_ttc')
+# Colonnes de commande nécessaires au calcul des totaux (cf. order_totals)
+TOTALS_INPUTS = ('pk', 'shipping_cost', 'shipping_tax_rate_id', 'discount_amount')
+
+
+def order_totals(orders, line_model=OrderLine, using=None):
+    """
+    Totaux {id: {total_products_ttc, total_ht, total_vat, grand_total_ttc}} des
+    commandes [(id, shipping_cost, shipping_tax_rate_id, discount_amount)], en
+    une requête sur leurs lignes (``line_model`` : OrderLineHistory pour
+    OrderHistory, cf. sales.archive). Mêmes calculs que Order.get_totals.
+    """
+    lines = defaultdict(list)
+    rows = (
+        line_model.objects.using(using)
+        .filter(order_id__in=[order[0] for order in orders])
+        .values_list('order_id', 'unit_price_incl_tax', 'quantity', 'vat_rate')
+    )
+    for order_id, price, quantity, vat_rate in rows:
+        lines[order_id].append((money.to_cents(price), quantity, money.rate_to_bp(vat_rate)))
+
+    totals = {}
+    for pk, shipping_cost, shipping_tax_rate_id, discount_amount in orders:
+        total_ht, total_vat, grand_total_ttc = money.order_totals_cents(
+            lines[pk],
+            money.to_cents(shipping_cost),
+            money.rate_to_bp(shipping_vat_rate(shipping_tax_rate_id)),
+            money.to_cents(discount_amount),
+        )
+        totals[pk] = {
+            'total_products_ttc': money.from_cents(sum(unit * quantity for unit, quantity, _ in lines[pk])),
+            'total_ht': money.from_cents(total_ht),
+            'total_vat': money.from_cents(total_vat),
+            'grand_total_ttc': money.from_cents(grand_total_ttc),
+        }
+    return totals
+
+
+class OrderExport(Export):
+    """Export de commandes : colonnes TOTAL_FIELDS complétées par order_totals, morceau par morceau"""
+
+    def rows(self, queryset):
+        queryset = queryset.using(read_alias())
+        if self.annotations:
+            queryset = queryset.annotate(**self.annotations)
+        paths = [path for _, path in self.columns]
+        fields = [path for path in paths if path not in TOTAL_FIELDS] + list(TOTALS_INPUTS)
+        rows = queryset.order_by('pk').values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+        while chunk := list(islice(rows, CHUNK_SIZE)):
+            totals = order_totals([row[-len(TOTALS_INPUTS):] for row in chunk], using=queryset.db)
+            for row in chunk:
+                values = dict(zip(fields, row))
+                values.update(totals[values['pk']])
+                yield tuple(values[path] for path in paths)
+
+
+ORDER_EXPORT = OrderExport(
+    [
+        ("ID", 'id'),
+        ("Référence", 'reference'),
+        ("Date", 'created_at'),
+        ("Statut", 'status'),
+        ("Client ID", 'customer_id'),
+        ("Client email", 'customer__email'),
+        ("Client nom", 'customer__last_name'),
+        ("Client prénom", 'customer__first_name'),
+        ("Société", 'customer__company_name'),
+        ("Ville facturation", 'billing_address__city'),
+        ("CP facturation", 'billing_address__postal_code'),
+        ("Pays facturation", 'billing_address__country'),
+        ("Transporteur", 'carrier__name'),
+        ("N° de suivi", 'tracking_number'),
+        ("Frais de port HT", 'shipping_cost'),
+        ("Remise", 'discount_amount'),
+        ("Total produits TTC", 'total_products_ttc'),
+        ("Total HT", 'total_ht'),
+        ("Total TVA", 'total_vat'),
+        ("Total TTC", 'grand_total_ttc'),
+    ],
+    filename='commandes',
+)
+
+ORDER_LINE_EXPORT = Export(
+    [
+        ("ID", 'id'),
+        ("Commande", 'order__reference'),
+        ("Date", 'order__created_at'),
+        ("Statut", 'order__status'),
+        ("Client email", 'order__customer__email'),
+        ("Produit ID", 'product_id'),
+        ("SKU", 'product__sku'),
+        ("Produit", 'product__name'),
+        ("Marque", 'product__brand__name'),
+        ("Catégorie", 'product__category__name'),
+        ("Quantité", 'quantity'),
+        ("PU TTC", 'unit_price_incl_tax'),
+        ("Taux TVA", 'vat_rate'),
+        ("Total TTC", 'line_ttc'),
+    ],
+    annotations={
+        'line_ttc': ExpressionWrapper(F('unit_price_incl_tax') * F('quantity'), output_field=MONEY),
+    },
+    filename='lignes_commandes',
+)
+
+CUSTOMER_EXPORT = Export(
+    [
+        ("ID", 'id'),
+        ("Nom", 'last_name'),
+        ("Prénom", 'first_name'),
+        ("Email", 'email'),
+        ("Téléphone", 'phone'),
+        ("Professionnel", 'is_professional'),
+        ("Société", 'company_name'),
+        ("N° TVA", 'vat_number'),
+        ("Commandes", 'order_count'),
+    ],
+    annotations={
+        'order_count': Coalesce(Subquery(
+            Order.objects.filter(customer=OuterRef('pk')).order_by().values('customer')
+            .annotate(n=Count('pk')).values('n')
+        ), 0),
+    },
+    filename='clients',
+)
@@ -0,0 +1,32 @@
+from django import forms
+from inventory.models import Brand, Category
+from .margins import GROUPINGS
+from .models import Order
+
+class MarginReportForm(forms.Form):
+    group_by = forms.ChoiceField(label="Regrouper par", choices=[(g, g.capitalize()) for g in GROUPINGS], initial='product')
+    start = forms.DateField(label="Du", required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    end = forms.DateField(label="Au", required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    brand = forms.ModelChoiceField(label="Marque", queryset=Brand.objects.order_by('name'), required=False)
+    category = forms.ModelChoiceField(label="Catégorie", queryset=Category.objects.order_by('name'), required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Nom seul : évite la remontée des parents de Category.__str__ pour chaque option
+        self.fields['category'].label_from_instance = lambda category: category.name
+
+class VatReportForm(forms.Form):
+    start = forms.DateField(label="Du", required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    end = forms.DateField(label="Au", required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+
+class SalesReportForm(forms.Form):
+    """Filtres de l'export CSV des commandes (paramètres ?status=PAID&from=2025-01-01&to=2025-12-31)"""
+    status = forms.ChoiceField(choices=Order.STATUS_CHOICES, required=False)
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+
+    def __init__(self, data=None, **kwargs):
+        if data is not None:
+            # ``from`` est un mot réservé : les paramètres publics sont renommés pour les champs
+            data = {'status': data.get('status'), 'start': data.get('from'), 'end': data.get('to')}
+        super().__init__(data, **kwargs)
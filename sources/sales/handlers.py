@@ -0,0 +1,47 @@
+import logging
+from collections import defaultdict
+from django.db.models import Sum
+from inventory import counters, ledger
+from inventory.models import StockMovement
+from outbox.registry import handler
+from . import affinity
+from .models import OrderLine
+
+logger = logging.getLogger(__name__)
+
+@handler('order.shipped')
+def decrement_stock(events):
+    """Déduit du stock les quantités expédiées pour tout le lot (cf. inventory.counters) + journal"""
+    order_ids = [event.payload['order_id'] for event in events]
+    shipped = list(
+        OrderLine.objects.filter(order_id__in=order_ids)
+        .values_list('order__reference', 'product_id')
+        .annotate(total=Sum('quantity'))
+        .order_by()
+    )
+    if not shipped:
+        return
+
+    quantities = defaultdict(int)
+    for _, product_id, qty in shipped:
+        quantities[product_id] += qty
+
+    oversold = counters.decrement(quantities)
+    ledger.record_movements(
+        [(product_id, -qty, reference) for reference, product_id, qty in shipped],
+        StockMovement.SALE,
+    )
+    if oversold:
+        # Survente : stock ramené à zéro plutôt qu'un échec du lot entier ; le manque reste
+        # visible au journal (ajustement) et le journal concorde toujours avec les compteurs
+        ledger.record_movements(
+            [(product_id, missing, ledger.OVERSOLD_REFERENCE) for product_id, missing in oversold.items()],
+            StockMovement.ADJUSTMENT,
+        )
+        logger.warning("Survente à l'expédition (produit : unités manquantes) : %s", oversold)
+
+
+@handler('order.paid')
+def update_affinities(events):
+    """Ajoute les commandes payées à la matrice de co-occurrence (cf. sales.affinity)"""
+    affinity.add_orders([event.payload['order_id'] for event in events])
@@ -0,0 +1,263 @@
+"""
+Import en masse de commandes marketplace (JSONL ou CSV).
+
+Le fichier est lu en flux et traité par lots : clients, adresses, produits et
+transporteurs sont résolus par des requêtes groupées, la validation se fait
+sur tout le lot (stock contrôlé sur la demande cumulée des commandes déjà
+acceptées, pas ligne à ligne), puis commandes et lignes sont insérées par
+bulk_create dans une transaction par lot, avec les événements outbox de leur
+statut (order.paid). Les commandes rejetées partent dans un fichier d'erreurs
+(JSONL) avec leur motif.
+
+JSONL : un objet par commande
+    {"customer_email": "...", "status": "PAID", "carrier": "DHL Express",
+     "billing_address_id": 1, "shipping_address_id": 2, "shipping_cost": "12.50",
+     "lines": [{"sku": "NK-Z6", "quantity": 1, "unit_price_incl_tax": "1999.00"}]}
+
+CSV : une ligne par ligne de commande, regroupées par ``order_key`` consécutif
+    order_key,customer_email,status,carrier,billing_address_id,shipping_address_id,
+    shipping_cost,product_id,sku,quantity,unit_price_incl_tax
+"""
+import csv
+import json
+import time
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from itertools import groupby, islice
+
+from django.db import transaction
+
+from company import reference_cache
+from inventory.counters import with_available_stock
+from inventory.models import Product
+from outbox.registry import publish_many
+from .models import Address, Carrier, Customer, Order, OrderLine, allocate_references
+from .transitions import ON_ENTER
+
+IMPORTABLE_STATUSES = ('DRAFT', 'PAID')
+
+ORDER_FIELDS = ('customer_email', 'status', 'carrier', 'billing_address_id', 'shipping_address_id', 'shipping_cost')
+LINE_FIELDS = ('product_id', 'sku', 'quantity', 'unit_price_incl_tax')
+
+
+class RowError(Exception):
+    pass
+
+
+# -------------------------------------------------------------------
+# LECTURE EN FLUX
+# -------------------------------------------------------------------
+
+def read_jsonl(stream):
+    for number, raw in enumerate(stream, start=1):
+        if raw.strip():
+            try:
+                yield json.loads(raw)
+            except json.JSONDecodeError as e:
+                yield {'_invalid': f"Ligne {number} : JSON invalide ({e})", '_raw': raw.rstrip('\n')}
+
+
+def read_csv(stream):
+    reader = csv.DictReader(stream)
+    for _, rows in groupby(reader, key=lambda row: row.get('order_key')):
+        rows = list(rows)
+        order = {field: rows[0].get(field) or None for field in ORDER_FIELDS}
+        order['lines'] = [{field: row.get(field) or None for field in LINE_FIELDS} for row in rows]
+        yield order
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+# -------------------------------------------------------------------
+# IMPORT
+# -------------------------------------------------------------------
+
+def _int(value, label):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError(f"{label} invalide : {value!r}")
+
+
+def _decimal(value, label):
+    try:
+        return Decimal(str(value)).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        raise RowError(f"{label} invalide : {value!r}")
+
+
+class OrderImporter:
+    def __init__(self, error_stream=None, batch_size=500, default_carrier=None):
+        self.error_stream = error_stream
+        self.batch_size = batch_size
+        self.carriers = {carrier.name: carrier for carrier in Carrier.objects.all()}
+        self.default_carrier = self.carriers.get(default_carrier) if default_carrier else None
+        self.stats = {'orders': 0, 'lines': 0, 'rejected': 0, 'seconds': 0.0}
+        # Unités déjà acceptées par produit : le stock disponible lu en base ne baisse qu'à l'expédition
+        self.reserved = defaultdict(int)
+
+    def run(self, orders):
+        started = time.perf_counter()
+        for batch in batches(orders, self.batch_size):
+            self.import_batch(batch)
+        self.stats['seconds'] = time.perf_counter() - started
+        return self.stats
+
+    def reject(self, row, message):
+        self.stats['rejected'] += 1
+        if self.error_stream is not None:
+            row = {key: value for key, value in row.items() if key != '_invalid'}
+            self.error_stream.write(json.dumps({'error': message, 'row': row}, default=str) + '\n')
+
+    # --- Résolution groupée ---------------------------------------
+
+    def _lookups(self, batch):
+        emails = {row.get('customer_email') for row in batch if row.get('customer_email')}
+        product_ids, skus = set(), set()
+        for row in batch:
+            for line in row.get('lines') or []:
+                if line.get('product_id'):
+                    product_ids.add(str(line['product_id']))
+                elif line.get('sku'):
+                    skus.add(line['sku'])
+
+        customers = {c.email: c for c in Customer.objects.filter(email__in=emails)}
+        addresses = {}
+        for address in Address.objects.filter(customer__in=customers.values()):
+            addresses.setdefault(address.customer_id, []).append(address)
+
+        product_ids = {int(pk) for pk in product_ids if pk.isdigit()}
+        products = Product.objects.filter(pk__in=product_ids) | Product.objects.filter(sku__in=skus)
+        by_id, by_sku = {}, {}
+        for product in with_available_stock(products.only('id', 'sku', 'stock_quantity', 'retail_price_incl_tax', 'tax_rate_id')):
+            by_id[product.pk] = product
+            if product.sku:
+                by_sku[product.sku] = product
+        return customers, addresses, by_id, by_sku
+
+    @staticmethod
+    def _address(candidates, address_id, address_type, required):
+        if address_id:
+            address_id = _int(address_id, f"Adresse {address_type}")
+            for address in candidates:
+                if address.pk == address_id and address.address_type == address_type:
+                    return address
+            raise RowError(f"Adresse {address_type} {address_id} invalide pour ce client")
+        typed = [address for address in candidates if address.address_type == address_type]
+        typed.sort(key=lambda address: not address.is_default)
+        if typed:
+            return typed[0]
+        if required:
+            raise RowError(f"Aucune adresse {address_type} pour ce client")
+        return None
+
+    # --- Validation + insertion -----------------------------------
+
+    def _build(self, row, customers, addresses, by_id, by_sku):
+        if '_invalid' in row:
+            raise RowError(row['_invalid'])
+
+        customer = customers.get(row.get('customer_email'))
+        if customer is None:
+            raise RowError(f"Client inconnu : {row.get('customer_email')!r}")
+        candidates = addresses.get(customer.pk, [])
+
+        status = row.get('status') or 'PAID'
+        if status not in IMPORTABLE_STATUSES:
+            raise RowError(f"Statut non importable : {status}")
+
+        # Sans transporteur (ni par défaut) la commande est importée sans port, comme Order.calculate_shipping
+        carrier = self.carriers.get(row.get('carrier')) if row.get('carrier') else self.default_carrier
+        if carrier is None and row.get('carrier'):
+            raise RowError(f"Transporteur inconnu : {row.get('carrier')!r}")
+        if row.get('shipping_cost'):
+            shipping_cost = _decimal(row['shipping_cost'], "Frais de port")
+        else:
+            shipping_cost = carrier.base_cost if carrier else Decimal('0.00')
+
+        order = Order(
+            customer=customer,
+            status=status,
+            billing_address=self._address(candidates, row.get('billing_address_id'), 'BILLING', True),
+            shipping_address=self._address(candidates, row.get('shipping_address_id'), 'SHIPPING', False),
+            carrier=carrier,
+            shipping_cost=shipping_cost,
+            shipping_tax_rate=reference_cache.get_default_tax_rate(),
+        )
+
+        lines = []
+        for line in row.get('lines') or []:
+            if line.get('product_id'):
+                product = by_id.get(_int(line['product_id'], "Produit"))
+            else:
+                product = by_sku.get(line.get('sku'))
+            if product is None:
+                raise RowError(f"Produit introuvable : {line.get('product_id') or line.get('sku')!r}")
+
+            quantity = _int(line.get('quantity', 1), "Quantité")
+            if quantity < 1:
+                raise RowError(f"Quantité invalide : {quantity}")
+
+            price = line.get('unit_price_incl_tax')
+            lines.append(OrderLine(
+                product=product,
+                quantity=quantity,
+                unit_price_incl_tax=_decimal(price, "Prix") if price else product.retail_price_incl_tax,
+                vat_rate=reference_cache.get_tax_rate(product.tax_rate_id).rate,
+            ))
+        if not lines:
+            raise RowError("Commande sans ligne")
+        self._reserve(lines)
+        return order, lines
+
+    def _reserve(self, lines):
+        """Cumule la demande de la commande à celle des commandes déjà acceptées (même produit, tout l'import)"""
+        demand = defaultdict(int)
+        for line in lines:
+            demand[line.product] += line.quantity
+        for product, quantity in demand.items():
+            if self.reserved[product.pk] + quantity > product.available_stock:
+                raise RowError(
+                    f"Stock insuffisant pour {product.pk} ({product.available_stock}, "
+                    f"dont {self.reserved[product.pk]} déjà importés)."
+                )
+        for product, quantity in demand.items():
+            self.reserved[product.pk] += quantity
+
+    def import_batch(self, batch):
+        customers, addresses, by_id, by_sku = self._lookups(batch)
+
+        accepted = []
+        for row in batch:
+            try:
+                accepted.append(self._build(row, customers, addresses, by_id, by_sku))
+            except RowError as e:
+                self.reject(row, str(e))
+        if not accepted:
+            return
+
+        with transaction.atomic():
+            references = allocate_references(len(accepted))
+            for (order, _), reference in zip(accepted, references):
+                order.reference = reference
+            orders = Order.objects.bulk_create([order for order, _ in accepted])
+
+            order_lines = []
+            for order, (_, lines) in zip(orders, accepted):
+                for line in lines:
+                    line.order = order
+                    order_lines.append(line)
+            OrderLine.objects.bulk_create(order_lines, batch_size=1000)
+
+            # Mêmes événements qu'une transition (affinités...) : une commande importée payée compte comme payée
+            for status, topic in ON_ENTER.items():
+                entered = [{'order_id': order.pk} for order in orders if order.status == status]
+                if entered:
+                    publish_many(topic, entered)
+
+        self.stats['orders'] += len(orders)
+        self.stats['lines'] += len(order_lines)
@@ -0,0 +1,36 @@
+import time
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from config.profiling import profiled
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from sales.archive import archivable, archive_orders, default_cutoff
+
+class Command(BaseCommand):
+    help = "Déplace par lots les commandes livrées ou annulées anciennes vers les tables d'archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help="Archiver les commandes créées avant cette date (AAAA-MM-JJ) "
+                                             "au lieu de ORDER_ARCHIVE_AFTER_DAYS")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Commandes par transaction")
+        parser.add_argument('--max-batches', type=int, help="S'arrêter après N lots (fenêtre de maintenance)")
+        parser.add_argument('--dry-run', action='store_true', help="Compter les commandes archivables sans rien déplacer")
+
+    @profiled()
+    def handle(self, *args, **options):
+        before = default_cutoff()
+        if options['before']:
+            day = parse_date(options['before'])
+            if day is None:
+                raise CommandError(f"Date invalide : {options['before']}")
+            before = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+        if options['dry_run']:
+            self.stdout.write(f"{archivable(before).count()} commandes archivables (créées avant {before:%Y-%m-%d}).")
+            return
+
+        started = time.perf_counter()
+        moved = archive_orders(before, options['batch_size'], options['max_batches'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(
+            f"{moved} commandes archivées en {time.perf_counter() - started:.1f}s."
+        ))
@@ -0,0 +1,80 @@
+import threading
+import time
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.utils import timezone
+from sales import redemption
+from sales.models import Order, Promotion, PromotionRedemption
+
+class Command(BaseCommand):
+    help = (
+        "Banc de consommation concurrente d'un code promo : N threads tentent de le consommer, "
+        "on vérifie que le plafond est respecté à l'unité. À lancer sur PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--attempts', type=int, default=100, help="Tentatives par thread")
+        parser.add_argument('--max-uses', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        template = Order.objects.select_related('customer').filter(status='DRAFT').first()
+        if template is None:
+            self.stderr.write("Il faut au moins une commande en brouillon (seed_data).")
+            return
+        now = timezone.now()
+        promotion = Promotion.objects.create(
+            name="Banc consommation", promo_type='CODE', code=f"BENCH-{int(now.timestamp())}",
+            discount_type='FIXED', value=Decimal("1.00"), max_uses=options['max_uses'],
+            start_date=now - timezone.timedelta(hours=1), end_date=now + timezone.timedelta(hours=1),
+        )
+        # Une commande par tentative, clonée du brouillon (sans lignes : seule la consommation est mesurée)
+        orders = Order.objects.bulk_create([
+            Order(customer=template.customer, billing_address=template.billing_address, reference=f"BENCH-{i}")
+            for i in range(options['threads'] * options['attempts'])
+        ])
+        try:
+            counts = {'ok': 0, 'refused': 0, 'retried': 0}
+            lock = threading.Lock()
+
+            def worker(own):
+                local = dict.fromkeys(counts, 0)
+                try:
+                    for order in own:
+                        while True:
+                            try:
+                                redemption.redeem_promo_code(order, promotion.code)
+                                local['ok'] += 1
+                            except ValidationError:
+                                local['refused'] += 1
+                            except OperationalError:
+                                local['retried'] += 1
+                                continue
+                            break
+                finally:
+                    connection.close()
+                with lock:
+                    for key, value in local.items():
+                        counts[key] += value
+
+            chunks = [orders[i::options['threads']] for i in range(options['threads'])]
+            threads = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+            promotion.refresh_from_db()
+            style = self.style.SUCCESS if counts['ok'] == promotion.uses == min(len(orders), options['max_uses']) else self.style.ERROR
+            self.stdout.write(style(
+                f"{len(orders) / elapsed:.0f} tentatives/s : {counts['ok']} acceptées, {counts['refused']} refusées, "
+                f"{counts['retried']} rejouées ; compteur {promotion.uses}/{options['max_uses']}."
+            ))
+        finally:
+            PromotionRedemption.objects.filter(promotion=promotion).delete()
+            Order.objects.filter(pk__in=[order.pk for order in orders]).delete()
+            promotion.delete()
@@ -0,0 +1,16 @@
+import time
+from django.core.management.base import BaseCommand
+from config.profiling import profiled
+from sales import affinity
+
+class Command(BaseCommand):
+    help = "Reconstruit la matrice de co-occurrence et les produits fréquemment achetés ensemble"
+
+    @profiled()
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        stats = affinity.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['orders']} commandes, {stats['pairs']} paires, {stats['affinities']} associations "
+            f"en {time.perf_counter() - started:.1f}s."
+        ))
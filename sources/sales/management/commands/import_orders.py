@@ -0,0 +1,40 @@
+import sys
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from config.profiling import profiled
+from sales.importers import OrderImporter, read_csv, read_jsonl
+
+class Command(BaseCommand):
+    help = "Importe des commandes marketplace depuis un fichier JSONL ou CSV (en flux, par lots)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Fichier .jsonl ou .csv ('-' pour l'entrée standard, JSONL)")
+        parser.add_argument('--format', choices=['jsonl', 'csv'], help="Déduit de l'extension par défaut")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--errors', help="Fichier des lignes rejetées (défaut : <fichier>.errors.jsonl)")
+        parser.add_argument('--carrier', help="Transporteur par défaut (nom) si absent du fichier ; sans lui, commande importée sans transporteur ni port")
+
+    @profiled()
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        errors_path = options['errors'] or (f"{path}.errors.jsonl" if path != '-' else 'import_orders.errors.jsonl')
+
+        if path != '-' and not Path(path).exists():
+            raise CommandError(f"Fichier introuvable : {path}")
+
+        source = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        reader = read_csv if fmt == 'csv' else read_jsonl
+
+        self.stdout.write(f"Import de {path} ({fmt})...")
+        with source, open(errors_path, 'w', encoding='utf-8') as error_stream:
+            importer = OrderImporter(error_stream, options['batch_size'], options['carrier'])
+            stats = importer.run(reader(source))
+
+        rate = stats['orders'] / stats['seconds'] if stats['seconds'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Import terminé : {stats['orders']} commandes, {stats['lines']} lignes en {stats['seconds']:.1f}s "
+            f"({rate:.0f} commandes/s)."
+        ))
+        if stats['rejected']:
+            self.stdout.write(self.style.WARNING(f"{stats['rejected']} commandes rejetées, voir {errors_path}"))
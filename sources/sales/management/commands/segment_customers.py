@@ -0,0 +1,23 @@
+import time
+from django.core.management.base import BaseCommand
+from config.profiling import profiled
+from sales.models import Customer
+from sales.segmentation import segment_customers
+
+class Command(BaseCommand):
+    help = "Segmentation RFM (récence, fréquence, montant) de tous les clients"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help="Clients par UPDATE")
+
+    @profiled()
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        stats = segment_customers(batch_size=options['batch_size'])
+        labels = dict(Customer.SEGMENTS)
+        for code, count in sorted(stats['segments'].items(), key=lambda item: -item[1]):
+            self.stdout.write(f"  {labels.get(code, code):<15} {count}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['customers']} clients ({stats['active']} actifs), {stats['updated']} mis à jour "
+            f"en {time.perf_counter() - started:.1f}s."
+        ))
@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from config.profiling import profiled
+from sales.models import Promotion
+from sales.simulation import HISTORY_DAYS, LineHistory, simulate
+
+class Command(BaseCommand):
+    help = "Simule le coût d'une ou plusieurs promotions sur l'historique des ventes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('promotion_ids', nargs='+', type=int)
+        parser.add_argument('--days', type=int, default=HISTORY_DAYS, help="Profondeur d'historique (jours)")
+
+    @profiled()
+    def handle(self, *args, **options):
+        promotions = list(Promotion.objects.filter(pk__in=options['promotion_ids']).order_by('pk'))
+        if not promotions:
+            raise CommandError("Aucune promotion trouvée.")
+
+        started = time.perf_counter()
+        history = LineHistory(days=options['days'])
+        self.stdout.write(f"{len(history)} lignes chargées en {time.perf_counter() - started:.1f}s.")
+        for promotion in promotions:
+            started = time.perf_counter()
+            result = simulate(promotion, history)
+            self.stdout.write(self.style.SUCCESS(f"{promotion.name} ({time.perf_counter() - started:.2f}s)"))
+            for key, value in result.items():
+                self.stdout.write(f"  {key:<22} {value}")
@@ -0,0 +1,106 @@
+"""
+Rapport de marge réalisée, calculé en SQL.
+
+Chaque ligne de commande est valorisée au coût d'achat en vigueur à la date
+de la commande (historique fournisseurs, procurement.cost_as_of), puis
+agrégée par produit, marque ou catégorie. Le rang et la part du total sont
+des fonctions de fenêtre : aucune ligne n'est chargée en Python.
+
+Le CA HT est net de la remise de commande (discount_amount, TTC), répartie
+entre les lignes au prorata de leur TTC comme dans sales.vat, puis ramenée au
+HT au taux de la ligne. Il est calculé ligne à ligne sans l'arrondi au centime
+de OrderLine.total_line_excl_tax : l'écart est inférieur au demi-centime par
+ligne.
+"""
+from django.db.models import (
+    Case, Count, DecimalField, ExpressionWrapper, F, FloatField, Func, OuterRef, Q, Subquery, Sum, Value, When, Window,
+)
+from django.db.models.functions import NullIf, Rank
+from procurement.models import cost_as_of
+from .archive import line_source
+
+GROUPINGS = {
+    'product': ('product_id', 'product__name'),
+    'brand': ('product__brand_id', 'product__brand__name'),
+    'category': ('product__category_id', 'product__category__name'),
+}
+
+DEFAULT_STATUSES = ('PAID', 'SHIPPED', 'DELIVERED')
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+LINE_TTC = ExpressionWrapper(F('unit_price_incl_tax') * F('quantity'), output_field=MONEY)
+
+# CA HT d'une ligne de commande, sans arrondi au centime (cf. docstring du module)
+LINE_REVENUE_HT = ExpressionWrapper(
+    F('unit_price_incl_tax') * F('quantity') * 100 / (100 + F('vat_rate')), output_field=MONEY
+)
+
+
+def line_discount_ht(line_model):
+    """Part HT de la remise de commande portée par la ligne (TTC ligne / TTC produits de la commande)"""
+    order_ttc = Subquery(
+        line_model.objects.filter(order=OuterRef('order')).values('order').annotate(ttc=Sum(LINE_TTC)).values('ttc')
+    )
+    share = ExpressionWrapper(
+        F('order__discount_amount') * LINE_TTC / NullIf(order_ttc, 0) * 100 / (100 + F('vat_rate')),
+        output_field=MONEY,
+    )
+    # Sous-requête évaluée seulement pour les commandes remisées
+    return Case(When(order__discount_amount__gt=0, then=share), default=Value(0), output_field=MONEY)
+
+
+class ShareOfTotal(Func):
+    """valeur / SUM(valeur) OVER () — accepte un agrégat, contrairement à Window(Sum(...))"""
+    output_field = FloatField()
+    contains_over_clause = True
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.source_expressions[0])
+        # L'expression apparaît deux fois : ses paramètres aussi
+        return (
+            f'CAST({sql} AS DOUBLE PRECISION) / NULLIF(SUM({sql}) OVER (), 0)',
+            (*params, *params),
+        )
+
+
+def margin_report(group_by='product', start=None, end=None, statuses=DEFAULT_STATUSES,
+                  brand=None, category=None, using=None):
+    """
+    Queryset de dicts : key, label, units, revenue_ht, cost, margin,
+    uncosted_lines, rank (par marge), share (part du CA HT total).
+    """
+    key, label = GROUPINGS[group_by]
+
+    # Tables chaudes, ou vue d'historique si la période remonte jusqu'aux commandes archivées
+    source = line_source(start, using)
+    lines = source.objects.using(using) if using else source.objects.all()
+    lines = lines.filter(order__status__in=statuses)
+    if start:
+        lines = lines.filter(order__created_at__date__gte=start)
+    if end:
+        lines = lines.filter(order__created_at__date__lte=end)
+    if brand:
+        lines = lines.filter(product__brand=brand)
+    if category:
+        lines = lines.filter(product__category=category)
+
+    line_cost = ExpressionWrapper(F('unit_cost') * F('quantity'), output_field=MONEY)
+
+    return (
+        lines
+        .annotate(unit_cost=cost_as_of('product', 'order__created_at'))
+        .values(key=F(key), label=F(label))
+        .annotate(
+            units=Sum('quantity'),
+            revenue_ht=Sum(LINE_REVENUE_HT - line_discount_ht(source), output_field=MONEY),
+            cost=Sum(line_cost),
+            uncosted_lines=Count('id', filter=Q(unit_cost__isnull=True)),
+        )
+        .annotate(margin=ExpressionWrapper(F('revenue_ht') - F('cost'), output_field=MONEY))
+        .annotate(
+            rank=Window(Rank(), order_by=F('margin').desc(nulls_last=True)),
+            share=ShareOfTotal('revenue_ht'),
+        )
+        .order_by('rank', 'key')
+    )
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:40
+
+from django.db import migrations
+
+from config.search_indexes import TrigramSearchIndexes
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0002_remove_order_shipping_cost_incl_tax_and_more'),
+    ]
+
+    operations = [
+        TrigramSearchIndexes('Customer', ['last_name', 'first_name', 'email', 'company_name']),
+        TrigramSearchIndexes('Address', ['label', 'street_address', 'city', 'postal_code']),
+        TrigramSearchIndexes('Promotion', ['name', 'code']),
+    ]
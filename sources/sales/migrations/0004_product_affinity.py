@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_product_classification'),
+        ('sales', '0003_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductAffinity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Rang')),
+                ('co_orders', models.PositiveIntegerField(verbose_name='Commandes communes')),
+                ('confidence', models.FloatField(verbose_name='Confiance')),
+                ('lift', models.FloatField(verbose_name='Lift')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='affinities', to='inventory.product')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.product', verbose_name='Produit associé')),
+            ],
+            options={
+                'verbose_name': 'Produit associé',
+                'verbose_name_plural': 'Produits associés',
+                'constraints': [models.UniqueConstraint(fields=('product', 'rank'), name='product_affinity_rank_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductPairCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('product_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.product')),
+                ('product_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.product')),
+            ],
+            options={
+                'verbose_name': 'Co-occurrence de produits',
+                'verbose_name_plural': 'Co-occurrences de produits',
+                'constraints': [models.UniqueConstraint(fields=('product_a', 'product_b'), name='product_pair_unique')],
+            },
+        ),
+    ]
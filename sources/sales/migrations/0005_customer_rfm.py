@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0004_product_affinity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='average_order_value',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12, verbose_name='Panier moyen HT'),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='last_order_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Dernière commande'),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='lifetime_value',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14, verbose_name='CA HT cumulé'),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='paid_orders',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Commandes payées'),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='rfm_score',
+            field=models.CharField(blank=True, editable=False, max_length=3, verbose_name='Score RFM'),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='rfm_segment',
+            field=models.CharField(blank=True, choices=[('CHAMPION', 'Champions'), ('LOYAL', 'Fidèles'), ('PROMISING', 'Prometteurs'), ('ATTENTION', 'À surveiller'), ('AT_RISK', 'À risque'), ('DORMANT', 'En sommeil'), ('NONE', 'Sans commande')], editable=False, max_length=10, verbose_name='Segment RFM'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['rfm_segment', '-lifetime_value'], name='customer_segment_value_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['-lifetime_value'], name='customer_value_idx'),
+        ),
+    ]
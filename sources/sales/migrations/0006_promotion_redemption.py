@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0005_customer_rfm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='creditnote',
+            name='used_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='promotion',
+            name='max_uses',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Utilisations max.'),
+        ),
+        migrations.AddField(
+            model_name='promotion',
+            name='max_uses_per_customer',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Utilisations max. par client'),
+        ),
+        migrations.AddField(
+            model_name='promotion',
+            name='uses',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Utilisations'),
+        ),
+        migrations.CreateModel(
+            name='PromotionRedemption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('redeemed_at', models.DateTimeField(auto_now_add=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='promotion_redemptions', to='sales.customer')),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='promotion_redemption', to='sales.order')),
+                ('promotion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='redemptions', to='sales.promotion')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['promotion', 'customer'], name='redemption_promo_customer_idx')],
+            },
+        ),
+    ]
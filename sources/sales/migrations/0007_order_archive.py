@@ -0,0 +1,114 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:48
+
+import django.db.models.deletion
+import sales.models
+from django.db import migrations, models
+
+ORDER_COLUMNS = (
+    'id, reference, customer_id, status, billing_address_id, shipping_address_id, carrier_id, is_relay_point, '
+    'relay_point_id, tracking_number, shipping_cost, shipping_tax_rate_id, applied_promotion_id, '
+    'applied_credit_note_id, discount_amount, created_at'
+)
+LINE_COLUMNS = 'id, order_id, product_id, quantity, unit_price_incl_tax, vat_rate'
+
+# Vues de lecture des rapports : table chaude et archive (mêmes colonnes, mêmes identifiants)
+CREATE_VIEWS = [
+    f"CREATE VIEW sales_order_history AS SELECT {ORDER_COLUMNS} FROM sales_order "
+    f"UNION ALL SELECT {ORDER_COLUMNS} FROM sales_archivedorder",
+    f"CREATE VIEW sales_orderline_history AS SELECT {LINE_COLUMNS} FROM sales_orderline "
+    f"UNION ALL SELECT {LINE_COLUMNS} FROM sales_archivedorderline",
+]
+DROP_VIEWS = ["DROP VIEW sales_orderline_history", "DROP VIEW sales_order_history"]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0001_initial'),
+        ('inventory', '0008_product_classification'),
+        ('sales', '0006_promotion_redemption'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderHistory',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('DRAFT', 'Draft'), ('PAID', 'Paid'), ('SHIPPED', 'Shipped'), ('DELIVERED', 'Delivered'), ('CANCELLED', 'Cancelled')], max_length=10)),
+                ('is_relay_point', models.BooleanField(default=False)),
+                ('relay_point_id', models.CharField(blank=True, max_length=50)),
+                ('tracking_number', models.CharField(blank=True, max_length=100)),
+                ('shipping_cost', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('discount_amount', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('created_at', models.DateTimeField()),
+                ('reference', models.CharField(max_length=20)),
+            ],
+            options={
+                'db_table': 'sales_order_history',
+                'managed': False,
+            },
+            bases=(sales.models.OrderTotalsMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name='OrderLineHistory',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('unit_price_incl_tax', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('vat_rate', models.DecimalField(decimal_places=2, max_digits=5, verbose_name='Taux TVA (%)')),
+            ],
+            options={
+                'db_table': 'sales_orderline_history',
+                'managed': False,
+            },
+            bases=(sales.models.LineAmountsMixin, models.Model),
+        ),
+        migrations.AlterField(
+            model_name='promotionredemption',
+            name='order',
+            field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='promotion_redemption', to='sales.order'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('reference', models.CharField(max_length=20, unique=True)),
+                ('status', models.CharField(choices=[('DRAFT', 'Draft'), ('PAID', 'Paid'), ('SHIPPED', 'Shipped'), ('DELIVERED', 'Delivered'), ('CANCELLED', 'Cancelled')], max_length=10)),
+                ('is_relay_point', models.BooleanField(default=False)),
+                ('relay_point_id', models.CharField(blank=True, max_length=50)),
+                ('tracking_number', models.CharField(blank=True, max_length=100)),
+                ('shipping_cost', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('discount_amount', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('applied_credit_note', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='sales.creditnote')),
+                ('applied_promotion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='sales.promotion')),
+                ('billing_address', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='sales.address')),
+                ('carrier', models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='sales.carrier')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_orders', to='sales.customer')),
+                ('shipping_address', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='sales.address')),
+                ('shipping_tax_rate', models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='company.taxrate')),
+            ],
+            bases=(sales.models.OrderTotalsMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderLine',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('unit_price_incl_tax', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('vat_rate', models.DecimalField(decimal_places=2, max_digits=5, verbose_name='Taux TVA (%)')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='sales.archivedorder')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='inventory.product')),
+            ],
+            options={
+                'abstract': False,
+            },
+            bases=(sales.models.LineAmountsMixin, models.Model),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['created_at'], name='archived_order_created_idx'),
+        ),
+        migrations.RunSQL(CREATE_VIEWS, DROP_VIEWS),
+    ]
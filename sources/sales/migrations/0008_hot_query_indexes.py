@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0001_initial'),
+        ('inventory', '0009_hot_query_indexes'),
+        ('sales', '0007_order_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='promotion',
+            index=models.Index(condition=models.Q(('active', True), ('code__isnull', True)), fields=['end_date', 'start_date'], name='promotion_automatic_idx'),
+        ),
+    ]
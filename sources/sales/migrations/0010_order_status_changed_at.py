@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 20:18
+
+from importlib import import_module
+
+import django.utils.timezone
+from django.db import migrations, models
+
+archive = import_module('sales.migrations.0007_order_archive')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0009_order_reference_counter'),
+    ]
+
+    operations = [
+        # SQLite reconstruit la table pour ajouter la colonne : les vues qui la lisent sont recréées après
+        migrations.RunSQL(archive.DROP_VIEWS, archive.CREATE_VIEWS),
+        migrations.AddField(
+            model_name='order',
+            name='status_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status_changed_at'], name='order_status_changed_idx'),
+        ),
+        migrations.RunSQL(archive.CREATE_VIEWS, archive.DROP_VIEWS),
+    ]
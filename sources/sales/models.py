@@ -1,8 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from decimal import Decimal
+from company import money, reference_cache
+from .transitions import can_transition
 
 # -------------------------------------------------------------------
 # CLIENTS ET ADRESSES
@@ -18,7 +20,31 @@ class Customer(models.Model):
     is_professional = models.BooleanField("Est une entreprise ?", default=False)
     company_name = models.CharField("Nom de la société", max_length=200, blank=True, null=True)
     vat_number = models.CharField("N° TVA Intracom.", max_length=50, blank=True, null=True)
-    
+
+    # --- Segmentation RFM (récence, fréquence, montant), cf. sales.segmentation ---
+    SEGMENTS = [
+        ('CHAMPION', 'Champions'),
+        ('LOYAL', 'Fidèles'),
+        ('PROMISING', 'Prometteurs'),
+        ('ATTENTION', 'À surveiller'),
+        ('AT_RISK', 'À risque'),
+        ('DORMANT', 'En sommeil'),
+        ('NONE', 'Sans commande'),
+    ]
+    rfm_segment = models.CharField("Segment RFM", max_length=10, choices=SEGMENTS, blank=True, editable=False)
+    rfm_score = models.CharField("Score RFM", max_length=3, blank=True, editable=False)
+    paid_orders = models.PositiveIntegerField("Commandes payées", default=0, editable=False)
+    lifetime_value = models.DecimalField("CA HT cumulé", max_digits=14, decimal_places=2, default=0, editable=False)
+    average_order_value = models.DecimalField("Panier moyen HT", max_digits=12, decimal_places=2, default=0,
+                                              editable=False)
+    last_order_at = models.DateTimeField("Dernière commande", null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['rfm_segment', '-lifetime_value'], name='customer_segment_value_idx'),
+            models.Index(fields=['-lifetime_value'], name='customer_value_idx'),
+        ]
+
     def __str__(self):
         if self.is_professional and self.company_name:
             return f"{self.company_name} ({self.last_name})"
@@ -77,6 +103,11 @@ class Promotion(models.Model):
     end_date = models.DateTimeField()
     active = models.BooleanField(default=True)
 
+    # Limites d'utilisation (vides : illimité), consommées par sales.redemption
+    max_uses = models.PositiveIntegerField("Utilisations max.", null=True, blank=True)
+    max_uses_per_customer = models.PositiveIntegerField("Utilisations max. par client", null=True, blank=True)
+    uses = models.PositiveIntegerField("Utilisations", default=0, editable=False)
+
     # Ciblage et Exclusions
     target_brands = models.ManyToManyField('inventory.Brand', blank=True)
     target_categories = models.ManyToManyField('inventory.Category', blank=True)
@@ -84,6 +115,13 @@ class Promotion(models.Model):
     excluded_categories = models.ManyToManyField('inventory.Category', blank=True, related_name='excluded_from_promos')
     excluded_products = models.ManyToManyField('inventory.Product', blank=True, related_name='excluded_from_promos')
 
+    class Meta:
+        indexes = [
+            # Promotions automatiques en cours (Order.calculate_automatic_discounts) ; les codes ont leur index unique
+            models.Index(fields=['end_date', 'start_date'], condition=models.Q(active=True, code__isnull=True),
+                         name='promotion_automatic_idx'),
+        ]
+
     def is_valid(self):
         now = timezone.now()
         return self.active and self.start_date <= now <= self.end_date
@@ -105,6 +143,7 @@ class CreditNote(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     code = models.CharField(max_length=20, unique=True)
     is_used = models.BooleanField(default=False)
+    used_at = models.DateTimeField(null=True, blank=True, editable=False)
     expiry_date = models.DateField()
 
     def is_valid(self):
@@ -113,11 +152,64 @@ class CreditNote(models.Model):
     def __str__(self):
         return f"Avoir {self.code} ({self.amount}€)"
 
+class PromotionRedemption(models.Model):
+    """Utilisation d'un code promo par un client (limite par client), cf. sales.redemption"""
+    promotion = models.ForeignKey(Promotion, on_delete=models.CASCADE, related_name='redemptions')
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='promotion_redemptions')
+    # Conservée (sans commande) quand la commande part en archive : elle compte toujours dans les limites
+    order = models.OneToOneField('Order', on_delete=models.SET_NULL, null=True, related_name='promotion_redemption')
+    redeemed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['promotion', 'customer'], name='redemption_promo_customer_idx')]
+
 # -------------------------------------------------------------------
 # COMMANDES ET LIGNES
 # -------------------------------------------------------------------
 
-class Order(models.Model):
+class OrderTotalsMixin:
+    """Totaux d'une commande : Order, ArchivedOrder et OrderHistory (mêmes colonnes, lignes en ``lines``)"""
+
+    def get_totals(self):
+        lines = [
+            (money.to_cents(line.unit_price_incl_tax), line.quantity, money.rate_to_bp(line.vat_rate))
+            for line in self.lines.all()
+        ]
+        tax_rate_val = shipping_vat_rate(self.shipping_tax_rate_id)
+
+        # Calcul en centimes entiers (mêmes arrondis que l'ancien calcul Decimal)
+        total_ht, total_vat, grand_total_ttc = money.order_totals_cents(
+            lines,
+            money.to_cents(self.shipping_cost),
+            money.rate_to_bp(tax_rate_val),
+            money.to_cents(self.discount_amount),
+        )
+
+        return {
+            'total_ht': money.from_cents(total_ht),
+            'total_vat': money.from_cents(total_vat),
+            'grand_total_ttc': money.from_cents(grand_total_ttc)
+        }
+
+class LineAmountsMixin:
+    """Montants d'une ligne : OrderLine, ArchivedOrderLine et OrderLineHistory"""
+
+    @property
+    def total_line_excl_tax(self):
+        return money.from_cents(money.excl_tax_cents(
+            money.to_cents(self.unit_price_incl_tax), money.rate_to_bp(self.vat_rate), self.quantity
+        ))
+
+    @property
+    def total_line_incl_tax(self):
+        return self.unit_price_incl_tax * self.quantity
+
+    @property
+    def total_line_price(self):
+        """Alias de confort pour pointer vers le TTC par défaut"""
+        return self.total_line_incl_tax
+
+class Order(OrderTotalsMixin, models.Model):
     STATUS_CHOICES = [
         ('DRAFT', 'Draft'), ('PAID', 'Paid'), ('SHIPPED', 'Shipped'),
         ('DELIVERED', 'Delivered'), ('CANCELLED', 'Cancelled')
@@ -143,6 +235,24 @@ class Order(models.Model):
     discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
 
     created_at = models.DateTimeField(auto_now_add=True)
+    # Dernier changement de statut (paiement, annulation, import...) : reprises incrémentales (inventory.classification)
+    status_changed_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        indexes = [
+            # Tableau de bord (brouillons, CA du mois), exports et archivage : statut puis période
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+            models.Index(fields=['status_changed_at'], name='order_status_changed_idx'),
+        ]
+
+    _loaded_status = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # On garde le statut lu en base pour détecter les transitions (cf. signals)
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.status if 'status' in field_names else None
+        return instance
     
     def calculate_discount(self):
         discount = Decimal('0.00')
@@ -152,7 +262,8 @@ class Order(models.Model):
                 discount += (total_products * self.applied_promotion.value / 100)
             else:
                 discount += self.applied_promotion.value
-        if self.applied_credit_note and not self.applied_credit_note.is_used:
+        # L'avoir rattaché à la commande a été consommé pour elle (cf. sales.redemption)
+        if self.applied_credit_note:
             discount += self.applied_credit_note.amount
         return discount
     
@@ -186,37 +297,77 @@ class Order(models.Model):
 
     def clean(self):
         super().clean()
+        if self._loaded_status and self.status != self._loaded_status and not can_transition(self._loaded_status, self.status):
+            raise ValidationError({'status': f"Transition {self._loaded_status} -> {self.status} non autorisée."})
         if self.shipping_address and (self.shipping_address.address_type != 'SHIPPING' or self.shipping_address.customer != self.customer):
             raise ValidationError({'shipping_address': "Adresse de livraison invalide."})
         if self.billing_address and (self.billing_address.address_type != 'BILLING' or self.billing_address.customer != self.customer):
             raise ValidationError({'billing_address': "Adresse de facturation invalide."})
+        self._check_redemptions()
 
-    def get_totals(self):
-        lines = self.lines.all()
-        total_ht = sum(line.total_line_excl_tax for line in lines)
-        total_ttc_products = sum(line.total_line_incl_tax for line in lines)
-        
-        tax_rate_val = self.shipping_tax_rate.rate if self.shipping_tax_rate else Decimal('20.00')
-        shipping_ttc = self.shipping_cost * (1 + tax_rate_val / 100)
-        
-        grand_total_ttc = total_ttc_products + shipping_ttc - self.discount_amount
-        total_vat = grand_total_ttc - (total_ht + self.shipping_cost)
-        
-        return {
-            'total_ht': (total_ht + self.shipping_cost).quantize(Decimal('0.01')),
-            'total_vat': total_vat.quantize(Decimal('0.01')),
-            'grand_total_ttc': grand_total_ttc.quantize(Decimal('0.01'))
-        }
+    def _check_redemptions(self):
+        # Avoir et code promo ne se rattachent qu'en étant consommés (sales.redemption, UPDATE direct) :
+        # un rattachement absent de la base n'a pas été réclamé et ne doit pas entrer dans la remise
+        if not (self.applied_credit_note_id or self.applied_promotion_id):
+            return
+        stored = Order.objects.filter(pk=self.pk).values('applied_credit_note_id', 'applied_promotion_id').first() or {}
+        errors = {}
+        if self.applied_credit_note_id and self.applied_credit_note_id != stored.get('applied_credit_note_id'):
+            errors['applied_credit_note'] = "Un avoir s'applique en le consommant (sales.redemption)."
+        if self.applied_promotion_id and self.applied_promotion_id != stored.get('applied_promotion_id'):
+            errors['applied_promotion'] = "Un code promo s'applique en le consommant (sales.redemption)."
+        if errors:
+            raise ValidationError(errors)
 
     def save(self, *args, **kwargs):
         if not self.reference:
-            last_order = Order.objects.all().last()
-            new_id = (last_order.id + 1) if last_order else 1
-            self.reference = f"DP-{timezone.now().year}-{new_id:04d}"
+            self.reference = allocate_references(1)[0]
+        if self._loaded_status and self.status != self._loaded_status:
+            self.status_changed_at = timezone.now()
         self.full_clean()
         super().save(*args, **kwargs)
 
-class OrderLine(models.Model):
+def shipping_vat_rate(tax_rate_id):
+    """Taux de TVA du port : celui de la commande, à défaut le taux par défaut (20 % en dernier recours)"""
+    tax_rate = reference_cache.get_tax_rate(tax_rate_id) or reference_cache.get_default_tax_rate()
+    return tax_rate.rate if tax_rate else Decimal('20.00')
+
+class ReferenceCounter(models.Model):
+    """Dernier numéro de référence attribué (une ligne par série), cf. allocate_references"""
+    key = models.CharField(max_length=20, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key} : {self.value}"
+
+
+def allocate_references(count):
+    """
+    Réserve un bloc de références consécutives (DP-<année>-<numéro>).
+
+    Le compteur est verrouillé (SELECT ... FOR UPDATE) puis avancé de ``count`` :
+    imports, saisies et archivage concurrents reçoivent des blocs disjoints.
+    Le verrou court jusqu'à la fin de la transaction appelante, ce qui sérialise
+    les créations de commandes ; un bloc d'une transaction annulée est perdu
+    (trou dans la numérotation, jamais de doublon).
+    """
+    with transaction.atomic():
+        try:
+            counter = ReferenceCounter.objects.select_for_update().get(pk='order')
+        except ReferenceCounter.DoesNotExist:
+            # Première attribution : on repart du dernier ID (archive comprise), sans écraser un voisin
+            last_id = max(
+                Order.objects.aggregate(last_id=models.Max('id'))['last_id'] or 0,
+                ArchivedOrder.objects.aggregate(last_id=models.Max('id'))['last_id'] or 0,
+            )
+            ReferenceCounter.objects.bulk_create([ReferenceCounter(key='order', value=last_id)], ignore_conflicts=True)
+            counter = ReferenceCounter.objects.select_for_update().get(pk='order')
+        first = counter.value + 1
+        ReferenceCounter.objects.filter(pk='order').update(value=models.F('value') + count)
+    year = timezone.now().year
+    return [f"DP-{year}-{number:04d}" for number in range(first, first + count)]
+
+class OrderLine(LineAmountsMixin, models.Model):
     order = models.ForeignKey(Order, related_name='lines', on_delete=models.CASCADE)
     product = models.ForeignKey('inventory.Product', on_delete=models.PROTECT)
     quantity = models.PositiveIntegerField(default=1)
@@ -224,29 +375,129 @@ class OrderLine(models.Model):
     unit_price_incl_tax = models.DecimalField(max_digits=10, decimal_places=2)
     vat_rate = models.DecimalField("Taux TVA (%)", max_digits=5, decimal_places=2)
 
-    @property
-    def total_line_excl_tax(self):
-        price_ht = self.unit_price_incl_tax / (1 + self.vat_rate / 100)
-        return (price_ht * self.quantity).quantize(Decimal('0.01'))
-
-    @property
-    def total_line_incl_tax(self):
-        return self.unit_price_incl_tax * self.quantity
-
-    @property
-    def total_line_price(self):
-        """Alias de confort pour pointer vers le TTC par défaut"""
-        return self.total_line_incl_tax
-
     def clean(self):
         super().clean()
-        if self.product and self.quantity > self.product.stock_quantity:
-            raise ValidationError({'quantity': f"Stock insuffisant ({self.product.stock_quantity})."})
+        if self.product and self.quantity > self.product.available_stock:
+            raise ValidationError({'quantity': f"Stock insuffisant ({self.product.available_stock})."})
 
     def save(self, *args, **kwargs):
         if not self.unit_price_incl_tax:
             self.unit_price_incl_tax = self.product.retail_price_incl_tax
         if not self.vat_rate:
-            self.vat_rate = self.product.tax_rate.rate
+            tax_rate = reference_cache.get_tax_rate(self.product.tax_rate_id) or self.product.tax_rate
+            self.vat_rate = tax_rate.rate
         self.full_clean()
         super().save(*args, **kwargs)
+
+# -------------------------------------------------------------------
+# ARCHIVE DES COMMANDES CLOSES (cf. sales.archive)
+# -------------------------------------------------------------------
+
+class OrderRecord(OrderTotalsMixin, models.Model):
+    """Colonnes d'une commande hors table chaude ; identifiant et référence d'origine conservés"""
+    id = models.BigIntegerField(primary_key=True)
+    reference = models.CharField(max_length=20, unique=True)
+    status = models.CharField(max_length=10, choices=Order.STATUS_CHOICES)
+    is_relay_point = models.BooleanField(default=False)
+    relay_point_id = models.CharField(max_length=50, blank=True)
+    tracking_number = models.CharField(max_length=100, blank=True)
+    shipping_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return self.reference
+
+class OrderLineRecord(LineAmountsMixin, models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    quantity = models.PositiveIntegerField(default=1)
+    unit_price_incl_tax = models.DecimalField(max_digits=10, decimal_places=2)
+    vat_rate = models.DecimalField("Taux TVA (%)", max_digits=5, decimal_places=2)
+
+    class Meta:
+        abstract = True
+
+class ArchivedOrder(OrderRecord):
+    """Commande livrée ou annulée déplacée hors de la table chaude (lecture seule)"""
+    customer = models.ForeignKey(Customer, on_delete=models.PROTECT, related_name='archived_orders')
+    billing_address = models.ForeignKey(Address, on_delete=models.PROTECT, related_name='+')
+    shipping_address = models.ForeignKey(Address, on_delete=models.PROTECT, related_name='+', null=True, blank=True)
+    carrier = models.ForeignKey(Carrier, on_delete=models.PROTECT, related_name='+', null=True)
+    shipping_tax_rate = models.ForeignKey('company.TaxRate', on_delete=models.PROTECT, related_name='+', null=True)
+    applied_promotion = models.ForeignKey(Promotion, on_delete=models.SET_NULL, related_name='+', null=True, blank=True)
+    applied_credit_note = models.ForeignKey(CreditNote, on_delete=models.SET_NULL, related_name='+', null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['created_at'], name='archived_order_created_idx')]
+
+class ArchivedOrderLine(OrderLineRecord):
+    order = models.ForeignKey(ArchivedOrder, related_name='lines', on_delete=models.CASCADE)
+    product = models.ForeignKey('inventory.Product', on_delete=models.PROTECT, related_name='+')
+
+class OrderHistory(OrderRecord):
+    """Vue SQL : commandes chaudes et archivées (UNION ALL), pour les rapports qui remontent loin"""
+    customer = models.ForeignKey(Customer, on_delete=models.DO_NOTHING, related_name='+')
+    billing_address = models.ForeignKey(Address, on_delete=models.DO_NOTHING, related_name='+')
+    shipping_address = models.ForeignKey(Address, on_delete=models.DO_NOTHING, related_name='+', null=True)
+    carrier = models.ForeignKey(Carrier, on_delete=models.DO_NOTHING, related_name='+', null=True)
+    shipping_tax_rate = models.ForeignKey('company.TaxRate', on_delete=models.DO_NOTHING, related_name='+', null=True)
+    applied_promotion = models.ForeignKey(Promotion, on_delete=models.DO_NOTHING, related_name='+', null=True)
+    applied_credit_note = models.ForeignKey(CreditNote, on_delete=models.DO_NOTHING, related_name='+', null=True)
+    reference = models.CharField(max_length=20)
+
+    class Meta:
+        managed = False
+        db_table = 'sales_order_history'
+
+class OrderLineHistory(OrderLineRecord):
+    """Vue SQL : lignes chaudes et archivées (UNION ALL)"""
+    order = models.ForeignKey(OrderHistory, related_name='lines', on_delete=models.DO_NOTHING)
+    product = models.ForeignKey('inventory.Product', on_delete=models.DO_NOTHING, related_name='+')
+
+    class Meta:
+        managed = False
+        db_table = 'sales_orderline_history'
+
+# -------------------------------------------------------------------
+# VENTE CROISÉE
+# -------------------------------------------------------------------
+
+class ProductPairCount(models.Model):
+    """Matrice de co-occurrence creuse : commandes contenant a et b (a ≤ b, diagonale = a seul), cf. sales.affinity"""
+    product_a = models.ForeignKey('inventory.Product', on_delete=models.CASCADE, related_name='+')
+    product_b = models.ForeignKey('inventory.Product', on_delete=models.CASCADE, related_name='+')
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Co-occurrence de produits"
+        verbose_name_plural = "Co-occurrences de produits"
+        constraints = [
+            models.UniqueConstraint(fields=['product_a', 'product_b'], name='product_pair_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_a_id} × {self.product_b_id} : {self.orders}"
+
+class ProductAffinity(models.Model):
+    """Produits fréquemment achetés avec ``product`` : top-k par confiance puis lift"""
+    product = models.ForeignKey('inventory.Product', on_delete=models.CASCADE, related_name='affinities')
+    related = models.ForeignKey('inventory.Product', on_delete=models.CASCADE, related_name='+',
+                                verbose_name="Produit associé")
+    rank = models.PositiveSmallIntegerField("Rang")
+    co_orders = models.PositiveIntegerField("Commandes communes")
+    confidence = models.FloatField("Confiance")
+    lift = models.FloatField("Lift")
+
+    class Meta:
+        verbose_name = "Produit associé"
+        verbose_name_plural = "Produits associés"
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='product_affinity_rank_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} → {self.related_id} (#{self.rank})"
@@ -0,0 +1,72 @@
+"""
+Consommation des avoirs et des codes promo, sans double utilisation.
+
+Chaque consommation est un UPDATE conditionnel unique (« WHERE is_used =
+false », « WHERE uses < max_uses ») : la base arbitre, un seul des appels
+concurrents voit une ligne modifiée, les autres reçoivent une ValidationError.
+Sur PostgreSQL l'UPDATE prend le verrou de ligne ; SQLite verrouille toute la
+base en écriture, ce qui donne la même garantie.
+
+Limite par client : l'UPDATE du compteur de la promotion garde la ligne
+verrouillée jusqu'au commit, le comptage des PromotionRedemption du client
+qui suit est donc sérialisé entre transactions. Toute erreur annule la
+transaction, compteur compris.
+
+C'est le seul chemin de rattachement : Order.clean refuse un avoir ou un code
+promo posé directement sur la commande (formulaire, save), qui entrerait sinon
+dans la remise sans avoir été consommé.
+"""
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import CreditNote, Order, Promotion, PromotionRedemption
+
+CENT = Decimal('0.01')
+
+
+def redeem_credit_note(order, code):
+    """Consomme l'avoir ``code`` du client pour ``order`` et met à jour la remise. Retourne l'avoir."""
+    with transaction.atomic():
+        claimed = CreditNote.objects.filter(
+            code=code, customer_id=order.customer_id, is_used=False, expiry_date__gte=timezone.localdate(),
+        ).update(is_used=True, used_at=timezone.now())
+        if not claimed:
+            raise ValidationError({'applied_credit_note': "Avoir invalide, expiré ou déjà utilisé."})
+        credit_note = CreditNote.objects.get(code=code)
+        _attach(order, 'applied_credit_note', credit_note, "Un avoir est déjà appliqué à cette commande.")
+    return credit_note
+
+
+def redeem_promo_code(order, code):
+    """Consomme une utilisation du code promo ``code`` pour ``order`` et met à jour la remise. Retourne la promotion."""
+    now = timezone.now()
+    with transaction.atomic():
+        claimed = (
+            Promotion.objects
+            .filter(code=code, active=True, start_date__lte=now, end_date__gte=now)
+            .filter(Q(max_uses__isnull=True) | Q(uses__lt=F('max_uses')))
+            .update(uses=F('uses') + 1)
+        )
+        if not claimed:
+            raise ValidationError({'applied_promotion': "Code promo invalide, expiré ou épuisé."})
+        promotion = Promotion.objects.get(code=code)
+        if promotion.max_uses_per_customer is not None:
+            used = PromotionRedemption.objects.filter(promotion=promotion, customer_id=order.customer_id).count()
+            if used >= promotion.max_uses_per_customer:
+                raise ValidationError({'applied_promotion': "Code promo déjà utilisé par ce client."})
+        _attach(order, 'applied_promotion', promotion, "Un code promo est déjà appliqué à cette commande.")
+        PromotionRedemption.objects.create(promotion=promotion, customer_id=order.customer_id, order=order)
+    return promotion
+
+
+def _attach(order, field, value, taken_message):
+    """Rattache l'avoir ou la promotion à la commande (emplacement libre uniquement) et recalcule la remise"""
+    if not Order.objects.filter(pk=order.pk, **{f'{field}__isnull': True}).update(**{field: value}):
+        raise ValidationError({field: taken_message})
+    setattr(order, field, value)
+    order.discount_amount = order.calculate_discount().quantize(CENT)
+    Order.objects.filter(pk=order.pk).update(discount_amount=order.discount_amount)
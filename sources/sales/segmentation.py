@@ -0,0 +1,115 @@
+"""
+Segmentation RFM des clients : récence (dernière commande), fréquence
+(commandes payées), montant (CA HT cumulé des lignes, hors remises de commande).
+
+Une seule requête agrégée par client sur les lignes des commandes vendues ;
+les scores 1 à 5 sont des quintiles calculés en NumPy, séparément pour les
+particuliers et les professionnels (``is_professional``) : les comptes B2B
+commandent par volumes et écraseraient l'échelle des particuliers. Le segment
+découle du score de récence et de la moyenne fréquence / montant.
+
+Seuls les clients dont une valeur change sont réécrits (bulk_update) : après
+le premier passage, un passage nocturne n'écrit que les clients ayant commandé
+ou changé de quintile.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+
+from .margins import DEFAULT_STATUSES, LINE_REVENUE_HT
+from .archive import line_source
+from .models import Customer
+
+BINS = 5
+FIELDS = ['rfm_segment', 'rfm_score', 'paid_orders', 'lifetime_value', 'average_order_value', 'last_order_at']
+CENT = Decimal('0.01')
+
+
+def quantile_scores(values, bins=BINS):
+    """Score 1..``bins`` de chaque valeur selon son quantile (ex aequo : même score)"""
+    import numpy as np  # Dépendance optionnelle : pip install numpy
+
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return np.empty(0, dtype=np.int64)
+    below = np.searchsorted(np.sort(values), values, side='left')  # valeurs strictement inférieures
+    return 1 + below * bins // len(values)
+
+
+def segments(recency, frequency, monetary):
+    """Libellés de segment (codes Customer.SEGMENTS) à partir des scores"""
+    import numpy as np
+
+    value = (frequency + monetary) / 2
+    return np.select(
+        [
+            (recency >= 4) & (value >= 4),
+            (recency >= 3) & (value >= 3),
+            recency >= 4,
+            (recency <= 2) & (value >= 3),
+            recency <= 1,
+        ],
+        ['CHAMPION', 'LOYAL', 'PROMISING', 'AT_RISK', 'DORMANT'],
+        default='ATTENTION',
+    )
+
+
+def customer_stats(statuses=DEFAULT_STATUSES):
+    """Requête unique : (client, commandes, dernière commande, CA HT) des clients ayant commandé"""
+    # Historique complet : commandes archivées comprises
+    return (
+        line_source().objects.filter(order__status__in=statuses)
+        .values_list('order__customer_id')
+        .annotate(
+            orders=Count('order_id', distinct=True),
+            last_order_at=Max('order__created_at'),
+            revenue=Sum(LINE_REVENUE_HT),
+        )
+        .order_by()
+    )
+
+
+def segment_customers(batch_size=2000):
+    """Recalcule le segment RFM de tous les clients. Retourne un dict de métriques."""
+    import numpy as np
+
+    stats = {customer_id: rest for customer_id, *rest in customer_stats().iterator(chunk_size=20000)}
+    current = list(Customer.objects.values_list('pk', 'is_professional', *FIELDS).iterator(chunk_size=20000))
+
+    ids = np.fromiter((row[0] for row in current), dtype=np.int64, count=len(current))
+    professional = np.fromiter((row[1] for row in current), dtype=bool, count=len(current))
+    active = np.fromiter((row[0] in stats for row in current), dtype=bool, count=len(current))
+    frequency = np.zeros(len(current))
+    recency = np.zeros(len(current))
+    monetary = np.zeros(len(current))
+    for i in np.flatnonzero(active).tolist():
+        orders, last_order_at, revenue = stats[current[i][0]]
+        frequency[i], recency[i], monetary[i] = orders, last_order_at.timestamp(), revenue or 0
+
+    scores = np.zeros((len(current), 3), dtype=np.int64)
+    for population in (professional & active, ~professional & active):
+        for column, values in enumerate((recency, frequency, monetary)):
+            scores[population, column] = quantile_scores(values[population])
+    labels = np.where(active, segments(*scores.T), 'NONE')
+
+    changed = []
+    for i, (row, label, (r, f, m)) in enumerate(zip(current, labels.tolist(), scores.tolist())):
+        if active[i]:
+            orders, last_order_at, revenue = stats[row[0]]
+            revenue = Decimal(revenue or 0).quantize(CENT)
+            values = [label, f"{r}{f}{m}", orders, revenue, (revenue / orders).quantize(CENT), last_order_at]
+        else:
+            values = ['NONE', '', 0, Decimal('0.00'), Decimal('0.00'), None]
+        if list(row[2:]) != values:
+            changed.append(Customer(pk=int(ids[i]), **dict(zip(FIELDS, values))))
+
+    with transaction.atomic():
+        Customer.objects.bulk_update(changed, FIELDS, batch_size=batch_size)
+
+    return {
+        'customers': len(current),
+        'active': int(active.sum()),
+        'updated': len(changed),
+        'segments': {str(label): int(count) for label, count in zip(*np.unique(labels, return_counts=True))},
+    }
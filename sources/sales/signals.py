@@ -1,14 +1,15 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from outbox.registry import publish
 from .models import Order
+from .transitions import ON_ENTER
 
 @receiver(post_save, sender=Order)
-def update_stock_on_shipping(sender, instance, **kwargs):
-    # Si la commande vient de passer en 'SHIPPED'
-    if instance.status == 'SHIPPED':
-        for line in instance.lines.all():
-            product = line.product
-            # On déduit la quantité vendue du stock
-            product.stock_quantity -= line.quantity
-            product.save()
-        pass
\ No newline at end of file
+def publish_status_events(sender, instance, created, **kwargs):
+    # Entrée dans un statut (ex. 'SHIPPED' : déduction du stock) : l'effet de bord
+    # est traité par le worker outbox (sales.handlers), l'événement part dans la
+    # même transaction
+    topic = ON_ENTER.get(instance.status)
+    if topic and (created or instance._loaded_status != instance.status):
+        publish(topic, {'order_id': instance.pk})
+    instance._loaded_status = instance.status
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""
+Simulation d'une promotion sur l'historique des ventes (« et si ? »).
+
+Les lignes des commandes vendues sont chargées une fois en colonnes NumPy
+(commande, produit, marque, catégorie, prix TTC, quantité, TVA, coût d'achat
+à la date de la commande, date) ; l'applicabilité d'une promotion — mêmes
+règles que Promotion.is_applicable_to_product, hors dates de validité — et sa
+remise sont ensuite évaluées sur toutes les lignes d'un coup, sans requête
+par ligne. Un même historique sert à simuler plusieurs promotions.
+
+Les montants sont calculés en centimes. Une promotion automatique s'applique
+ligne à ligne (comme Order.calculate_automatic_discounts) : une remise fixe
+par unité, plafonnée au prix de l'unité. Un code promo s'applique à la
+commande entière, ciblages ignorés (comme Order.calculate_discount) : un
+pourcentage du total TTC des produits, ou une remise fixe une fois par
+commande, plafonnée à ce total ; la simulation suppose que toutes les
+commandes ont utilisé le code. La remise d'une commande est répartie sur ses
+lignes au prorata de leur montant (passage en HT au taux de chaque ligne).
+"""
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from company import money
+from procurement.models import cost_as_of
+from .archive import line_source
+from .margins import DEFAULT_STATUSES
+
+HISTORY_DAYS = 365
+
+
+class LineHistory:
+    """Lignes vendues sur ``days`` jours jusqu'à ``end`` inclus, en colonnes"""
+
+    COLUMNS = ('order', 'product', 'brand', 'category', 'price', 'quantity', 'vat', 'cost', 'created')
+
+    def __init__(self, days=HISTORY_DAYS, end=None, statuses=DEFAULT_STATUSES, using=None):
+        import numpy as np  # Dépendance optionnelle : pip install numpy
+
+        self.end = end or timezone.localdate()
+        self.start = self.end - timedelta(days=days - 1)
+
+        rows = (
+            line_source(self.start, using).objects.using(using)
+            .filter(order__status__in=statuses, order__created_at__date__range=(self.start, self.end))
+            .annotate(unit_cost=cost_as_of('product', 'order__created_at'))
+            .values_list(
+                'order_id', 'product_id', 'product__brand_id', 'product__category_id',
+                'unit_price_incl_tax', 'quantity', 'vat_rate', 'unit_cost', 'order__created_at',
+            )
+            .order_by()
+        )
+        columns = tuple([] for _ in self.COLUMNS)
+        for row in rows.iterator(chunk_size=20000):
+            for column, value in zip(columns, row):
+                column.append(value)
+        order, product, brand, category, price, quantity, vat, cost, created = columns
+
+        self.order = np.asarray(order, dtype=np.int64)
+        self.product = np.asarray(product, dtype=np.int64)
+        self.brand = np.asarray([-1 if pk is None else pk for pk in brand], dtype=np.int64)
+        self.category = np.asarray([-1 if pk is None else pk for pk in category], dtype=np.int64)
+        self.price = np.asarray([money.to_cents(value) for value in price], dtype=np.int64)
+        self.quantity = np.asarray(quantity, dtype=np.int64)
+        self.vat = np.asarray([money.rate_to_bp(value) for value in vat], dtype=np.int64)
+        self.cost = np.asarray([-1 if value is None else money.to_cents(value) for value in cost], dtype=np.int64)
+        self.created = np.asarray([value.timestamp() for value in created], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.order)
+
+    def excl_tax(self, cents_incl_tax):
+        """Montants TTC par ligne -> HT (centimes, non arrondis)"""
+        return cents_incl_tax * money.BP_SCALE / (money.BP_SCALE + self.vat)
+
+
+def applicable(history, promotion):
+    """Masque des lignes auxquelles la promotion s'appliquerait (hors dates de validité)"""
+    import numpy as np
+
+    def ids(relation):
+        return np.fromiter(relation.values_list('pk', flat=True), dtype=np.int64)
+
+    mask = ~np.isin(history.product, ids(promotion.excluded_products))
+    mask &= ~np.isin(history.category, ids(promotion.excluded_categories))
+    products, brands, categories = (
+        ids(promotion.target_products), ids(promotion.target_brands), ids(promotion.target_categories)
+    )
+    if len(products) or len(brands) or len(categories):
+        mask &= (
+            np.isin(history.product, products)
+            | np.isin(history.brand, brands)
+            | np.isin(history.category, categories)
+        )
+    return mask
+
+
+def is_code(promotion):
+    """Code promo (remise sur la commande) plutôt que promotion automatique (remise par ligne)"""
+    return promotion.promo_type == 'CODE' or bool(promotion.code)
+
+
+def line_discounts(history, promotion):
+    """Remise TTC (centimes) de chaque ligne si la promotion automatique s'appliquait à toutes"""
+    import numpy as np
+
+    value = money.to_cents(promotion.value)
+    if promotion.discount_type == 'PERCENT':
+        return np.rint(history.price * history.quantity * value / 10000).astype(np.int64)
+    return np.minimum(history.price, value) * history.quantity
+
+
+def order_discounts(history, promotion, mask):
+    """Remise TTC (centimes, non arrondis) du code promo sur chaque commande, répartie sur ses lignes ``mask``"""
+    import numpy as np
+
+    revenue = np.where(mask, history.price * history.quantity, 0)
+    _, inverse = np.unique(history.order, return_inverse=True)
+    totals = np.bincount(inverse, weights=revenue)
+    value = money.to_cents(promotion.value)
+    if promotion.discount_type == 'PERCENT':
+        per_order = np.rint(totals * value / 10000)
+    else:
+        per_order = np.minimum(totals, value)
+    order_totals = totals[inverse]
+    share = np.divide(revenue, order_totals, out=np.zeros(len(revenue)), where=order_totals > 0)
+    return per_order[inverse] * share
+
+
+def simulate(promotion, history, start=None, end=None):
+    """
+    Coût et impact sur la marge de ``promotion`` sur l'historique (éventuellement
+    restreint à [start, end], dates ou datetimes). La promotion peut être un
+    brouillon inactif, mais doit être enregistrée (ciblages M2M).
+    """
+    import numpy as np
+
+    period = np.ones(len(history), dtype=bool)
+    if start is not None:
+        period &= history.created >= _timestamp(start)
+    if end is not None:
+        period &= history.created <= _timestamp(end, end_of_day=True)
+
+    if is_code(promotion):
+        hit = period
+        discount = np.where(hit, order_discounts(history, promotion, hit), 0)
+    else:
+        hit = period & applicable(history, promotion)
+        discount = np.where(hit, line_discounts(history, promotion), 0)
+    revenue = history.price * history.quantity
+    costed = history.cost >= 0
+    margin = np.where(costed, history.excl_tax(revenue) - history.cost * history.quantity, 0)
+    discount_ht = history.excl_tax(discount)
+
+    def cents(values, mask):
+        return money.from_cents(int(np.rint(values[mask].sum())))
+
+    margin_before = cents(margin, period & costed)
+    margin_after = cents(margin - discount_ht, period & costed)
+    revenue_ht = cents(history.excl_tax(revenue), period & costed)
+    return {
+        'lines': int(period.sum()),
+        'orders': len(np.unique(history.order[period])),
+        'affected_lines': int(hit.sum()),
+        'affected_orders': len(np.unique(history.order[hit])),
+        'affected_revenue_ttc': cents(revenue, hit),
+        'discount_ttc': cents(discount, hit),
+        'discount_ht': cents(discount_ht, hit),
+        'margin_before': margin_before,
+        'margin_after': margin_after,
+        'margin_rate_before': _rate(margin_before, revenue_ht),
+        'margin_rate_after': _rate(margin_after, revenue_ht - cents(discount_ht, period & costed)),
+        'uncosted_lines': int((hit & ~costed).sum()),
+    }
+
+
+def _timestamp(value, end_of_day=False):
+    if not isinstance(value, datetime):  # date : début ou fin de journée, heure locale
+        value = timezone.make_aware(datetime.combine(value, time.max if end_of_day else time.min))
+    return value.timestamp()
+
+
+def _rate(margin, revenue):
+    return float(margin / revenue) if revenue else None
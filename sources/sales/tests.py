@@ -1,3 +1,1055 @@
-from django.test import TestCase
+import io
+import json
+import zipfile
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, models
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from company.models import TaxRate
+from company.tests import LOCAL_CACHE
+from config import db_router, query_plans
+from inventory import classification, counters
+from inventory.models import Brand, Category, Product
+from outbox.models import OutboxEvent
+from outbox.worker import process_batch
+from django.core.exceptions import ValidationError
+from sales import affinity, archive, redemption, segmentation, simulation, vat
+from sales.transitions import transition_many
+from sales.importers import OrderImporter, read_csv, read_jsonl
+from sales.margins import margin_report
+from sales.exports import CUSTOMER_EXPORT, ORDER_EXPORT
+from procurement.models import Supplier, SupplierPrice
+from sales.models import (
+    Address, ArchivedOrder, ArchivedOrderLine, Carrier, CreditNote, Customer, Order, OrderHistory, OrderLine,
+    OrderLineHistory, ProductAffinity, ProductPairCount, Promotion, PromotionRedemption, ReferenceCounter,
+    allocate_references,
+)
+
+
+def make_catalog(products=3, stock=50):
+    tva20 = TaxRate.objects.create(name="TVA 20%", rate=Decimal("20.00"), is_default=True)
+    category = Category.objects.create(name="Cameras", slug="cameras")
+    brand = Brand.objects.create(name="Nikon")
+    return [
+        Product.objects.create(
+            name=f"Produit {i}", category=category, brand=brand, tax_rate=tva20,
+            retail_price=Decimal("100.00"), stock_quantity=stock,
+        )
+        for i in range(products)
+    ]
+
+
+def make_customer(email="jean@mail.com"):
+    customer = Customer.objects.create(first_name="Jean", last_name="Dupont", email=email)
+    billing = Address.objects.create(customer=customer, address_type='BILLING', label="Bureau",
+                                     street_address="1 av des Champs", city="Paris", postal_code="75008")
+    shipping = Address.objects.create(customer=customer, address_type='SHIPPING', label="Entrepôt",
+                                      street_address="5 rue du Port", city="Lyon", postal_code="69000")
+    return customer, billing, shipping
+
+
+def make_order(customer, billing, shipping, lines, status='DRAFT'):
+    carrier, _ = Carrier.objects.get_or_create(name="DHL Express", defaults={'base_cost': Decimal("12.50")})
+    order = Order.objects.create(
+        customer=customer, billing_address=billing, shipping_address=shipping, status=status,
+        carrier=carrier, shipping_cost=carrier.base_cost, shipping_tax_rate=TaxRate.objects.first(),
+    )
+    for product, quantity in lines:
+        OrderLine.objects.create(order=order, product=product, quantity=quantity)
+    return order
+
+
+TWO_DATABASES = {
+    'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+    'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+}
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = db_router.ReplicaRouter()
+        self.token = db_router._pinned.set(False)
+
+    def tearDown(self):
+        db_router._pinned.reset(self.token)
+
+    @override_settings(DATABASES=TWO_DATABASES)
+    def test_reads_stay_on_primary_outside_designated_blocks(self):
+        self.assertIsNone(self.router.db_for_read(None))
+
+    @override_settings(DATABASES=TWO_DATABASES)
+    def test_designated_reads_go_to_replica(self):
+        with db_router.use_replica():
+            self.assertEqual(self.router.db_for_read(None), 'replica')
+        self.assertIsNone(self.router.db_for_read(None))
+
+    @override_settings(DATABASES=TWO_DATABASES)
+    def test_write_pins_to_primary(self):
+        with db_router.use_replica():
+            self.assertEqual(self.router.db_for_write(None), 'default')
+            self.assertEqual(self.router.db_for_read(None), 'default')
+            self.assertEqual(db_router.read_alias(), 'default')
+
+    @override_settings(DATABASES=TWO_DATABASES)
+    def test_cache_table_stays_on_primary_without_pinning(self):
+        from django.core.cache.backends.db import DatabaseCache
+
+        entry = DatabaseCache('django_cache', {}).cache_model_class
+        with db_router.use_replica():
+            self.assertEqual(self.router.db_for_read(entry), 'default')
+            self.assertEqual(self.router.db_for_write(entry), 'default')
+            self.assertEqual(db_router.read_alias(), 'replica')
+
+    def test_decorator_is_thread_safe(self):
+        import threading
+
+        inside, errors = threading.Barrier(2), []
+
+        @db_router.use_replica()
+        def read():
+            inside.wait()  # les deux threads dans le même bloc décoré
+            inside.wait()
+
+        def worker():
+            try:
+                read()
+            except (ValueError, RuntimeError) as e:  # jeton d'un autre thread
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    @override_settings(DATABASES={'default': TWO_DATABASES['default']})
+    def test_without_replica_everything_reads_primary(self):
+        with db_router.use_replica():
+            self.assertEqual(self.router.db_for_read(None), 'default')
+
+    @override_settings(DATABASES=TWO_DATABASES)
+    def test_middleware_pins_following_request_after_write(self):
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+
+        def write_view(request):
+            self.router.db_for_write(None)
+            return HttpResponse()
+
+        def read_view(request):
+            return HttpResponse(db_router.read_alias())
+
+        factory = RequestFactory()
+        response = db_router.replica_pinning_middleware(write_view)(factory.post('/'))
+        self.assertIn(db_router.PIN_COOKIE, response.cookies)
+        self.assertFalse(db_router.is_pinned())
+
+        request = factory.get('/')
+        request.COOKIES[db_router.PIN_COOKIE] = '1'
+        self.assertEqual(db_router.replica_pinning_middleware(read_view)(request).content, b'default')
+        self.assertEqual(db_router.replica_pinning_middleware(read_view)(factory.get('/')).content, b'replica')
+
+
+class TransitionTests(TestCase):
+    def setUp(self):
+        self.products = make_catalog()
+        self.customer, self.billing, self.shipping = make_customer()
+
+    def bulk_orders(self, count, status='PAID'):
+        orders = [make_order(self.customer, self.billing, self.shipping, [(self.products[0], 1)], status='DRAFT')]
+        # Duplication en masse de la première commande (lignes comprises)
+        template = orders[0]
+        clones = Order.objects.bulk_create([
+            Order(reference=f"BULK-{i:05d}", customer=self.customer, billing_address=self.billing,
+                  shipping_address=self.shipping, carrier=template.carrier, shipping_tax_rate=template.shipping_tax_rate,
+                  status=status)
+            for i in range(count)
+        ])
+        OrderLine.objects.bulk_create([
+            OrderLine(order=order, product=self.products[0], quantity=1,
+                      unit_price_incl_tax=Decimal("120.00"), vat_rate=Decimal("20.00"))
+            for order in clones
+        ])
+        return Order.objects.filter(pk__in=[order.pk for order in clones])
+
+    def test_single_save_rejects_illegal_transition(self):
+        order = make_order(self.customer, self.billing, self.shipping, [(self.products[0], 1)])
+        order.status = 'DELIVERED'
+        with self.assertRaises(ValidationError):
+            order.save()
+
+    def test_transition_many_query_count_is_constant(self):
+        Product.objects.update(stock_quantity=10000)
+        orders = self.bulk_orders(2000)
+        with CaptureQueriesContext(connection) as queries:
+            result = transition_many(orders, 'SHIPPED')
+        # Hors INSERT de l'outbox (découpés selon le backend) : nombre fixe de requêtes
+        statements = [q['sql'] for q in queries.captured_queries if 'INSERT INTO "outbox_outboxevent"' not in q['sql']]
+        self.assertLessEqual(len(statements), 8)
+        self.assertEqual(result['updated'], 2000)
+        self.assertEqual(Order.objects.filter(status='SHIPPED').count(), 2000)
+        self.assertEqual(OutboxEvent.objects.filter(topic='order.shipped').count(), 2000)
+        process_batch(batch_size=5000)
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock_quantity, 8000)
+
+    def test_illegal_and_already_done_orders(self):
+        orders = self.bulk_orders(3, status='DRAFT')
+        with self.assertRaises(ValidationError):
+            transition_many(orders, 'SHIPPED')
+        result = transition_many(orders, 'SHIPPED', strict=False)
+        self.assertEqual((result['updated'], len(result['rejected'])), (0, 3))
+        transition_many(orders, 'PAID')
+        self.assertEqual(transition_many(orders, 'PAID')['skipped'], 3)
+
+    def test_stock_shortage_blocks_shipping(self):
+        orders = self.bulk_orders(60)  # 60 > stock de 50
+        with self.assertRaises(ValidationError):
+            transition_many(orders, 'SHIPPED')
+        self.assertFalse(Order.objects.filter(status='SHIPPED').exists())
+
+    def test_queued_shipments_count_against_stock(self):
+        p1, p2, _ = self.products
+        Product.objects.filter(pk=p1.pk).update(stock_quantity=5)
+        first, second, other = [
+            make_order(self.customer, self.billing, self.shipping, lines, status='PAID')
+            for lines in ([(p1, 4)], [(p1, 4)], [(p2, 1)])
+        ]
+        transition_many(Order.objects.filter(pk=first.pk), 'SHIPPED')
+        # Le worker n'est pas passé : les 4 unités expédiées sont encore au compteur
+        with self.assertRaisesMessage(ValidationError, p1.name):
+            transition_many(Order.objects.filter(pk=second.pk), 'SHIPPED')
+        transition_many(Order.objects.filter(pk=other.pk), 'SHIPPED')
+
+        stats = process_batch()
+        self.assertEqual(stats['failed'], 0)
+        self.assertEqual(Order.objects.get(pk=second.pk).status, 'PAID')
+        p1.refresh_from_db()
+        self.assertEqual(p1.stock_quantity, 1)
+
+    def test_sharded_stock_is_still_checked(self):
+        p1 = self.products[0]
+        p1.stock_shards = 4
+        p1.save()
+        order = make_order(self.customer, self.billing, self.shipping, [(p1, 40)], status='PAID')
+        counters.decrement({p1.pk: 20})  # 30 disponibles, répartis entre compteur et shards
+        with self.assertRaisesMessage(ValidationError, p1.name):
+            transition_many(Order.objects.filter(pk=order.pk), 'SHIPPED')
+
+
+@skipUnlessDBFeature('has_select_for_update_nowait')
+class ShipmentLockTests(TransactionTestCase):
+    """Expéditions concurrentes : seuls les produits à compteur simple sont verrouillés"""
+
+    def test_sharded_product_shipments_do_not_block(self):
+        import threading
+        import time
+        from django.db import DatabaseError, transaction
+        from sales import transitions
+
+        hot, plain = make_catalog(products=2)
+        Product.objects.filter(pk=hot.pk).update(stock_shards=4)
+        customer = make_customer()
+        first = make_order(*customer, [(hot, 1), (plain, 1)], status='PAID')
+        second = make_order(*customer, [(hot, 1)], status='PAID')
+        held, release = threading.Event(), threading.Event()
+
+        def ship_first():
+            try:
+                with transaction.atomic():
+                    transitions._check_stock([first.pk])
+                    held.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=ship_first)
+        thread.start()
+        try:
+            self.assertTrue(held.wait(5))
+            started = time.monotonic()
+            with transaction.atomic():
+                transitions._check_stock([second.pk])  # n'attend pas la première expédition
+                Product.objects.select_for_update(nowait=True).filter(pk=hot.pk).exists()
+                with self.assertRaises(DatabaseError), transaction.atomic():
+                    Product.objects.select_for_update(nowait=True).filter(pk=plain.pk).exists()
+            self.assertLess(time.monotonic() - started, 2)
+        finally:
+            release.set()
+            thread.join()
+
+
+class ImportOrdersTests(TestCase):
+    def setUp(self):
+        self.products = make_catalog()
+        Product.objects.filter(pk=self.products[1].pk).update(sku="NK-Z6")
+        self.customer, self.billing, self.shipping = make_customer()
+        Carrier.objects.create(name="DHL Express", base_cost=Decimal("12.50"))
+
+    def test_jsonl_batches_and_rejections(self):
+        rows = [
+            {"customer_email": "jean@mail.com", "carrier": "DHL Express",
+             "lines": [{"product_id": self.products[0].pk, "quantity": 2}, {"sku": "NK-Z6", "quantity": 1, "unit_price_incl_tax": "99.90"}]},
+            {"customer_email": "inconnu@mail.com", "carrier": "DHL Express", "lines": [{"sku": "NK-Z6", "quantity": 1}]},
+            {"customer_email": "jean@mail.com", "carrier": "DHL Express", "lines": [{"sku": "NK-Z6", "quantity": 999}]},
+        ]
+        errors = io.StringIO()
+        stream = io.StringIO("\n".join(json.dumps(row) for row in rows * 3) + "\n{oops\n")
+        stats = OrderImporter(errors, batch_size=2).run(read_jsonl(stream))
+
+        self.assertEqual((stats['orders'], stats['lines'], stats['rejected']), (3, 6, 7))
+        order = Order.objects.order_by('id').last()
+        self.assertEqual(order.reference, f"DP-{order.created_at.year}-{order.id:04d}")
+        self.assertEqual(order.billing_address, self.billing)
+        self.assertEqual(sorted(line.unit_price_incl_tax for line in order.lines.all()), [Decimal("99.90"), Decimal("120.00")])
+        self.assertEqual(len(errors.getvalue().splitlines()), 7)
+
+    def test_csv_groups_lines_by_order_key(self):
+        stream = io.StringIO(
+            "order_key,customer_email,carrier,product_id,sku,quantity\n"
+            f"A,jean@mail.com,DHL Express,{self.products[0].pk},,1\n"
+            "A,jean@mail.com,DHL Express,,NK-Z6,3\n"
+            f"B,jean@mail.com,DHL Express,{self.products[2].pk},,1\n"
+        )
+        stats = OrderImporter().run(read_csv(stream))
+        self.assertEqual((stats['orders'], stats['lines']), (2, 3))
+
+    def test_stock_is_checked_across_rows(self):
+        line = {"sku": "NK-Z6", "quantity": 30}
+        rows = [{"customer_email": "jean@mail.com", "carrier": "DHL Express", "lines": [line]} for _ in range(2)]
+        rows.append({"customer_email": "jean@mail.com", "lines": [{"sku": "NK-Z6", "quantity": 20}]})
+        errors = io.StringIO()
+        stats = OrderImporter(errors, batch_size=10).run(iter(rows))
+        self.assertEqual((stats['orders'], stats['rejected']), (2, 1))  # 30 + 30 > 50 ; 30 + 20 passe
+        self.assertIn("Stock insuffisant", errors.getvalue())
+        without_carrier = Order.objects.get(carrier__isnull=True)
+        self.assertEqual(without_carrier.shipping_cost, Decimal("0.00"))
+
+    def test_paid_orders_publish_events(self):
+        rows = [
+            {"customer_email": "jean@mail.com", "carrier": "DHL Express", "lines": [{"sku": "NK-Z6", "quantity": 1}]},
+            {"customer_email": "jean@mail.com", "carrier": "DHL Express", "status": "DRAFT",
+             "lines": [{"sku": "NK-Z6", "quantity": 1}]},
+        ]
+        OrderImporter().run(iter(rows))
+        paid = Order.objects.get(status='PAID')
+        self.assertEqual(list(OutboxEvent.objects.values_list('topic', 'payload')), [('order.paid', {'order_id': paid.pk})])
+
+
+class MarginReportTests(TestCase):
+    def setUp(self):
+        self.products = make_catalog()
+        self.customer, self.billing, self.shipping = make_customer()
+        supplier = Supplier.objects.create(name="Global Supplier", email="sales@global.com")
+        for product, cost in zip(self.products, (Decimal("50.00"), Decimal("80.00"))):
+            SupplierPrice.objects.create(product=product, supplier=supplier, price=cost, is_preferred=True)
+
+    def test_margin_rank_and_share(self):
+        p1, p2, p3 = self.products
+        make_order(self.customer, self.billing, self.shipping, [(p1, 2), (p2, 1)], status='PAID')
+        make_order(self.customer, self.billing, self.shipping, [(p3, 1)], status='PAID')
+        make_order(self.customer, self.billing, self.shipping, [(p1, 5)])  # DRAFT : exclue
+
+        rows = {row['key']: row for row in margin_report()}
+        self.assertEqual(round(rows[p1.pk]['revenue_ht'], 2), Decimal("200.00"))
+        self.assertEqual(round(rows[p1.pk]['cost'], 2), Decimal("100.00"))
+        self.assertEqual(round(rows[p1.pk]['margin'], 2), Decimal("100.00"))
+        self.assertEqual(rows[p1.pk]['rank'], 1)
+        self.assertEqual(rows[p2.pk]['rank'], 2)
+        self.assertAlmostEqual(rows[p1.pk]['share'], 0.5)
+        self.assertEqual(rows[p3.pk]['uncosted_lines'], 1)
+
+        by_brand = list(margin_report(group_by='brand'))
+        self.assertEqual(len(by_brand), 1)
+        self.assertAlmostEqual(by_brand[0]['share'], 1.0)
+
+    def test_order_discount_is_allocated_to_lines(self):
+        p1, p2, _ = self.products
+        order = make_order(self.customer, self.billing, self.shipping, [(p1, 3), (p2, 1)], status='PAID')
+        Order.objects.filter(pk=order.pk).update(discount_amount=Decimal("48.00"))  # TTC, 3/4 sur p1
+
+        rows = {row['key']: row for row in margin_report()}
+        self.assertEqual(round(rows[p1.pk]['revenue_ht'], 2), Decimal("270.00"))  # 300 - 36 TTC / 1,2
+        self.assertEqual(round(rows[p2.pk]['revenue_ht'], 2), Decimal("90.00"))
+        self.assertEqual(round(rows[p1.pk]['margin'], 2), Decimal("120.00"))
+
+
+class ReportViewTests(TestCase):
+    def setUp(self):
+        self.products = make_catalog()
+        self.customer, self.billing, self.shipping = make_customer()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'x')
+
+    async def csv_rows(self, url):
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        return [line.split(';') for line in content.splitlines()]
+
+    def test_stats(self):
+        p1, p2, _ = self.products
+        make_order(self.customer, self.billing, self.shipping, [(p1, 1), (p2, 1)], status='PAID')
+        make_order(self.customer, self.billing, self.shipping, [(p1, 2)])
+        Product.objects.filter(pk=p2.pk).update(stock_quantity=1)
+
+        self.client.force_login(self.admin)
+        data = self.client.get('/sales/reports/stats/').json()
+        self.assertEqual(Decimal(data.pop('ca_month')), Decimal("240.00"))
+        self.assertEqual(data, {'low_stock': 1, 'pending_orders': 1})
+
+    async def test_orders_csv_totals_match_invoices(self):
+        p1, p2, p3 = self.products
+        make = sync_to_async(make_order)
+        paid = await make(self.customer, self.billing, self.shipping, [(p1, 3), (p2, 1)], status='PAID')
+        await Order.objects.filter(pk=paid.pk).aupdate(discount_amount=Decimal("10.00"))
+        old = await make(self.customer, self.billing, self.shipping, [(p3, 2)], status='DELIVERED')
+        await Order.objects.filter(pk=old.pk).aupdate(created_at=timezone.now() - timezone.timedelta(days=800))
+        expected = {}
+        for order in [order async for order in Order.objects.all()]:
+            totals = await sync_to_async(order.get_totals)()
+            expected[order.reference] = [str(totals[key]) for key in ('total_ht', 'total_vat', 'grand_total_ttc')]
+        await sync_to_async(archive.archive_orders)()
+
+        await self.async_client.aforce_login(self.admin)
+        rows = await self.csv_rows('/sales/reports/orders.csv?status=PAID')
+        self.assertEqual(rows[0][-3:], ['total_ht', 'total_tva', 'total_ttc'])
+        self.assertEqual({row[0]: row[-3:] for row in rows[1:]}, {paid.reference: expected[paid.reference]})
+
+        # Période remontant à l'archive : commande archivée lue par la vue OrderHistory, avec ses lignes
+        start = (timezone.now() - timezone.timedelta(days=900)).date().isoformat()
+        rows = await self.csv_rows(f'/sales/reports/orders.csv?from={start}')
+        self.assertEqual({row[0]: row[-3:] for row in rows[1:]}, expected)
+
+    async def test_orders_csv_rejects_bad_filters(self):
+        await self.async_client.aforce_login(self.admin)
+        for query in ('from=2025-13-01', 'to=hier', 'status=PERDU'):
+            response = await self.async_client.get(f'/sales/reports/orders.csv?{query}')
+            self.assertEqual(response.status_code, 400)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.products = make_catalog()
+        self.customer, self.billing, self.shipping = make_customer()
+
+    def test_totals_match_get_totals(self):
+        p1, p2, p3 = self.products
+        orders = [
+            make_order(self.customer, self.billing, self.shipping, [(p1, 3), (p2, 1)]),
+            make_order(self.customer, self.billing, self.shipping, [(p3, 7)]),
+            make_order(self.customer, self.billing, self.shipping, []),
+        ]
+        Order.objects.filter(pk=orders[0].pk).update(discount_amount=Decimal("10.00"))
+
+        header = ORDER_EXPORT.header
+        rows = {row[0]: dict(zip(header, row)) for row in ORDER_EXPORT.rows(Order.objects.all())}
+        for order in Order.objects.all():
+            totals = order.get_totals()
+            self.assertEqual(rows[order.pk]["Total HT"], totals['total_ht'])
+            self.assertEqual(rows[order.pk]["Total TVA"], totals['total_vat'])
+            self.assertEqual(rows[order.pk]["Total TTC"], totals['grand_total_ttc'])
+            self.assertEqual(rows[order.pk]["Client email"], "jean@mail.com")
+
+    def test_half_cent_lines_and_default_shipping_rate(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            TaxRate.objects.update(is_default=False)
+            TaxRate.objects.create(name="TVA 10%", rate=Decimal("10.00"), is_default=True)
+        order = make_order(self.customer, self.billing, self.shipping, [(self.products[0], 3)])
+        # 3 x 19,99 TTC à 20 % : HT exact à 49,975, arrondi de la facture à 49,97
+        OrderLine.objects.filter(order=order).update(unit_price_incl_tax=Decimal("19.99"))
+        Order.objects.filter(pk=order.pk).update(shipping_tax_rate=None, shipping_cost=Decimal("5.05"))
+
+        totals = Order.objects.get(pk=order.pk).get_totals()
+        self.assertEqual(totals['total_ht'], Decimal("55.02"))
+        header = ORDER_EXPORT.header
+        row = dict(zip(header, next(ORDER_EXPORT.rows(Order.objects.all()))))
+        self.assertEqual([row["Total HT"], row["Total TVA"], row["Total TTC"]],
+                         [totals['total_ht'], totals['total_vat'], totals['grand_total_ttc']])
+
+    def test_csv_and_xlsx_are_streamed(self):
+        make_order(self.customer, self.billing, self.shipping, [(self.products[0], 1)])
+
+        response = CUSTOMER_EXPORT.csv_response(Customer.objects.all())
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[1].split(';')[-1], '1')
+
+        response = ORDER_EXPORT.xlsx_response(Order.objects.all())
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 2)
+        self.assertIn('Dupont', sheet)
+
+
+class AdminFormQueryTests(TestCase):
+    def setUp(self):
+        self.products = make_catalog(products=12)
+        self.customer, self.billing, self.shipping = make_customer()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+
+    def change_page_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_order_form_cost_does_not_grow_with_lines(self):
+        small = make_order(self.customer, self.billing, self.shipping, [(p, 1) for p in self.products[:2]])
+        large = make_order(self.customer, self.billing, self.shipping, [(p, 1) for p in self.products])
+
+        self.change_page_queries(f'/admin/sales/order/{small.pk}/change/')  # caches (référence, session)
+        small_count, _ = self.change_page_queries(f'/admin/sales/order/{small.pk}/change/')
+        large_count, response = self.change_page_queries(f'/admin/sales/order/{large.pk}/change/')
+        self.assertEqual(small_count, large_count)
+        self.assertContains(response, 'data-ajax--url')
+        self.assertNotContains(response, f'<option value="{self.products[-1].pk}">', html=False)
+        self.assertContains(response, str(self.products[-1]))  # libellé de la ligne préchargé
+
+    def test_promotion_form_uses_autocomplete(self):
+        promotion = Promotion.objects.create(
+            name="Flash", promo_type='STORE_WIDE', discount_type='PERCENT', value=Decimal("10.00"),
+            start_date=timezone.now(), end_date=timezone.now(),
+        )
+        promotion.target_products.set(self.products[:3])
+        _, response = self.change_page_queries(f'/admin/sales/promotion/{promotion.pk}/change/')
+        self.assertContains(response, 'data-ajax--url', count=5)
+        self.assertNotContains(response, str(self.products[-1]))
+
+
+class AffinityTests(TestCase):
+    def setUp(self):
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            self.skipTest("numpy non installé")
+        cache.clear()
+        self.body, self.lens, self.bag, self.strap = make_catalog(products=4)
+        self.customer = make_customer()
+        for _ in range(3):
+            make_order(*self.customer, [(self.body, 1), (self.lens, 1)], status='PAID')
+        make_order(*self.customer, [(self.body, 1), (self.lens, 1), (self.bag, 1)], status='PAID')
+        make_order(*self.customer, [(self.strap, 1), (self.body, 1)])  # brouillon : ignoré
+        OutboxEvent.objects.all().delete()
+
+    def snapshot(self):
+        return (
+            list(ProductPairCount.objects.order_by('product_a', 'product_b').values_list('product_a', 'product_b', 'orders')),
+            list(ProductAffinity.objects.order_by('product', 'rank').values_list('product', 'related', 'co_orders', 'lift')),
+        )
+
+    def test_basket_pairs(self):
+        a, b = affinity.basket_pairs([1, 1, 1, 2, 2], [3, 5, 7, 3, 5])
+        self.assertEqual(list(zip(a.tolist(), b.tolist())), [
+            (3, 3), (3, 5), (3, 7), (5, 5), (5, 7), (7, 7), (3, 3), (3, 5), (5, 5),
+        ])
+
+    def test_rebuild(self):
+        self.assertEqual(affinity.rebuild(), {'orders': 4, 'pairs': 6, 'affinities': 2})
+        top = ProductAffinity.objects.get(product=self.body)
+        self.assertEqual((top.related_id, top.co_orders, top.confidence, top.lift), (self.lens.pk, 4, 1.0, 1.0))
+        self.assertFalse(ProductAffinity.objects.filter(product=self.bag).exists())  # 1 commande < minimum
+
+    def test_paid_orders_are_added_incrementally(self):
+        affinity.rebuild()
+        drafts = [make_order(*self.customer, [(self.bag, 1), (self.body, 1)]) for _ in range(2)]
+        transition_many(Order.objects.filter(pk__in=[order.pk for order in drafts]), 'PAID')
+        self.assertEqual(process_batch()['processed'], 2)
+        incremental = self.snapshot()
+        self.assertIn((self.body.pk, self.bag.pk, 3, 1.0), incremental[1])
+
+        affinity.rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+    @override_settings(CACHES=LOCAL_CACHE)
+    def test_lookup_is_cached_and_invalidated(self):
+        affinity.rebuild()
+        with self.assertNumQueries(1):
+            self.assertEqual([row['product_id'] for row in affinity.related_products(self.lens.pk)], [self.body.pk])
+        with self.assertNumQueries(0):
+            affinity.related_products(self.lens.pk)
+
+        order = make_order(*self.customer, [(self.lens, 1), (self.bag, 1)], status='PAID')
+        with self.captureOnCommitCallbacks(execute=True):
+            affinity.add_orders([order.pk])
+        related = affinity.related_products(self.lens.pk)
+        self.assertEqual([row['product_id'] for row in related], [self.body.pk, self.bag.pk])
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        response = self.client.get(f'/sales/products/{self.lens.pk}/related/?limit=1')
+        self.assertEqual([row['product_id'] for row in response.json()['related']], [self.body.pk])
+
+
+class SegmentationTests(TestCase):
+    def setUp(self):
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            self.skipTest("numpy non installé")
+
+    def test_quantile_scores(self):
+        self.assertEqual(segmentation.quantile_scores([10, 20, 20, 30, 40]).tolist(), [1, 2, 2, 4, 5])
+        self.assertEqual(segmentation.quantile_scores([]).tolist(), [])
+
+    def test_segment_customers(self):
+        product, = make_catalog(products=1)
+        regular, occasional, idle = (make_customer(f"{name}@mail.com") for name in ('a', 'b', 'c'))
+        for _ in range(3):
+            make_order(*regular, [(product, 2)], status='DELIVERED')
+        old = make_order(*occasional, [(product, 1)], status='PAID')
+        Order.objects.filter(pk=old.pk).update(created_at=timezone.now() - timezone.timedelta(days=400))
+        make_order(*idle, [(product, 5)])  # brouillon : ignoré
+
+        stats = segmentation.segment_customers()
+        self.assertEqual((stats['customers'], stats['active'], stats['updated']), (3, 2, 3))
+        regular, occasional, idle = (Customer.objects.get(pk=customer.pk) for customer, *_ in (regular, occasional, idle))
+        self.assertEqual((regular.paid_orders, regular.lifetime_value, regular.average_order_value),
+                         (3, Decimal('600.00'), Decimal('200.00')))
+        self.assertEqual((regular.rfm_segment, regular.rfm_score), ('LOYAL', '333'))  # 2 clients seulement : quintiles 1 et 3
+        self.assertEqual((occasional.rfm_segment, occasional.rfm_score), ('DORMANT', '111'))
+        self.assertEqual((idle.rfm_segment, idle.paid_orders, idle.last_order_at), ('NONE', 0, None))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(segmentation.segment_customers()['updated'], 0)
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith('UPDATE')])
+
+
+class PromotionSimulationTests(TestCase):
+    def setUp(self):
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            self.skipTest("numpy non installé")
+        self.products = make_catalog()
+        customer = make_customer()
+        supplier = Supplier.objects.create(name="Global Supplier", email="sales@global.com")
+        for product, cost in zip(self.products, (Decimal("50.00"), Decimal("80.00"))):
+            SupplierPrice.objects.create(product=product, supplier=supplier, price=cost, is_preferred=True)
+        p1, p2, p3 = self.products
+        make_order(*customer, [(p1, 2), (p2, 1)], status='PAID')
+        make_order(*customer, [(p3, 1)], status='DELIVERED')
+        make_order(*customer, [(p1, 5)])  # brouillon : ignoré
+
+    def make_promotion(self, discount_type, value, code=None, **relations):
+        now = timezone.now()
+        promotion = Promotion.objects.create(
+            name="Soldes", promo_type='CODE' if code else 'STORE_WIDE', code=code,
+            discount_type=discount_type, value=value,
+            start_date=now + timezone.timedelta(days=30), end_date=now + timezone.timedelta(days=60), active=False,
+        )
+        for name, objects in relations.items():
+            getattr(promotion, name).set(objects)
+        return promotion
+
+    def test_matches_is_applicable_to_product(self):
+        p1, p2, p3 = self.products
+        history = simulation.LineHistory()
+        promotion = self.make_promotion('PERCENT', Decimal("10"), target_brands=[p1.brand], excluded_products=[p2])
+        Promotion.objects.filter(pk=promotion.pk).update(active=True, start_date=timezone.now() - timezone.timedelta(days=1))
+        promotion.refresh_from_db()
+        expected = [promotion.is_applicable_to_product(product) for product in (p1, p2, p3)]
+        mask = simulation.applicable(history, promotion)
+        self.assertEqual([bool(mask[history.product == product.pk].all()) for product in (p1, p2, p3)], expected)
+
+    def test_percent_on_targeted_product(self):
+        p1, p2, p3 = self.products
+        promotion = self.make_promotion('PERCENT', Decimal("10"), target_products=[p1])
+        with self.assertNumQueries(7):  # horizon de l'archive + historique + 5 ciblages
+            result = simulation.simulate(promotion, simulation.LineHistory())
+        self.assertEqual((result['lines'], result['orders'], result['affected_orders']), (3, 2, 1))
+        self.assertEqual((result['discount_ttc'], result['discount_ht']), (Decimal("24.00"), Decimal("20.00")))
+        self.assertEqual((result['margin_before'], result['margin_after']), (Decimal("120.00"), Decimal("100.00")))
+        self.assertAlmostEqual(result['margin_rate_after'], 100 / 280)
+
+    def test_fixed_discount_is_capped_and_exclusions_apply(self):
+        p1, p2, p3 = self.products
+        history = simulation.LineHistory()
+        result = simulation.simulate(self.make_promotion('FIXED', Decimal("150"), excluded_products=[p2]), history)
+        self.assertEqual((result['affected_lines'], result['affected_orders']), (2, 2))
+        self.assertEqual(result['discount_ttc'], Decimal("360.00"))  # plafonnée à 120 € l'unité
+        self.assertEqual(result['margin_after'], Decimal("-80.00"))
+        self.assertEqual(result['uncosted_lines'], 1)
+
+        tomorrow = timezone.localdate() + timezone.timedelta(days=1)
+        self.assertEqual(simulation.simulate(self.make_promotion('FIXED', Decimal("1")), history, start=tomorrow)['lines'], 0)
+
+    def test_code_applies_per_order_and_ignores_targets(self):
+        history = simulation.LineHistory()
+        fixed = simulation.simulate(self.make_promotion('FIXED', Decimal("150"), code="BIENVENUE",
+                                                        target_products=[self.products[0]]), history)
+        self.assertEqual((fixed['affected_lines'], fixed['affected_orders']), (3, 2))
+        # 150 € sur la première commande, plafonnée à 120 € sur la seconde
+        self.assertEqual((fixed['discount_ttc'], fixed['discount_ht']), (Decimal("270.00"), Decimal("225.00")))
+
+        percent = simulation.simulate(self.make_promotion('PERCENT', Decimal("10"), code="DIX",
+                                                          target_products=[self.products[0]]), history)
+        self.assertEqual(percent['discount_ttc'], Decimal("48.00"))  # 10 % de 360 + 10 % de 120
+
+    def test_admin_action(self):
+        promotion = self.make_promotion('PERCENT', Decimal("10"), target_products=[self.products[0]])
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        response = self.client.post('/admin/sales/promotion/', {
+            'action': 'simulate_last_year', '_selected_action': [promotion.pk],
+        }, follow=True)
+        self.assertContains(response, "Soldes: 1/2 orders, discount 24.00 € TTC (20.00 € HT)")
+
+
+class VatBreakdownTests(TestCase):
+    def setUp(self):
+        p1, p2 = make_catalog(products=2)
+        tva55 = TaxRate.objects.create(name="TVA 5.5%", rate=Decimal("5.50"))
+        book = Product.objects.create(name="Livre", category=p1.category, brand=p1.brand, tax_rate=tva55,
+                                      retail_price=Decimal("10.00"), stock_quantity=50)
+        customer = make_customer()
+        self.order = make_order(*customer, [(p1, 1)], status='PAID')
+        OrderLine.objects.create(order=self.order, product=book, quantity=2, unit_price_incl_tax=Decimal("10.55"))
+        Order.objects.filter(pk=self.order.pk).update(discount_amount=Decimal("10.00"))
+        self.order.refresh_from_db()
+        make_order(*customer, [(p2, 1)], status='SHIPPED')
+        make_order(*customer, [(p2, 3)])  # brouillon : ignoré
+
+    def rates(self, totals):
+        return [(row['rate'], row['base'], row['vat']) for row in totals['rates']]
+
+    def test_order_breakdown(self):
+        self.order.get_totals()  # charge le cache de référence
+        with self.assertNumQueries(1):
+            totals = vat.order_breakdown(self.order)
+        # Remise de 10 € répartie 8,50 € / 1,50 € ; port 12,50 € HT au taux de 20 %
+        self.assertEqual(self.rates(totals), [
+            (Decimal("5.50"), Decimal("18.58"), Decimal("1.02")),
+            (Decimal("20.00"), Decimal("105.42"), Decimal("21.08")),
+        ])
+        self.assertEqual(totals['grand_total_ttc'], self.order.get_totals()['grand_total_ttc'])
+
+    def test_period_breakdown(self):
+        totals = vat.period_breakdown(end=timezone.localdate())
+        self.assertEqual(self.rates(totals), [
+            (Decimal("5.50"), Decimal("18.58"), Decimal("1.02")),
+            (Decimal("20.00"), Decimal("217.92"), Decimal("43.58")),
+        ])
+        self.assertEqual(totals['grand_total_ttc'], Decimal("281.10"))
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        self.assertContains(self.client.get('/sales/reports/vat/'), "43.58 €")
+
+
+def make_promo_code(code="WELCOME", **limits):
+    now = timezone.now()
+    return Promotion.objects.create(
+        name="Bienvenue", promo_type='CODE', code=code, discount_type='FIXED', value=Decimal("10.00"),
+        start_date=now - timezone.timedelta(days=1), end_date=now + timezone.timedelta(days=1), **limits,
+    )
+
+
+def make_credit_note(customer, code="AV-TEST", amount=Decimal("50.00")):
+    return CreditNote.objects.create(customer=customer, amount=amount, code=code,
+                                     expiry_date=timezone.localdate() + timezone.timedelta(days=30))
+
+
+class RedemptionTests(TestCase):
+    def setUp(self):
+        self.product, = make_catalog(products=1)
+        self.customer = make_customer()
+
+    def order(self, customer=None):
+        return make_order(*(customer or self.customer), [(self.product, 1)])
+
+    def test_credit_note_is_used_once(self):
+        note = make_credit_note(self.customer[0])
+        order = self.order()
+        redemption.redeem_credit_note(order, note.code)
+        order.refresh_from_db()
+        self.assertEqual((order.applied_credit_note_id, order.discount_amount), (note.pk, Decimal("50.00")))
+        note.refresh_from_db()
+        self.assertTrue(note.is_used and note.used_at)
+
+        with self.assertRaises(ValidationError):
+            redemption.redeem_credit_note(self.order(), note.code)
+        other = make_credit_note(make_customer("paul@mail.com")[0], code="AV-OTHER")
+        with self.assertRaises(ValidationError):  # avoir d'un autre client
+            redemption.redeem_credit_note(self.order(), other.code)
+        other.refresh_from_db()
+        self.assertFalse(other.is_used)
+
+    def test_promo_code_limits(self):
+        promotion = make_promo_code(max_uses=3, max_uses_per_customer=2)
+        for _ in range(2):
+            redemption.redeem_promo_code(self.order(), promotion.code)
+        with self.assertRaisesMessage(ValidationError, "déjà utilisé par ce client"):
+            redemption.redeem_promo_code(self.order(), promotion.code)
+        promotion.refresh_from_db()
+        self.assertEqual(promotion.uses, 2)  # échec annulé, compteur compris
+
+        paul = make_customer("paul@mail.com")
+        redemption.redeem_promo_code(self.order(paul), promotion.code)
+        with self.assertRaisesMessage(ValidationError, "épuisé"):
+            redemption.redeem_promo_code(self.order(paul), promotion.code)
+        self.assertEqual(PromotionRedemption.objects.filter(promotion=promotion).count(), 3)
+
+    def test_attachments_must_be_redeemed(self):
+        note, promotion = make_credit_note(self.customer[0]), make_promo_code()
+        order = self.order()
+        order.applied_credit_note, order.applied_promotion = note, promotion
+        with self.assertRaises(ValidationError) as raised:
+            order.save()
+        self.assertEqual(set(raised.exception.message_dict), {'applied_credit_note', 'applied_promotion'})
+
+        order = self.order()
+        redemption.redeem_credit_note(order, note.code)
+        redemption.redeem_promo_code(order, promotion.code)
+        order.status = 'PAID'
+        order.save()  # rattachements réclamés : la commande reste modifiable
+
+    def test_order_keeps_its_first_code(self):
+        order = self.order()
+        redemption.redeem_promo_code(order, make_promo_code().code)
+        self.assertEqual(Order.objects.get(pk=order.pk).discount_amount, Decimal("10.00"))
+        second = make_promo_code(code="AGAIN")
+        with self.assertRaisesMessage(ValidationError, "déjà appliqué"):
+            redemption.redeem_promo_code(order, second.code)
+        second.refresh_from_db()
+        self.assertEqual(second.uses, 0)
+
+
+class RedemptionConcurrencyTests(TransactionTestCase):
+    """Nombreuses tentatives simultanées : chaque avoir / utilisation n'est consommé qu'une fois"""
+    THREADS = 16
+    ATTEMPTS = 10
+
+    def setUp(self):
+        self.product, = make_catalog(products=1, stock=10 ** 6)
+        self.customers = [make_customer(f"client{i}@mail.com") for i in range(self.THREADS)]
+
+    def hammer(self, redeem, code):
+        """Chaque thread crée ses commandes et tente ATTEMPTS consommations ; retourne le nombre de succès"""
+        import threading
+        import time
+        from django.db import OperationalError, connection
+
+        orders = [[make_order(*customer, [(self.product, 1)]) for _ in range(self.ATTEMPTS)]
+                  for customer in self.customers]
+        successes, lock, barrier = [], threading.Lock(), threading.Barrier(self.THREADS)
+
+        def worker(own_orders):
+            try:
+                barrier.wait()
+                for order in own_orders:
+                    while True:
+                        try:
+                            redeem(order, code)
+                            with lock:
+                                successes.append(order.pk)
+                        except ValidationError:
+                            pass
+                        except OperationalError:  # SQLite : base verrouillée par un autre écrivain
+                            time.sleep(0.001)
+                            continue
+                        break
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(own,)) for own in orders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return successes
+
+    def test_credit_note_exactly_once(self):
+        note = make_credit_note(self.customers[0][0])
+        self.customers = [self.customers[0]] * self.THREADS  # le même client sur tous les threads
+        successes = self.hammer(redemption.redeem_credit_note, note.code)
+        self.assertEqual(len(successes), 1)
+        self.assertEqual(Order.objects.filter(applied_credit_note=note).count(), 1)
+
+    def test_promo_code_limits_hold(self):
+        promotion = make_promo_code(max_uses=30, max_uses_per_customer=3)
+        successes = self.hammer(redemption.redeem_promo_code, promotion.code)
+        promotion.refresh_from_db()
+        self.assertEqual(len(successes), 30)
+        self.assertEqual(promotion.uses, 30)
+        self.assertEqual(Order.objects.filter(applied_promotion=promotion).count(), 30)
+        per_customer = PromotionRedemption.objects.values('customer').annotate(n=models.Count('id'))
+        self.assertLessEqual(max(row['n'] for row in per_customer), 3)
+
+
+class ReferenceAllocationTests(TransactionTestCase):
+    def test_concurrent_allocations_are_disjoint(self):
+        import threading
+        import time
+        from django.db import OperationalError, connection
+
+        blocks, lock, barrier = [], threading.Lock(), threading.Barrier(8)
+
+        def worker():
+            try:
+                barrier.wait()
+                for _ in range(10):
+                    while True:
+                        try:
+                            block = allocate_references(5)
+                        except OperationalError:  # SQLite : base verrouillée par un autre écrivain
+                            time.sleep(0.001)
+                            continue
+                        break
+                    with lock:
+                        blocks.extend(block)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(blocks), 400)
+        self.assertEqual(len(set(blocks)), 400)
+        self.assertEqual(ReferenceCounter.objects.get().value, 400)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        p1, p2 = make_catalog(products=2)
+        SupplierPrice.objects.create(product=p1, supplier=Supplier.objects.create(name="Nikon FR", email="a@b.fr"),
+                                     price=Decimal("40.00"), is_preferred=True)
+        self.customer = make_customer()
+        old = timezone.now() - timezone.timedelta(days=500)
+        self.delivered = make_order(*self.customer, [(p1, 2), (p2, 1)], status='DELIVERED')
+        redemption.redeem_promo_code(self.delivered, make_promo_code().code)
+        self.cancelled = make_order(*self.customer, [(p2, 1)], status='CANCELLED')
+        self.paid = make_order(*self.customer, [(p1, 1)], status='PAID')  # ancienne mais pas close
+        Order.objects.filter(pk__in=[self.delivered.pk, self.cancelled.pk, self.paid.pk]).update(created_at=old)
+        self.recent = make_order(*self.customer, [(p2, 1)], status='DELIVERED')
+
+    def test_moves_old_closed_orders_in_batches(self):
+        totals = Order.objects.get(pk=self.delivered.pk).get_totals()
+        self.assertEqual(archive.archive_orders(batch_size=1), 2)
+
+        self.assertEqual(set(Order.objects.values_list('pk', flat=True)), {self.paid.pk, self.recent.pk})
+        archived = ArchivedOrder.objects.get(pk=self.delivered.pk)
+        self.assertEqual((archived.reference, archived.lines.count()), (self.delivered.reference, 2))
+        self.assertEqual(archived.get_totals(), totals)
+        self.assertEqual(ArchivedOrderLine.objects.count(), 3)
+        # L'utilisation du code promo reste comptée, sans commande
+        self.assertEqual(PromotionRedemption.objects.filter(order__isnull=True).count(), 1)
+        self.assertEqual(archive.archive_orders(), 0)
+
+    def test_references_continue_after_archived_ids(self):
+        archive.archive_orders(before=timezone.now() + timezone.timedelta(days=1))
+        Order.objects.all().delete()
+        order = make_order(*self.customer, [])
+        self.assertTrue(order.reference.endswith(f"-{self.recent.pk + 1:04d}"))
+
+    def test_reports_read_through_archive(self):
+        margins = list(margin_report())
+        vat_totals = vat.period_breakdown()
+        stats = sorted(segmentation.customer_stats())
+        invoice_total = Order.objects.get(pk=self.delivered.pk).get_totals()['grand_total_ttc']
+        archive.archive_orders()
+
+        self.assertIs(archive.line_source(), OrderLineHistory)
+        self.assertIs(archive.order_source(timezone.localdate()), Order)
+        self.assertEqual(list(margin_report()), margins)
+        self.assertEqual(vat.period_breakdown(), vat_totals)
+        self.assertEqual(sorted(segmentation.customer_stats()), stats)
+        self.assertEqual(OrderHistory.objects.count(), 4)
+        self.assertEqual(
+            vat.order_breakdown(ArchivedOrder.objects.get(pk=self.delivered.pk))['grand_total_ttc'], invoice_total
+        )
+
+    def test_demand_and_affinities_read_through_archive(self):
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            self.skipTest("numpy non installé")
+        from inventory.demand import DemandHistory
+
+        def demand():
+            return {int(pk): row.tolist() for ids, matrix in DemandHistory(730).blocks() for pk, row in zip(ids, matrix)}
+
+        before, affinities = demand(), (affinity.rebuild(), list(ProductPairCount.objects.values_list('orders')))
+        archive.archive_orders()
+        self.assertEqual(demand(), before)
+        self.assertEqual((affinity.rebuild(), list(ProductPairCount.objects.values_list('orders'))), affinities)
+
+    def test_invoice_and_admin_for_archived_order(self):
+        archive.archive_orders()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        response = self.client.get(f'/sales/order/{self.delivered.pk}/pdf/')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn(self.delivered.reference, response['Content-Disposition'])
+        self.assertContains(self.client.get('/admin/sales/archivedorder/'), self.cancelled.reference)
+        self.assertEqual(self.client.get('/sales/order/999999/pdf/').status_code, 404)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('archive_orders', dry_run=True, stdout=out)
+        self.assertIn("2 commandes archivables", out.getvalue())
+        call_command('archive_orders', batch_size=1, max_batches=1, stdout=out)
+        self.assertEqual(ArchivedOrder.objects.count(), 1)
+
+
+class QueryPlanTests(TestCase):
+    """Les requêtes chaudes passent par un index (aucun parcours séquentiel des tables concernées)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        products = make_catalog(products=20)
+        Product.objects.filter(pk__in=[p.pk for p in products[:3]]).update(stock_quantity=1)
+        customer = make_customer()
+        for i, status in enumerate(['DRAFT', 'PAID', 'SHIPPED', 'DELIVERED', 'CANCELLED'] * 4):
+            make_order(*customer, [(products[i], 1)], status=status)
+        now = timezone.now()
+        for i in range(10):
+            Promotion.objects.create(name=f"Promo {i}", promo_type='STORE_WIDE', discount_type='PERCENT',
+                                     value=Decimal("5.00"), start_date=now - timezone.timedelta(days=i + 1),
+                                     end_date=now + timezone.timedelta(days=i - 5), code=None if i % 2 else f"C{i}")
+        cls.order = Order.objects.filter(status='DRAFT').first()
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'x')
+
+    def assertIndexed(self, query, tables):
+        sql, params = (query, ()) if isinstance(query, str) else query.query.sql_with_params()
+        scans = set(query_plans.sequential_scans(sql, params)) & set(tables)
+        self.assertFalse(scans, f"Parcours séquentiel de {sorted(scans)} :\n{sql}\n{query_plans.explain(sql, params)}")
+
+    def test_dashboard(self):
+        from sales.context_processors import dashboard_stats
+
+        request = type('Request', (), {'user': self.admin})()
+        selects = query_plans.captured_selects(lambda: dashboard_stats(request))
+        self.assertEqual(len(selects), 3)
+        for sql in selects:
+            self.assertIndexed(sql, ['sales_order', 'sales_orderline', 'inventory_product'])
+
+    def test_automatic_promotions(self):
+        selects = query_plans.captured_selects(self.order.calculate_automatic_discounts)
+        promotions = [sql for sql in selects if 'FROM "sales_promotion"' in sql]
+        self.assertTrue(promotions)
+        for sql in promotions:
+            self.assertIndexed(sql, ['sales_promotion'])
+
+    def test_code_lookups_and_archiving(self):
+        now = timezone.now()
+        self.assertIndexed(Promotion.objects.filter(code="C2", active=True, start_date__lte=now, end_date__gte=now),
+                           ['sales_promotion'])
+        self.assertIndexed(CreditNote.objects.filter(code="AV-1", is_used=False), ['sales_creditnote'])
+        self.assertIndexed(archive.archivable(), ['sales_order'])
+        self.assertIndexed(Order.objects.filter(status='DRAFT').order_by('-created_at')[:20], ['sales_order'])
+
+    def test_status_changes_since(self):
+        since = timezone.now() - timezone.timedelta(days=1)
+        selects = query_plans.captured_selects(lambda: classification.changed_products(since, weeks=4))
+        changes = [sql for sql in selects if '"status_changed_at" >=' in sql]
+        self.assertTrue(changes)
+        for sql in changes:
+            self.assertIndexed(sql, ['sales_order'])
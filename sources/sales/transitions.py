@@ -0,0 +1,145 @@
+"""
+Machine à états des commandes.
+
+Les transitions légales sont déclarées dans TRANSITIONS. ``transition_many``
+fait passer tout un queryset d'un coup : validation ensembliste (quelques
+requêtes quel que soit le volume), un seul UPDATE pour le statut et des
+effets de bord publiés en masse dans l'outbox.
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import BigIntegerField, F, Q, Sum
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast
+from django.utils import timezone
+from outbox.registry import publish_many
+
+TRANSITIONS = {
+    'DRAFT': {'PAID', 'CANCELLED'},
+    'PAID': {'SHIPPED', 'CANCELLED'},
+    'SHIPPED': {'DELIVERED', 'CANCELLED'},
+    'DELIVERED': {'CANCELLED'},
+    'CANCELLED': set(),
+}
+
+# Effets de bord déclenchés à l'entrée dans un statut (sujet outbox)
+ON_ENTER = {
+    'PAID': 'order.paid',
+    'SHIPPED': 'order.shipped',
+}
+
+
+def can_transition(from_status, to_status):
+    return to_status in TRANSITIONS.get(from_status, set())
+
+
+def sources_for(to_status):
+    return [status for status, targets in TRANSITIONS.items() if to_status in targets]
+
+
+def _invalid_address_ids(orders):
+    # Même règle que Order.clean, en une requête pour tout le lot
+    return set(orders.filter(
+        ~Q(billing_address__address_type='BILLING') | ~Q(billing_address__customer=F('customer'))
+        | (Q(shipping_address__isnull=False) & (
+            ~Q(shipping_address__address_type='SHIPPING') | ~Q(shipping_address__customer=F('customer'))
+        ))
+    ).values_list('id', flat=True))
+
+
+def _queued_shipments(product_ids):
+    """Quantités {produit: unités} des expéditions publiées que le worker n'a pas encore déduites du stock"""
+    from outbox.models import OutboxEvent
+    from .models import OrderLine
+
+    queued_orders = (
+        OutboxEvent.objects
+        .filter(topic=ON_ENTER['SHIPPED'], processed_at__isnull=True,
+                attempts__lt=getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 10))
+        .annotate(order_id=Cast(KeyTextTransform('order_id', 'payload'), BigIntegerField()))
+        .values('order_id')
+    )
+    return dict(
+        OrderLine.objects.filter(order_id__in=queued_orders, product_id__in=product_ids)
+        .values_list('product_id')
+        .annotate(total=Sum('quantity'))
+        .order_by()
+    )
+
+
+def _check_stock(order_ids):
+    from inventory.counters import with_available_stock
+    from .models import OrderLine
+
+    needed = dict(
+        OrderLine.objects.filter(order_id__in=order_ids)
+        .values_list('product_id')
+        .annotate(total=Sum('quantity'))
+        .order_by()
+    )
+    # Compteurs simples verrouillés d'abord : une expédition concurrente des mêmes produits attend
+    # notre validation, puis voit nos événements dans la file. Les produits à shards (inventory.counters)
+    # ne sont pas verrouillés, sans quoi leurs expéditions se sérialiseraient de nouveau sur leur ligne :
+    # contrôle au mieux sur la somme des shards, une survente concurrente est bornée et journalisée
+    # à la décrémentation et à la compaction
+    products = list(
+        with_available_stock().filter(pk__in=needed, stock_shards=0).select_for_update(of=('self',))
+        .values_list('pk', 'name', 'available_stock')
+    )
+    sharded = set(needed) - {pk for pk, _, _ in products}
+    if sharded:
+        products += with_available_stock().filter(pk__in=sharded).values_list('pk', 'name', 'available_stock')
+    # Stock disponible moins les expéditions encore dans l'outbox (pas encore décrémentées)
+    queued = _queued_shipments(list(needed))
+    short = [name for pk, name, stock in products if stock - queued.get(pk, 0) < needed[pk]]
+    if short:
+        raise ValidationError(f"Stock insuffisant pour : {', '.join(short)}")
+
+
+def transition_many(queryset, to_status, strict=True):
+    """
+    Fait passer les commandes du queryset au statut ``to_status``.
+
+    Les commandes déjà au statut cible sont ignorées. Les commandes dont la
+    transition est illégale ou les adresses invalides lèvent une
+    ValidationError si ``strict``, sont écartées sinon.
+    Retourne {'updated': n, 'skipped': n, 'rejected': [références]}.
+    """
+    from .models import Order
+
+    if to_status not in TRANSITIONS:
+        raise ValidationError(f"Statut inconnu : {to_status}")
+
+    with transaction.atomic():
+        rows = list(
+            Order.objects.filter(pk__in=queryset.values('pk'))
+            .select_for_update()
+            .values_list('id', 'reference', 'status')
+        )
+        legal = {order_id for order_id, _, status in rows if can_transition(status, to_status)}
+        skipped = sum(1 for _, _, status in rows if status == to_status)
+        invalid = _invalid_address_ids(Order.objects.filter(pk__in=legal)) if legal else set()
+        rejected = [
+            reference for order_id, reference, status in rows
+            if status != to_status and (order_id not in legal or order_id in invalid)
+        ]
+        if rejected and strict:
+            raise ValidationError(f"Transition vers {to_status} impossible pour : {', '.join(rejected)}")
+
+        order_ids = sorted(legal - invalid)
+        if not order_ids:
+            return {'updated': 0, 'skipped': skipped, 'rejected': rejected}
+
+        if to_status == 'SHIPPED':
+            _check_stock(order_ids)
+
+        updated = Order.objects.filter(pk__in=order_ids, status__in=sources_for(to_status)).update(
+            status=to_status, status_changed_at=timezone.now(),
+        )
+
+        topic = ON_ENTER.get(to_status)
+        if topic:
+            publish_many(topic, [{'order_id': order_id} for order_id in order_ids])
+
+    return {'updated': updated, 'skipped': skipped, 'rejected': rejected}
@@ -4,4 +4,10 @@ from . import views
 urlpatterns = [
     # ... tes autres urls ...
     path('order/<int:order_id>/pdf/', views.generate_invoice_pdf, name='generate_invoice_pdf'),
+    path('reports/stats/', views.sales_stats, name='sales_stats'),
+    path('reports/orders.csv', views.sales_report_csv, name='sales_report_csv'),
+    path('reports/margins/', views.margin_report_view, name='margin_report'),
+    path('reports/margins.csv', views.margin_report_csv, name='margin_report_csv'),
+    path('reports/vat/', views.vat_report_view, name='vat_report'),
+    path('products/<int:product_id>/related/', views.related_products_view, name='related_products'),
 ]
\ No newline at end of file
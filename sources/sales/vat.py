@@ -0,0 +1,107 @@
+"""
+Ventilation de la TVA par taux, pour une commande (facture) ou un ensemble
+de commandes (déclaration de TVA d'une période).
+
+Les lignes sont agrégées en SQL par taux (GROUP BY vat_rate), sans parcours
+des lignes en Python. Pour chaque taux :
+
+- la remise de commande (discount_amount, TTC) est répartie entre les taux
+  au prorata du TTC des lignes ;
+- la base HT est déduite du TTC net du taux, la TVA en est la différence ;
+- le port, dont le montant HT est connu, s'ajoute au taux de port de la
+  commande (à défaut le taux par défaut, cf. shipping_vat_rate).
+
+Le TTC total est celui de Order.get_totals ; le HT peut en différer de
+quelques centimes, get_totals arrondissant le HT ligne à ligne.
+"""
+from django.db.models import ExpressionWrapper, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import NullIf
+
+from company import money
+from .archive import order_source
+from .margins import DEFAULT_STATUSES, LINE_TTC, MONEY
+from .models import shipping_vat_rate
+
+
+def order_breakdown(order):
+    """Ventilation d'une commande : une requête agrégée sur ses lignes"""
+    rows = [
+        (money.rate_to_bp(row['vat_rate']), money.to_cents(row['ttc']))
+        for row in order.lines.values('vat_rate').annotate(ttc=Sum(LINE_TTC)).order_by()
+    ]
+    discounts = money.allocate_cents(money.to_cents(order.discount_amount), [ttc for _, ttc in rows])
+    products = {rate: ttc - discount for (rate, ttc), discount in zip(rows, discounts)}
+    shipping = {money.rate_to_bp(shipping_vat_rate(order.shipping_tax_rate_id)): money.to_cents(order.shipping_cost)}
+    return _breakdown(products, shipping)
+
+
+def period_breakdown(start=None, end=None, statuses=DEFAULT_STATUSES, orders=None, using=None):
+    """
+    Ventilation cumulée des commandes d'une période (dates incluses), ou d'un
+    queryset ``orders`` (Order, ArchivedOrder ou OrderHistory). Deux requêtes :
+    lignes par taux, port par taux.
+    """
+    if orders is None:
+        orders = order_source(start, using).objects.using(using).filter(status__in=statuses)
+        if start:
+            orders = orders.filter(created_at__date__gte=start)
+        if end:
+            orders = orders.filter(created_at__date__lte=end)
+
+    # Part de remise de chaque ligne : remise x TTC ligne / TTC produits de la commande
+    line_model = orders.model.lines.field.model
+    order_ttc = Subquery(
+        line_model.objects.filter(order=OuterRef('order')).values('order').annotate(ttc=Sum(LINE_TTC)).values('ttc')
+    )
+    line_discount = ExpressionWrapper(
+        F('order__discount_amount') * LINE_TTC / NullIf(order_ttc, 0), output_field=MONEY
+    )
+    rows = (
+        line_model.objects.using(orders.db)
+        .filter(order__in=orders.values('pk'))
+        .values('vat_rate')
+        .annotate(ttc=Sum(LINE_TTC), discount=Sum(line_discount, filter=Q(order__discount_amount__gt=0)))
+        .order_by()
+    )
+    products = {}
+    for row in rows:
+        rate = money.rate_to_bp(row['vat_rate'])
+        products[rate] = products.get(rate, 0) + money.to_cents(row['ttc']) - money.to_cents(row['discount'])
+
+    shipping = {}
+    for row in orders.values('shipping_tax_rate_id').annotate(ht=Sum('shipping_cost')).order_by():
+        rate = money.rate_to_bp(shipping_vat_rate(row['shipping_tax_rate_id']))
+        shipping[rate] = shipping.get(rate, 0) + money.to_cents(row['ht'])
+    return _breakdown(products, shipping)
+
+
+def _breakdown(products, shipping):
+    """
+    products : TTC net des produits par taux, shipping : port HT par taux
+    (centimes, taux en points de base). Mêmes clés que Order.get_totals, plus
+    ``rates`` : [{rate, base, vat, total}] par taux croissant.
+    """
+    rates = []
+    for rate in sorted(set(products) | set(shipping)):
+        ttc, shipping_ht = products.get(rate, 0), shipping.get(rate, 0)
+        if not ttc and not shipping_ht:
+            continue
+        products_ht = money.excl_tax_cents(ttc, rate)
+        base = products_ht + shipping_ht
+        vat = ttc - products_ht + money.round_half_even(shipping_ht * rate, money.BP_SCALE)
+        rates.append((rate, base, vat))
+
+    return {
+        'rates': [
+            {
+                'rate': money.from_cents(rate),
+                'base': money.from_cents(base),
+                'vat': money.from_cents(vat),
+                'total': money.from_cents(base + vat),
+            }
+            for rate, base, vat in rates
+        ],
+        'total_ht': money.from_cents(sum(base for _, base, _ in rates)),
+        'total_vat': money.from_cents(sum(vat for _, _, vat in rates)),
+        'grand_total_ttc': money.from_cents(sum(base + vat for _, base, vat in rates)),
+    }
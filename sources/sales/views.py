@@ -1,35 +1,234 @@
-from django.shortcuts import get_object_or_404
+import asyncio
+import csv
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db.models import Sum
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render
 from django.template.loader import get_template
-from django.http import HttpResponse
+from company.reference_cache import get_company_settings
+from config.db_router import read_alias, use_replica
+from config.exports import Echo
 from xhtml2pdf import pisa  # Assure-toi que xhtml2pdf est installé : pip install xhtml2pdf
-from .models import Order
-
-def generate_invoice_pdf(request, order_id):
-    # Utilisation de get_object_or_404 pour éviter un crash si l'ID n'existe pas
-    order = get_object_or_404(Order, id=order_id)
-    
-    # On récupère tes nouveaux calculs dynamiques
-    totals = order.get_totals() 
-    
+from . import affinity, vat
+from .forms import MarginReportForm, SalesReportForm, VatReportForm
+from .margins import margin_report
+from .archive import order_source
+from .context_processors import low_stock_products, month_orders, pending_orders
+from .exports import order_totals
+from .models import ArchivedOrder, Order
+
+# Pool dédié au rendu PDF (CPU) : borné pour ne pas affamer les threads
+# utilisés par sync_to_async et le reste du worker ASGI.
+_pdf_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'INVOICE_PDF_WORKERS', 4),
+    thread_name_prefix='invoice-pdf',
+)
+
+
+def render_invoice_pdf(order, totals, company=None):
+    """Rendu HTML + PDF d'une facture (aucun accès base : tout doit être préchargé)"""
     template = get_template('sales/invoice_pdf.html')
-    
+
     # On passe l'ordre et les totaux au template
     context = {
-        'order': order, 
+        'order': order,
         'totals': totals,
+        'company': company,
         'pagesize': 'A4',
     }
-    
+
     html = template.render(context)
-    
-    response = HttpResponse(content_type='application/pdf')
-    # On utilise la référence (ex: ORD-2025-0001) plutôt que l'ID pour le nom du fichier
-    response['Content-Disposition'] = f'filename="facture_{order.reference}.pdf"'
-    
-    # Création du PDF
-    pisa_status = pisa.CreatePDF(html, dest=response)
-    
+    result = BytesIO()
+    pisa_status = pisa.CreatePDF(html, dest=result)
+
     if pisa_status.err:
+        return None
+    return result.getvalue()
+
+
+async def generate_invoice_pdf(request, order_id):
+    # Une seule requête pour l'en-tête, une pour les lignes (préchargées pour le template)
+    # Commande chaude, sinon archivée (même identifiant, cf. sales.archive)
+    for model in (Order, ArchivedOrder):
+        try:
+            order = await (
+                model.objects
+                .select_related('customer', 'billing_address', 'carrier')
+                .prefetch_related('lines__product')
+                .aget(id=order_id)
+            )
+            break
+        except model.DoesNotExist:
+            pass
+    else:
+        raise Http404("Commande introuvable")
+
+    # Totaux ventilés par taux de TVA (une requête agrégée ; taux de port et société : cache de référence)
+    totals = await sync_to_async(vat.order_breakdown)(order)
+    company = await sync_to_async(get_company_settings)()
+
+    # Le rendu PDF part dans le pool borné, la boucle reste libre pour les autres requêtes
+    loop = asyncio.get_running_loop()
+    pdf = await loop.run_in_executor(_pdf_executor, render_invoice_pdf, order, totals, company)
+
+    if pdf is None:
         return HttpResponse('Erreur lors de la génération du PDF', status=500)
-    
-    return response
\ No newline at end of file
+
+    response = HttpResponse(pdf, content_type='application/pdf')
+    # On utilise la référence (ex: ORD-2025-0001) plutôt que l'ID pour le nom du fichier
+    response['Content-Disposition'] = f'filename="facture_{order.reference}.pdf"'
+    return response
+
+
+# -------------------------------------------------------------------
+# REPORTING
+# -------------------------------------------------------------------
+
+@staff_member_required
+async def sales_stats(request):
+    """Version JSON des compteurs du tableau de bord"""
+    with use_replica():
+        ca_month = (await month_orders().aaggregate(total=Sum('lines__unit_price_incl_tax')))['total'] or 0
+        low_stock_count = await low_stock_products().acount()
+        pending_count = await pending_orders().acount()
+
+    return JsonResponse({
+        'ca_month': str(ca_month),
+        'low_stock': low_stock_count,
+        'pending_orders': pending_count,
+    })
+
+
+@staff_member_required
+async def sales_report_csv(request):
+    """Export CSV streamé des commandes (filtres : ?status=PAID&from=2025-01-01&to=2025-12-31)"""
+    form = SalesReportForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    filters = form.cleaned_data
+    # Évalué après le retour de la vue : on fixe l'alias de lecture dès maintenant
+    alias = read_alias()
+    source = await sync_to_async(order_source)(filters['start'], alias)  # archive incluse si la période y remonte
+    orders = source.objects.using(alias).select_related('customer')
+    if filters['status']:
+        orders = orders.filter(status=filters['status'])
+    if filters['start']:
+        orders = orders.filter(created_at__date__gte=filters['start'])
+    if filters['end']:
+        orders = orders.filter(created_at__date__lte=filters['end'])
+
+    writer = csv.writer(Echo(), delimiter=';')
+    chunk_size = 500
+
+    async def rows():
+        yield writer.writerow(['reference', 'date', 'client', 'statut', 'total_ht', 'total_tva', 'total_ttc'])
+        chunk = []
+        async for order in orders.order_by('id').aiterator(chunk_size=chunk_size):
+            chunk.append(order)
+            if len(chunk) == chunk_size:
+                yield await write_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield await write_chunk(chunk)
+
+    async def write_chunk(chunk):
+        # Totaux de facture (cf. sales.exports.order_totals) : une requête sur les lignes par morceau
+        totals = await sync_to_async(order_totals)(
+            [(order.pk, order.shipping_cost, order.shipping_tax_rate_id, order.discount_amount) for order in chunk],
+            source.lines.field.model, alias,
+        )
+        return ''.join(
+            writer.writerow([
+                order.reference, order.created_at.date().isoformat(), str(order.customer), order.status,
+                *(totals[order.pk][key] for key in ('total_ht', 'total_vat', 'grand_total_ttc')),
+            ])
+            for order in chunk
+        )
+
+    response = StreamingHttpResponse(rows(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="rapport_ventes.csv"'
+    return response
+
+
+
+def _margin_queryset(request):
+    form = MarginReportForm(request.GET or None)
+    filters = form.cleaned_data if form.is_valid() else {'group_by': 'product'}
+    filters = {key: value for key, value in filters.items() if value}
+    return form, filters, margin_report(using=read_alias(), **filters)
+
+
+@staff_member_required
+def margin_report_view(request):
+    """Rapport de marge dans l'admin (les N premiers groupes, l'export CSV donne tout)"""
+    form, filters, report = _margin_queryset(request)
+    limit = 500
+    rows = list(report[:limit + 1])
+    context = {
+        **admin.site.each_context(request),
+        'title': "Rapport de marge",
+        'form': form,
+        'rows': rows[:limit],
+        'truncated': len(rows) > limit,
+        'group_by': filters.get('group_by', 'product'),
+        'csv_query': request.GET.urlencode(),
+    }
+    return render(request, 'admin/sales/margin_report.html', context)
+
+
+@staff_member_required
+def margin_report_csv(request):
+    """Export CSV streamé : mémoire constante quel que soit le volume"""
+    _, filters, report = _margin_queryset(request)
+    writer = csv.writer(Echo(), delimiter=';')
+
+    def rows():
+        yield writer.writerow(['rang', filters.get('group_by', 'product'), 'libelle', 'quantite',
+                               'ca_ht', 'cout', 'marge', 'taux_marge', 'part_ca', 'lignes_sans_cout'])
+        for row in report.iterator(chunk_size=2000):
+            revenue = round(row['revenue_ht'] or 0, 2)
+            margin = round(row['margin'] or 0, 2)
+            yield writer.writerow([
+                row['rank'], row['key'], row['label'], row['units'],
+                revenue, round(row['cost'] or 0, 2), margin,
+                f"{margin / revenue * 100:.2f}" if revenue else '',
+                f"{(row['share'] or 0) * 100:.2f}", row['uncosted_lines'],
+            ])
+
+    response = StreamingHttpResponse(rows(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="rapport_marges.csv"'
+    return response
+
+
+@staff_member_required
+def vat_report_view(request):
+    """Déclaration de TVA : bases et TVA collectée par taux sur la période"""
+    form = VatReportForm(request.GET or None)
+    filters = {key: value for key, value in form.cleaned_data.items() if value} if form.is_valid() else {}
+    context = {
+        **admin.site.each_context(request),
+        'title': "TVA collectée par taux",
+        'form': form,
+        'totals': vat.period_breakdown(using=read_alias(), **filters),
+    }
+    return render(request, 'admin/sales/vat_report.html', context)
+
+
+# -------------------------------------------------------------------
+# VENTE CROISÉE
+# -------------------------------------------------------------------
+
+@staff_member_required
+def related_products_view(request, product_id):
+    """Produits fréquemment achetés avec ce produit (JSON, ?limit=5), cf. sales.affinity"""
+    try:
+        limit = min(max(int(request.GET.get('limit', affinity.TOP_K)), 1), affinity.TOP_K)
+    except ValueError:
+        limit = affinity.TOP_K
+    return JsonResponse({'product_id': product_id, 'related': affinity.related_products(product_id, limit)})